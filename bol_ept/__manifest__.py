@@ -3,7 +3,7 @@
 {
     # App information
     'name': 'Odoo Bol.com Connector',
-    'version': '14.0.3.0.1',
+    'version': '14.0.3.0.3',
     'category': 'Sales',
     'license': 'OPL-1',
     'summary': "Odoo Bol.com integration helps to manage key operations of Bol.com efficiently from Odoo.Customers can manage their orders, can check the reporting, & other operations as mentioned in the User documentation.Apart from Odoo Walmart Connector, we do have other ecommerce solutions or applications such as Woocommerce connector , Shopify connector , magento connector and also we have solutions for Marketplace Integration such as Odoo Amazon connector , Odoo eBay connector , Odoo walmart Connector.Aside from ecommerce integration and ecommerce marketplace integration, we also provide solutions for various operations, such as shipping , logistics , shipping labels , and shipping carrier management with our shipping integration , known as the Shipstation connector.For the customers who are into Dropship business, we do provide EDI Integration that can help them manage their Dropshipping business with our Dropshipping integration or Dropshipper integration It is listed as Dropshipping EDI integration and Dropshipper EDI integration.Emipro applications can be searched with different keywords like Amazon integration , Shopify integration , Woocommerce integration, Magento integration , Amazon vendor center module , Amazon seller center module , Inter company transfer , eBay integration , Bol.com integration , inventory management , warehouse transfer module , dropship and dropshipper integration and other Odoo integration application or module",
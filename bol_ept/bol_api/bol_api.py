@@ -1,7 +1,18 @@
 # -*- coding: utf-8 -*-
 # See LICENSE file for full copyright and licensing details.
 import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+
 import requests
+from requests.adapters import HTTPAdapter
+
+from .rate_limiter import RateLimiter, _max_retries
+
+_logger = logging.getLogger(__name__)
 
 _parameters = {
     "Content-Type": "application/x-www-form-urlencoded",
@@ -13,15 +24,32 @@ _parameters = {
 #     "Accept": "application/vnd.retailer.v4+json",
 #     "Content-Type": "application/vnd.retailer.v4+json",
 # }
-headers = {
+# Read only, the Authorization header is added to a copy on every request, so no request can pick up the token of
+# another instance or thread.
+headers = MappingProxyType({
     "Accept": "application/vnd.retailer.v8+json",
     "Content-Type": "application/vnd.retailer.v8+json",
-}
+})
 
-csv_headers = {
+csv_headers = MappingProxyType({
     "Accept": "application/vnd.retailer.v8+csv",
     "Content-Type": "application/x-www-form-urlencoded",
-}
+})
+
+# Hosts of the Bol.com endpoints, replaced by the base URL of a client pointed at another server, e.g. the local
+# simulator (see tests/simulator.py).
+_api_hosts = ("https://api.bol.com", "https://login.bol.com")
+
+# Connect and read timeouts (seconds) and the connection pool size of each instance client.
+_timeout = (10, 60)
+_pool_size = 10
+# Threads used to fetch many resources at once, kept below the pool size so they never wait for a connection.
+_fan_out_workers = 8
+# Bytes read at once from a streamed download.
+_stream_chunk_size = 64 * 1024
+# Bol.com tokens live 5 minutes, they are refreshed this many seconds before the expiry.
+_token_default_lifetime = 299
+_token_refresh_margin = 30
 
 _api_endpoints = {
     # GET Endpoints.
@@ -58,10 +86,71 @@ _api_endpoints = {
 }
 
 
+class BolAPIError(Exception):
+    """
+    Raised when the Bol.com API can not be used, e.g. the auth token can not be generated.
+    """
+
+
 class BolAPI:
+    """
+    Client for the Bol.com Retailer API.
+    One client is kept per Bol instance in the worker (see get_client), so every call of a cron run reuses the
+    keep-alive connections of the same requests.Session instead of opening a new TLS connection per request.
+    The client also manages the auth token of the instance, it is refreshed ahead of its expiry, and paces the
+    requests per endpoint group with its rate limiter.
+    @author: Maulik Barad on Date 16-Feb-2021.
+    """
+    _clients = {}
+    _clients_lock = threading.Lock()
+
+    def __init__(self, client_id=False, client_secret_key=False, token_store=None, pool_size=_pool_size,
+                 timeout=_timeout, base_url=False):
+        self.client_id = client_id
+        self.client_secret_key = client_secret_key
+        self.token_store = token_store
+        self.base_url = base_url and base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._token = False
+        self._token_expires_at = 0.0
+        self._token_lock = threading.Lock()
+        self.rate_limiter = RateLimiter()
+
+    @classmethod
+    def get_client(cls, key, client_id, client_secret_key, token_store=None, base_url=False):
+        """
+        This method is used to get the client registered for the key, it creates the client on first use.
+        @param key: Unique key of the Bol instance, it must change when the credentials or base URL are changed.
+        @param client_id: Client ID of the Bol instance.
+        @param client_secret_key: Secret key of the Bol instance.
+        @param token_store: Object with load() and save(token, expires_at) to share the token between workers.
+        @param base_url: URL replacing the Bol.com hosts, False to call Bol.com.
+        @return: BolAPI object.
+        """
+        with cls._clients_lock:
+            client = cls._clients.get(key)
+            if not client:
+                client = cls._clients[key] = cls(client_id, client_secret_key, token_store, base_url=base_url)
+        return client
 
-    @staticmethod
-    def get_bol_token(client_id, client_secret_key):
+    def get_url(self, endpoint):
+        """
+        This method is used to get the URL of the endpoint, on the base URL of the client when it is set.
+        @param endpoint: Endpoint (Key to fetch endpoint from _endpoints dict).
+        @return: URL.
+        """
+        url = _api_endpoints.get(endpoint)
+        if self.base_url:
+            for host in _api_hosts:
+                if url.startswith(host):
+                    return self.base_url + url[len(host):]
+        return url
+
+    def get_bol_token(self, client_id, client_secret_key):
         data = {
             "Content-Type": _parameters["Content-Type"],
             "client_id": client_id,
@@ -69,63 +158,159 @@ class BolAPI:
             "Accept": _parameters["Accept"],
             "grant_type": _parameters["grant_type"]
         }
-        response = requests.post(url=_api_endpoints.get("token"), data=data)
+        response = self.session.post(url=self.get_url("token"), data=data, timeout=self.timeout)
         return response.json()
 
-    @staticmethod
-    def get(endpoint, bol_token, query_string=""):
+    def _is_token_valid(self):
+        return bool(self._token) and time.time() < self._token_expires_at - _token_refresh_margin
+
+    def get_access_token(self):
+        """
+        This method is used to get a valid auth token. The token is requested again only when it is about to
+        expire. A token refreshed by another worker is taken from the token store before asking Bol.com for a new
+        one. Only the thread which refreshes the token waits for Bol.com, the others keep the valid token.
+        @return: Auth token with the Bearer prefix.
+        """
+        if self._is_token_valid():
+            return self._token
+        with self._token_lock:
+            if self._is_token_valid():
+                return self._token
+            if self.token_store:
+                self._token, self._token_expires_at = self.token_store.load()
+                if self._is_token_valid():
+                    return self._token
+            result = self.get_bol_token(self.client_id, self.client_secret_key)
+            if not result.get("access_token"):
+                raise BolAPIError("Bol.com token is not generated.\nResponse: %s" % result)
+            self._token = "Bearer " + result.get("access_token")
+            self._token_expires_at = time.time() + int(result.get("expires_in") or _token_default_lifetime)
+            if self.token_store:
+                self.token_store.save(self._token, self._token_expires_at)
+        return self._token
+
+    def invalidate_token(self, token):
+        """
+        This method is used to drop the token rejected by Bol.com, so the next call requests a new one.
+        @param token: Token which was sent with the rejected request.
+        """
+        with self._token_lock:
+            if self._token == token:
+                self._token = False
+                self._token_expires_at = 0.0
+
+    def _send(self, method, endpoint, url, request_headers, **kwargs):
+        """
+        This method is used to send the request with a valid token, paced by the bucket of the endpoint group.
+        The request is repeated once with a new token, if Bol.com rejects the token before its expiry, and up to
+        _max_retries times with backoff, if Bol.com answers with 429.
+        @return: Response.
+        """
+        bucket = self.rate_limiter.get_bucket(endpoint)
+        token_retried = False
+        attempt = 0
+        while True:
+            bucket.acquire()
+            bol_token = self.get_access_token()
+            response = self.session.request(method, url, headers=dict(request_headers, Authorization=bol_token),
+                                            timeout=self.timeout, **kwargs)
+            bucket.update(response.headers)
+            if response.status_code == 401 and not token_retried:
+                token_retried = True
+                self.invalidate_token(bol_token)
+                response.close()
+                continue
+            if response.status_code != 429:
+                break
+            if attempt >= _max_retries:
+                _logger.warning("Bol.com rate limit is still exceeded after %s retries: %s %s", attempt, method, url)
+                break
+            bucket.pause(self.rate_limiter.get_backoff(attempt, response.headers))
+            response.close()
+            attempt += 1
+        return response
+
+    def get(self, endpoint, query_string=""):
         """
         This method is used to make the Get request for all process of Bol.com.
         @param endpoint: Endpoint (Key to fetch endpoint from _endpoints dict).
-        @param bol_token: Bol Auth Token.
         @param query_string: Query string to attach additional parameters.
         @return: 1) Response, 2) Response in JSON format.
         @author: Maulik Barad on Date 16-Feb-2021.
         """
-        url = _api_endpoints.get(endpoint) + query_string
-        headers.update(Authorization=bol_token)
-
-        response = requests.get(url, headers=headers)
+        url = self.get_url(endpoint) + query_string
+        response = self._send("GET", endpoint, url, headers)
         return response, response.json()
 
-    @staticmethod
-    def get_csv(endpoint, bol_token, query_string=""):
+    def get_many(self, endpoint, query_strings, max_workers=_fan_out_workers):
+        """
+        This method is used to make many Get requests of the same endpoint concurrently. The requests share the
+        connection pool, token and rate limiter of the client. A request which fails with an exception is logged
+        and returned as (False, {}).
+        @param endpoint: Endpoint (Key to fetch endpoint from _endpoints dict).
+        @param query_strings: List of query strings, one per request.
+        @param max_workers: Maximum number of parallel requests.
+        @return: List of (Response, Response in JSON format) in the order of query_strings.
+        """
+
+        def get_one(query_string):
+            try:
+                return self.get(endpoint, query_string)
+            except Exception as error:
+                _logger.warning("Bol.com request %s %s failed: %s", endpoint, query_string, error)
+                return False, {}
+
+        if len(query_strings) < 2:
+            return [get_one(query_string) for query_string in query_strings]
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(query_strings))) as executor:
+            return list(executor.map(get_one, query_strings))
+
+    def get_csv(self, endpoint, query_string=""):
         """
         This method is used to make the Get request for all process of Bol.com.
         @param endpoint: Endpoint (Key to fetch endpoint from _endpoints dict).
-        @param bol_token: Bol Auth Token.
         @param query_string: Query string to attach additional parameters.
         @return: 1) Response, 2) Response in JSON format.
         @author: Maulik Barad on Date 16-Feb-2021.
         """
-        url = _api_endpoints.get(endpoint) + query_string
-        csv_headers.update(Authorization=bol_token)
-
-        response = requests.get(url, headers=csv_headers)
+        url = self.get_url(endpoint) + query_string
+        response = self._send("GET", endpoint, url, csv_headers)
         return response, response.text
 
-    @staticmethod
-    def post(endpoint, bol_token, payload):
+    def get_csv_stream(self, endpoint, query_string, file_obj, chunk_size=_stream_chunk_size):
+        """
+        This method is used to download a CSV file of Bol.com in chunks, so the file is never held in memory.
+        @param endpoint: Endpoint (Key to fetch endpoint from _endpoints dict).
+        @param query_string: Query string to attach additional parameters.
+        @param file_obj: Binary file object the content is written to.
+        @param chunk_size: Bytes read at once.
+        @return: Response, its content is already consumed.
+        """
+        url = self.get_url(endpoint) + query_string
+        response = self._send("GET", endpoint, url, csv_headers, stream=True)
+        try:
+            for chunk in response.iter_content(chunk_size):
+                file_obj.write(chunk)
+        finally:
+            response.close()
+        return response
+
+    def post(self, endpoint, payload):
         """
         This method is used to make the Post request for all process of Bol.com.
         @param endpoint: Endpoint (Key to fetch endpoint from _endpoints dict).
-        @param bol_token: Bol Auth Token.
         @param payload: Data to pass with request.
         @return: 1) Response, 2) Response in JSON format.
         @author: Maulik Barad on Date 16-Feb-2021.
         """
-        url = _api_endpoints.get(endpoint)
-        headers.update(Authorization=bol_token)
-
-        response = requests.post(url, headers=headers, data=json.dumps(payload))
+        url = self.get_url(endpoint)
+        response = self._send("POST", endpoint, url, headers, data=json.dumps(payload))
         return response, response.json()
 
-    @staticmethod
-    def put(endpoint, bol_token, query_string="", payload=False):
+    def put(self, endpoint, query_string="", payload=False):
         """
         This method is used to make the Put request for all process of Bol.com.
         @param endpoint: Endpoint (Key to fetch endpoint from _endpoints dict).
-        @param bol_token: Bol Auth Token.
         @param query_string: Query string to attach additional parameters.
         @param payload: Data to pass with request.
         @return: 1) Response, 2) Response in JSON format.
@@ -133,26 +318,20 @@ class BolAPI:
         """
         if not payload:
             payload = {}
-        url = _api_endpoints.get(endpoint) + query_string
-        headers.update(Authorization=bol_token)
-
-        response = requests.put(url, headers=headers, data=json.dumps(payload))
+        url = self.get_url(endpoint) + query_string
+        response = self._send("PUT", endpoint, url, headers, data=json.dumps(payload))
         return response, response.json()
 
-    @staticmethod
-    def delete(endpoint, bol_token, query_string=""):
+    def delete(self, endpoint, query_string=""):
         """
         This method is used to make the Delete request for all process of Bol.com.
         @param endpoint: Endpoint (Key to fetch endpoint from _endpoints dict).
-        @param bol_token: Bol Auth Token.
         @param query_string: Query string to attach additional parameters.
         @return: 1) Response, 2) Response in JSON format.
         @author: Maulik Barad on Date 16-Feb-2021.
         """
-        url = _api_endpoints.get(endpoint) + query_string
-        headers.update(Authorization=bol_token)
-
-        response = requests.delete(url, headers=headers)
+        url = self.get_url(endpoint) + query_string
+        response = self._send("DELETE", endpoint, url, headers)
         return response, response.json()
 
     # def get_bol_orders(self, bol_token):
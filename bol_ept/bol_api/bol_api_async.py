@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+# See LICENSE file for full copyright and licensing details.
+import asyncio
+import json
+import logging
+
+from .bol_api import _api_endpoints, _timeout, headers
+from .rate_limiter import _max_retries
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+_logger = logging.getLogger(__name__)
+
+# Requests of one batch which are in flight at the same time.
+_async_concurrency = 20
+
+
+class AsyncBolAPI:
+    """
+    Asyncio variant of the Bol.com API client for bulk operations, e.g. full stock or price export.
+    It uses the same endpoints, auth token and rate limiter as the synchronous client it is built on, so both
+    clients of an instance share one rate limit budget.
+    Use run_batch to call it from an Odoo cron method. Needs the aiohttp python package.
+    """
+    _api_endpoints = _api_endpoints
+
+    def __init__(self, client, session):
+        self.client = client
+        self.session = session
+
+    @staticmethod
+    def is_available():
+        return aiohttp is not None
+
+    @classmethod
+    def run_batch(cls, client, coroutine_function, items, concurrency=_async_concurrency):
+        """
+        This method is used to run a batch of coroutines from synchronous code like a cron method.
+        The coroutines share one aiohttp session and at most `concurrency` of them run at the same time.
+        @param client: BolAPI object of the instance, see bol.instance.ept.get_bol_api().
+        @param coroutine_function: Async function called as coroutine_function(async_api, item).
+        @param items: List of items, one coroutine is run per item.
+        @param concurrency: Maximum number of coroutines running at the same time.
+        @return: List of results in the order of items, the exception is given for a failed coroutine.
+        """
+        if not items:
+            return []
+
+        async def run_all():
+            connector = aiohttp.TCPConnector(limit=concurrency)
+            timeout = aiohttp.ClientTimeout(sock_connect=_timeout[0], sock_read=_timeout[1])
+            semaphore = asyncio.Semaphore(concurrency)
+            async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+                async_api = cls(client, session)
+
+                async def run_one(item):
+                    async with semaphore:
+                        return await coroutine_function(async_api, item)
+
+                return await asyncio.gather(*[run_one(item) for item in items], return_exceptions=True)
+
+        return asyncio.run(run_all())
+
+    async def _get_access_token(self):
+        if self.client._is_token_valid():
+            return self.client._token
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.client.get_access_token)
+
+    async def _send(self, method, endpoint, url, data=None):
+        """
+        This method is used to send the request with the same token and rate limit policy as BolAPI._send.
+        @return: 1) Status code, 2) Response in JSON format.
+        """
+        bucket = self.client.rate_limiter.get_bucket(endpoint)
+        token_retried = False
+        attempt = 0
+        while True:
+            wait = bucket.reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            bol_token = await self._get_access_token()
+            request_headers = dict(headers, Authorization=bol_token)
+            async with self.session.request(method, url, headers=request_headers, data=data) as response:
+                bucket.update(response.headers)
+                status_code = response.status
+                response_headers = response.headers
+                body = await response.text()
+            if status_code == 401 and not token_retried:
+                token_retried = True
+                self.client.invalidate_token(bol_token)
+                continue
+            if status_code != 429:
+                break
+            if attempt >= _max_retries:
+                _logger.warning("Bol.com rate limit is still exceeded after %s retries: %s %s", attempt, method, url)
+                break
+            bucket.pause(self.client.rate_limiter.get_backoff(attempt, response_headers))
+            attempt += 1
+        return status_code, json.loads(body) if body else {}
+
+    async def get(self, endpoint, query_string=""):
+        """
+        This method is used to make the Get request.
+        @param endpoint: Endpoint (Key to fetch endpoint from _endpoints dict).
+        @param query_string: Query string to attach additional parameters.
+        @return: 1) Status code, 2) Response in JSON format.
+        """
+        url = self.client.get_url(endpoint) + query_string
+        return await self._send("GET", endpoint, url)
+
+    async def post(self, endpoint, payload):
+        """
+        This method is used to make the Post request.
+        @param endpoint: Endpoint (Key to fetch endpoint from _endpoints dict).
+        @param payload: Data to pass with request.
+        @return: 1) Status code, 2) Response in JSON format.
+        """
+        url = self.client.get_url(endpoint)
+        return await self._send("POST", endpoint, url, json.dumps(payload))
+
+    async def put(self, endpoint, query_string="", payload=False):
+        """
+        This method is used to make the Put request.
+        @param endpoint: Endpoint (Key to fetch endpoint from _endpoints dict).
+        @param query_string: Query string to attach additional parameters.
+        @param payload: Data to pass with request.
+        @return: 1) Status code, 2) Response in JSON format.
+        """
+        url = self.client.get_url(endpoint) + query_string
+        return await self._send("PUT", endpoint, url, json.dumps(payload or {}))
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+# See LICENSE file for full copyright and licensing details.
+import random
+import threading
+import time
+
+# Requests per second and burst size of every endpoint group. The values stay below the limits published by
+# Bol.com, they are corrected at runtime from the rate limit headers of the responses.
+_rate_limits = {
+    "orders": (20.0, 20),
+    "offers": (20.0, 20),
+    "shipments": (10.0, 10),
+    "process_status": (80.0, 80),
+    "default": (5.0, 5),
+}
+
+_endpoint_groups = {
+    "orders": "orders",
+    "single_order": "orders",
+    "update_order_status": "orders",
+    "ship_order_item": "orders",
+    "returns_orders": "orders",
+    "handled_returns": "orders",
+    "offer": "offers",
+    "new_offer": "offers",
+    "offer_file": "offers",
+    "export_offer_file": "offers",
+    "inventory": "offers",
+    "shipment_list": "shipments",
+    "single_shipment_list": "shipments",
+    "transport_info": "shipments",
+    "process_status": "process_status",
+    "shipment_status": "process_status",
+}
+
+# Retries of a request answered with 429 and the backoff used when Bol.com does not send Retry-After.
+_max_retries = 5
+_backoff_base = 1.0
+_backoff_max = 60.0
+
+
+def _header_float(response_headers, name):
+    try:
+        return float(response_headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Token bucket of one endpoint group, shared by all the threads using the same client.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """
+        This method is used to take one token from the bucket.
+        @return: Seconds the caller has to wait before sending the request.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.paused_until - now)
+
+    def acquire(self):
+        """
+        This method is used to wait until a request of the group can be sent.
+        """
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """
+        This method is used to hold all the requests of the group for the given seconds.
+        """
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def update(self, response_headers):
+        """
+        This method is used to adjust the bucket from the rate limit headers sent by Bol.com.
+        @param response_headers: Headers of the response.
+        """
+        limit = _header_float(response_headers, "X-RateLimit-Limit")
+        remaining = _header_float(response_headers, "X-RateLimit-Remaining")
+        reset = _header_float(response_headers, "X-RateLimit-Reset")
+        with self.lock:
+            if limit and limit > 0:
+                self.capacity = limit
+            if remaining is not None:
+                self.tokens = min(self.tokens, remaining)
+                if remaining <= 0 and reset:
+                    self.paused_until = max(self.paused_until, time.monotonic() + reset)
+
+
+class RateLimiter:
+    """
+    Paces the requests of one Bol.com client with a token bucket per endpoint group.
+    """
+
+    def __init__(self):
+        self.buckets = {group: TokenBucket(rate, capacity) for group, (rate, capacity) in _rate_limits.items()}
+
+    def get_bucket(self, endpoint):
+        """
+        This method is used to get the bucket of the endpoint.
+        @param endpoint: Endpoint (Key of _api_endpoints dict).
+        @return: TokenBucket.
+        """
+        return self.buckets[_endpoint_groups.get(endpoint, "default")]
+
+    @staticmethod
+    def get_backoff(attempt, response_headers):
+        """
+        This method is used to get the wait time after a 429 response. Retry-After of Bol.com is used when it is
+        given, otherwise the wait grows exponentially. Jitter is added, so the waiting threads do not retry at once.
+        @param attempt: Number of the retry, starting from 0.
+        @param response_headers: Headers of the 429 response.
+        @return: Seconds to wait.
+        """
+        delay = _header_float(response_headers, "Retry-After")
+        if delay is None:
+            delay = min(_backoff_max, _backoff_base * 2 ** attempt)
+        return delay + random.uniform(0, min(delay, _backoff_base))
@@ -0,0 +1,16 @@
+# -*- coding: UTF-8 -*-
+# See LICENSE file for full copyright and licensing details.
+from odoo import api, SUPERUSER_ID
+
+
+def migrate(cr, version):
+    """
+    The address fingerprint is stored for the Bol customers only, it is set for the existing Bol customers.
+    :param cr: Database cursor
+    :param version: Installed version of the module
+    """
+    if not version:
+        return
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    partners = env['res.partner'].with_context(active_test=False).search([('is_bol_customer', '=', True)])
+    partners.set_bol_address_fingerprint()
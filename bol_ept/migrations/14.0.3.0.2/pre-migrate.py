@@ -0,0 +1,32 @@
+# -*- coding: UTF-8 -*-
+# See LICENSE file for full copyright and licensing details.
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """
+    The unique constraint of the Bol orders is renamed to unique_bol_instance_order, as its columns changed.
+    The constraint can only be added when no order is imported twice, so of the duplicate orders only the
+    oldest one keeps its Bol order ID, the Bol order ID of the other orders is marked as duplicate.
+    :param cr: Database cursor
+    :param version: Installed version of the module
+    """
+    if not version:
+        return
+    cr.execute("""SELECT id, name, bol_order_id FROM (
+                      SELECT id, name, bol_order_id, row_number() OVER (
+                          PARTITION BY bol_instance_id, bol_fulfillment_by, bol_order_id ORDER BY id) AS number
+                      FROM sale_order
+                      WHERE bol_order_id IS NOT NULL AND bol_instance_id IS NOT NULL
+                      AND bol_fulfillment_by IS NOT NULL) AS bol_order
+                  WHERE number > 1""")
+    duplicate_orders = cr.fetchall()
+    for order_id, name, bol_order_id in duplicate_orders:
+        _logger.warning("Sale order %s is a duplicate of Bol order %s, its Bol order ID is marked as duplicate.",
+                        name, bol_order_id)
+        cr.execute("UPDATE sale_order SET bol_order_id = %s WHERE id = %s",
+                   ("%s (duplicate %d)" % (bol_order_id, order_id), order_id))
+    cr.execute("ALTER TABLE sale_order DROP CONSTRAINT IF EXISTS sale_order_unique_bol_order")
+    cr.execute("DELETE FROM ir_model_constraint WHERE name = 'sale_order_unique_bol_order'")
@@ -0,0 +1,13 @@
+# -*- coding: UTF-8 -*-
+# See LICENSE file for full copyright and licensing details.
+
+
+def migrate(cr, version):
+    """
+    The stock change cursor of the instances is a transaction ID now, the old cursor of journal IDs is dropped.
+    :param cr: Database cursor
+    :param version: Installed version of the module
+    """
+    if not version:
+        return
+    cr.execute("ALTER TABLE bol_instance_ept DROP COLUMN IF EXISTS stock_change_cursor")
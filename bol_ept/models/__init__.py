@@ -6,10 +6,13 @@ from . import instance_ept
 from . import account_fiscal_position
 from . import stock_warehouse
 from . import offer_ept
+from . import product_product
 from . import ir_cron
 from . import delivery_carrier_code_ept
 from . import delivery_carrier
 from . import product_sync_ept
+from . import queue_mixin_ept
+from . import queue_line_mixin_ept
 from . import order_queue_ept
 from . import order_queue_line_ept
 from . import shipped_order_queue_ept
@@ -19,6 +22,7 @@ from . import sale_order_line
 from . import stock_picking
 from . import account_move
 from . import stock_move
+from . import stock_change_journal_ept
 from . import res_partner
 from . import stock_inventory
 from . import data_queue_mixin_ept
@@ -2,8 +2,11 @@
 # See LICENSE file for full copyright and licensing details.
 import json
 from calendar import monthrange
-from datetime import date, datetime
+from datetime import date, datetime, timezone
 
+from psycopg2 import OperationalError
+
+import odoo
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
 
@@ -16,6 +19,41 @@ _secondsConverter = {
     'minutes': lambda interval: interval * 60,
 }
 
+
+class BolTokenStore:
+    """
+    Shares the auth token of a Bol instance between the cron workers. Every call works with its own cursor, so
+    storing a new token never commits the work of the running transaction.
+    """
+
+    def __init__(self, dbname, instance_id):
+        self.dbname = dbname
+        self.instance_id = instance_id
+
+    def load(self):
+        """
+        This method is used to read the last token stored by any worker.
+        @return: Token, expiry time as timestamp.
+        """
+        with odoo.registry(self.dbname).cursor() as cr:
+            cr.execute("""SELECT bol_auth_token, bol_auth_token_expiry FROM bol_instance_ept WHERE id = %s""",
+                       (self.instance_id,))
+            token, expiry = cr.fetchone() or (False, False)
+        return token or False, expiry and expiry.replace(tzinfo=timezone.utc).timestamp() or 0.0
+
+    def save(self, token, expires_at):
+        """
+        This method is used to store the new token. The instance row is skipped when it is locked, e.g. by the
+        transaction of the same worker, the token is shared with the next refresh then.
+        @param token: Auth token.
+        @param expires_at: Expiry time as timestamp.
+        """
+        with odoo.registry(self.dbname).cursor() as cr:
+            cr.execute("""UPDATE bol_instance_ept SET bol_auth_token = %s, bol_auth_token_expiry = %s
+                          WHERE id IN (SELECT id FROM bol_instance_ept WHERE id = %s FOR UPDATE SKIP LOCKED)""",
+                       (token, datetime.utcfromtimestamp(expires_at), self.instance_id))
+
+
 class BolInstanceEpt(models.Model):
     _name = "bol.instance.ept"
     _description = "Bol Instance"
@@ -50,6 +88,8 @@ class BolInstanceEpt(models.Model):
     fbr_bol_order_prefix = fields.Char('FBR Bol Order Prefix')
     fbb_bol_order_prefix = fields.Char('FBB Bol Order Prefix')
     bol_auth_token = fields.Text('Auth Token', help="Bol.com authentication token")
+    bol_auth_token_expiry = fields.Datetime('Auth Token Expiry', readonly=True,
+                                            help="The token is refreshed before this time.")
     bol_country_id = fields.Many2one("res.country", "Country")
     bol_team_id = fields.Many2one('crm.team', 'Sales Team')
     bol_fulfillment_by = fields.Selection([('FBR', 'FBR'), ('FBB', 'FBB'), ('Both', 'FBR & FBB')],
@@ -65,12 +105,30 @@ class BolInstanceEpt(models.Model):
     active = fields.Boolean(default=True)
     fbb_bol_shipped_page_number = fields.Integer('Last page number of FBB shipments', default=1)
     fbr_bol_shipped_page_number = fields.Integer('Last page number of FBR shipments', default=1)
+    bol_incremental_order_import = fields.Boolean("Incremental Open Order Import", default=False,
+                                                  help="Queue only the open orders which are not seen by the "
+                                                       "previous import.")
+    fbb_open_order_watermark = fields.Datetime('Latest FBB open order date',
+                                               help="Latest order date seen by the incremental FBB open order import")
+    fbr_open_order_watermark = fields.Datetime('Latest FBR open order date',
+                                               help="Latest order date seen by the incremental FBR open order import")
+    fbb_open_order_recent_ids = fields.Text('Recent FBB open order IDs', copy=False)
+    fbr_open_order_recent_ids = fields.Text('Recent FBR open order IDs', copy=False)
     shipment_charge_product_id = fields.Many2one("product.product", "Shipment Fee",
                                                  domain=[('type', '=', 'service')],
                                                  default=_get_default_shipment_product)
     inventory_last_sync_on = fields.Datetime(string="Last stock export date",
                                              help="Last stock export date'")
+    stock_change_cursor = fields.Char("Last Stock Change", copy=False,
+                                      help="Transaction of the stock change journal from which the stock export "
+                                           "reads the changes")
+    bol_realtime_stock_cursor = fields.Char("Last Real-time Stock Change", copy=False,
+                                            help="Transaction of the stock change journal from which the real-time "
+                                                 "stock export reads the changes")
     auto_validate_inventory = fields.Boolean(default=False)
+    bol_realtime_stock_export = fields.Boolean("Real-time Stock Export", default=False,
+                                               help="Export the stock of the changed FBR products right after "
+                                                    "the change.")
     state = fields.Selection([('not_confirmed', 'Not Confirmed'), ('confirmed', 'Confirmed')],
                              default='not_confirmed')
     is_bol_create_schedule = fields.Boolean("Create Schedule Activity ? ", default=False,
@@ -508,22 +566,38 @@ class BolInstanceEpt(models.Model):
         view = self.env.ref('bol_ept.action_bol_common_log_book_ept').sudo().read()[0]
         return self.prepare_action(view, [('bol_instance_id', '=', record_id)])
 
+    def get_bol_api(self):
+        """
+        This method is used to get the Bol API client of the instance. The client is kept per instance in the
+        worker, so all the calls of a cron run reuse the same pooled HTTP connections and auth token.
+        @return: BolAPI object.
+        """
+        self.ensure_one()
+        base_url = self.get_bol_api_base_url()
+        key = (self._cr.dbname, self.id, self.client_id, self.secret_id, base_url)
+        return BolAPI.get_client(key, self.client_id, self.secret_id, BolTokenStore(self._cr.dbname, self.id),
+                                 base_url)
+
+    @api.model
+    def get_bol_api_base_url(self):
+        """
+        This method is used to get the URL the Bol API calls are sent to instead of Bol.com, e.g. the local
+        simulator for load testing. It is set with the system parameter bol_ept.api_base_url.
+        @return: Base URL or False to call Bol.com.
+        """
+        return self.env['ir.config_parameter'].sudo().get_param('bol_ept.api_base_url', False)
+
     def get_bol_token(self):
         """
-        This method is used to generate the Bol Auth Token.
+        This method is used to get a valid Bol Auth Token, it is generated again only when it is about to expire.
+        @return: Auth token.
         @author: Maulik Barad on Date 15-Feb-2021.
         """
         try:
-            result = BolAPI.get_bol_token(self.client_id, self.secret_id)
-            if not result.get("access_token"):
-                raise UserError(_("Given Credentials are incorrect, please provide Correct Credentials."))
-            self.write({'bol_auth_token': 'Bearer ' + result.get('access_token')})
-            self._cr.commit()
+            return self.get_bol_api().get_access_token()
         except Exception as error:
             raise UserError(_("Something went wrong.\n%s") % str(error))
 
-        return True
-
     def test_bol_connection(self):
         """
         This method is used to Test Bol.com Connection
@@ -531,7 +605,7 @@ class BolInstanceEpt(models.Model):
         @author: Ekta Bhut, 15th March 2021
         """
         # This method needs to remove
-        result = BolAPI.get_bol_token(self.client_id, self.secret_id)
+        result = self.get_bol_api().get_bol_token(self.client_id, self.secret_id)
         if result.get('access_token'):
             self.write({'state': 'confirmed', 'bol_auth_token': 'Bearer ' + result.get('access_token')})
             self._cr.commit()
@@ -554,7 +628,7 @@ class BolInstanceEpt(models.Model):
         @author: Ekta Bhut, 15th March 2021
         """
         try:
-            result = BolAPI.get_bol_token(self.client_id, self.secret_id)
+            result = self.get_bol_api().get_bol_token(self.client_id, self.secret_id)
             if result.get('access_token'):
                 self.write({'state': 'confirmed'})
             else:
@@ -692,6 +766,19 @@ class BolInstanceEpt(models.Model):
         interval_in_seconds = _secondsConverter[interval_type](interval)
         return interval_in_seconds
 
+    def lock_bol_instance(self):
+        """
+        This method is used to lock the instance row until the end of the transaction, so the crons exporting for
+        the instance do not run at the same time.
+        @return: True if the instance is locked, False if it is locked by another transaction.
+        """
+        try:
+            with self._cr.savepoint():
+                self._cr.execute("""SELECT id FROM bol_instance_ept WHERE id = %s FOR UPDATE NOWAIT""", (self.id,))
+        except OperationalError:
+            return False
+        return True
+
     def search_bol_instance(self):
         """ This method used to search the bol instance.
             @return: Record of bol instance
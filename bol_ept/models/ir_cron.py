@@ -1,8 +1,45 @@
 # -*- coding: UTF-8 -*-
 # See LICENSE file for full copyright and licensing details.
-from odoo import models, fields
+from odoo import models, fields, api
+
+# Crons of the queues which can be processed by several workers, see bol.queue.ept.auto_process_open_order_queue.
+_queue_worker_crons = ["bol_ept.ir_cron_process_bol_open_order_queue",
+                       "bol_ept.ir_cron_process_bol_shipped_order_queue"]
 
 class IrCron(models.Model):
     _inherit = 'ir.cron'
 
     bol_instance_cron_id = fields.Many2one('bol.instance.ept', string="BOL Cron Scheduler")
+    bol_queue_worker_of_id = fields.Many2one('ir.cron', string="BOL Queue Worker Of", ondelete="cascade",
+                                             help="Queue cron of which this cron is an additional worker.")
+
+    @api.model
+    def set_bol_queue_worker_crons(self, worker_count):
+        """
+        This method is used to set the number of workers processing the order queues. Odoo runs one cron at a
+        time, so a worker is a copy of the queue cron, the copies are created or removed to match worker_count.
+        Every worker needs a cron thread, see the max_cron_threads option of the Odoo server.
+        :param worker_count: Number of workers per queue
+        :return: True
+        """
+        worker_count = max(worker_count, 1)
+        for cron_name in _queue_worker_crons:
+            core_cron = self.env.ref(cron_name, False)
+            if not core_cron:
+                continue
+            worker_crons = self.with_context(active_test=False).search(
+                    [('bol_queue_worker_of_id', '=', core_cron.id)], order='id')
+            for worker_number in range(len(worker_crons) + 2, worker_count + 1):
+                worker_crons |= core_cron.copy(default={'name': "%s (Worker %d)" % (core_cron.name, worker_number),
+                                                        'bol_queue_worker_of_id': core_cron.id,
+                                                        'nextcall': core_cron.nextcall})
+            # The server actions of the crons are not removed with them.
+            removed_crons = worker_crons[worker_count - 1:]
+            server_actions = removed_crons.ir_actions_server_id
+            removed_crons.unlink()
+            server_actions.unlink()
+            worker_crons[:worker_count - 1].write({'active': core_cron.active,
+                                                   'interval_number': core_cron.interval_number,
+                                                   'interval_type': core_cron.interval_type,
+                                                   'user_id': core_cron.user_id.id})
+        return True
@@ -1,15 +1,21 @@
 # -*- coding: UTF-8 -*-
 # See LICENSE file for full copyright and licensing details.
 import logging
-import time
-from datetime import datetime, timedelta
+from datetime import datetime
 
 from odoo import models, fields, api, _
-
-from ..bol_api.bol_api import BolAPI
+from ..bol_api.bol_api_async import AsyncBolAPI
 
 _logger = logging.getLogger(__name__)
 
+# Status codes of a stock update which are not accepted but may be accepted when it is sent again.
+_retry_stock_status_codes = (429, 500, 502, 503, 504)
+
+
+async def _put_offer(async_api, offer_request):
+    return await async_api.put('offer', *offer_request)
+
+
 class BolOfferEpt(models.Model):
     _name = "bol.offer.ept"
     _description = "Bol Offer"
@@ -18,16 +24,20 @@ class BolOfferEpt(models.Model):
     odoo_product_id = fields.Many2one("product.product", ondelete="cascade",
                                       help="ERP Product Reference", string="Odoo Product")
     bol_bsku = fields.Char('Bol SKU')
-    ean_product = fields.Char('Bol EAN number')
+    ean_product = fields.Char('Bol EAN number', index=True)
     bol_instance_id = fields.Many2one("bol.instance.ept", string="Instance")
-    bol_offer_id = fields.Char("Bol Offer ID", help="Id of the Offer in Bol.")
+    bol_offer_id = fields.Char("Bol Offer ID", help="Id of the Offer in Bol.", index=True)
     fix_stock_type = fields.Selection([('fix', 'Fix'), ('percentage', 'Percentage')],)
     fix_stock_value = fields.Float()
+    bol_exported_stock = fields.Integer("Last Exported Stock", copy=False, readonly=True,
+                                        help="Stock of the offer last accepted by Bol.com.")
+    bol_stock_exported_on = fields.Datetime("Stock Exported On", copy=False, readonly=True,
+                                            help="Date of the stock update last accepted by Bol.com.")
     fulfillment_by = fields.Selection([('FBR', 'Fulfilled by the Retailer'),
                                        ('FBB', 'Fulfilment by Bol.com')],)
     is_publish = fields.Boolean("Is Published?")
     product_description = fields.Text(string="Description")
-    reference_code = fields.Char()
+    reference_code = fields.Char(index=True)
     exported_in_bol = fields.Boolean('Exported in Bol?')
     active = fields.Boolean(default=True)
 
@@ -91,7 +101,9 @@ class BolOfferEpt(models.Model):
 
     def search_bol_product(self, product_offerid, default_code, ean, instance_id, fulfillment_by):
         """
-        This method is used to search bol product
+        This method is used to search bol product by Offer ID, then by SKU and then by EAN, an archived offer is
+        found as well and activated again. When the sync run passes the bol_offer_index dictionary in the
+        context, the offer is first looked up in the index of the run, see get_bol_offer_index.
         :param product_offerid: Bol Offer ID
         :param default_code: Product default code
         :param ean: Product EAN
@@ -100,37 +112,95 @@ class BolOfferEpt(models.Model):
         :return: Bol product
         @author : Ekta Bhut
         """
-        bol_product = self.with_context(active_test=True).search([('bol_offer_id', '=', product_offerid),
-                                                                  ('bol_instance_id', '=', instance_id.id),
-                                                                  ('fulfillment_by', '=', fulfillment_by)])
+        offer_indexes = self._context.get('bol_offer_index')
+        if offer_indexes is not None:
+            index_key = (instance_id.id, fulfillment_by)
+            if index_key not in offer_indexes:
+                offer_indexes[index_key] = self.get_bol_offer_index(instance_id.id, fulfillment_by)
+            offer_index = offer_indexes[index_key]
+            offer_id = offer_index['offer'].get(product_offerid) or offer_index['sku'].get(default_code) or \
+                       offer_index['ean'].get(ean)
+            bol_product = offer_id and self.with_context(active_test=False).browse(offer_id).exists()
+        else:
+            bol_product = False
+        # The offers created or changed after the index is built are found by the searches.
+        if not bol_product:
+            bol_product = self.with_context(active_test=False).search([('bol_offer_id', '=', product_offerid),
+                                                                       ('bol_instance_id', '=', instance_id.id),
+                                                                       ('fulfillment_by', '=', fulfillment_by)])
         if not bol_product:
-            bol_product = self.with_context(active_test=True).search([('reference_code', '=', default_code),
-                                                                      ('bol_instance_id', '=', instance_id.id),
-                                                                      ('fulfillment_by', '=', fulfillment_by)])
+            bol_product = self.with_context(active_test=False).search([('reference_code', '=', default_code),
+                                                                       ('bol_instance_id', '=', instance_id.id),
+                                                                       ('fulfillment_by', '=', fulfillment_by)])
         if not bol_product:
-            bol_product = self.with_context(active_test=True).search([('ean_product', '=', ean),
-                                                                      ('bol_instance_id', '=', instance_id.id),
-                                                                      ('fulfillment_by', '=', fulfillment_by)])
+            bol_product = self.with_context(active_test=False).search([('ean_product', '=', ean),
+                                                                       ('bol_instance_id', '=', instance_id.id),
+                                                                       ('fulfillment_by', '=', fulfillment_by)])
         if not bol_product:
             return False
-        if not bol_product.active:
-            bol_product.write({'active': True})
-        return bol_product
+        archived_offers = bol_product.filtered(lambda offer: not offer.active)
+        if archived_offers:
+            archived_offers.write({'active': True})
+        return bol_product.with_env(self.env)
+
+    def get_bol_offer_index(self, instance_id, fulfillment_by):
+        """
+        This method is used to build the index of the offers of the instance, to find the offers of the order
+        lines of a sync run without a search per line. The archived offers are indexed too, after the active ones.
+        :param instance_id: Bol Instance ID
+        :param fulfillment_by: FBR & FBB
+        :return: Dictionary of Offer ID, SKU and EAN, each mapping the value to the offer ID
+        """
+        offer_index = {'offer': {}, 'sku': {}, 'ean': {}}
+        offers = self.with_context(active_test=False).search_read([('bol_instance_id', '=', instance_id),
+                                                                   ('fulfillment_by', '=', fulfillment_by)],
+                                                                  ['bol_offer_id', 'reference_code', 'ean_product'],
+                                                                  order='active desc, id')
+        for offer in offers:
+            for key, field_name in (('offer', 'bol_offer_id'), ('sku', 'reference_code'), ('ean', 'ean_product')):
+                if offer[field_name]:
+                    offer_index[key].setdefault(offer[field_name], offer['id'])
+        return offer_index
 
     def search_odoo_product(self, default_code, ean):
         """
-        This method is used to search Odoo product based on Default code and EAN
+        This method is used to search Odoo product based on Default code and EAN. When the sync run passes the
+        bol_product_index dictionary in the context, the product is first looked up in the index of the run, see
+        index_bol_products.
         :param default_code: Default code
         :param ean: EAN number
         :return: Odoo Product
         @author : Ekta Bhut
         """
         product_obj = self.env['product.product']
+        product_index = self._context.get('bol_product_index')
+        if product_index:
+            product_id = product_index['default_code'].get(default_code) or product_index['barcode'].get(ean)
+            odoo_product = product_id and product_obj.browse(product_id).exists().filtered('active')
+            if odoo_product:
+                return odoo_product
         odoo_product = product_obj.search([('default_code', '=', default_code)], limit=1)
         if not odoo_product:
             odoo_product = product_obj.search([('barcode', '=', ean)], limit=1)
         return odoo_product
 
+    def index_bol_products(self, default_codes, eans):
+        """
+        This method is used to add the products of the given default codes and EANs to the bol_product_index
+        dictionary of the sync run in the context, so only the products of the synced offers are indexed.
+        :param default_codes: Default codes
+        :param eans: EAN numbers
+        :return: True
+        """
+        product_index = self._context.get('bol_product_index')
+        if product_index is None:
+            return True
+        new_index = self.env['product.product'].get_bol_product_index(default_codes, eans)
+        for field_name, products in new_index.items():
+            for value, product_id in products.items():
+                product_index.setdefault(field_name, {}).setdefault(value, product_id)
+        return True
+
     def get_bol_single_offer_response(self, instance_id, offer_id, log_rec):
         """
         This method is used to get bol offer response
@@ -140,14 +210,11 @@ class BolOfferEpt(models.Model):
         :return: Product data
         @author : Ekta Bhut
         """
+        bol_api = instance_id.get_bol_api()
         product_data = {}
         transaction_log_obj = self.env['common.log.lines.ept']
         try:
-            response_obj, product_data = BolAPI.get('offer', instance_id.bol_auth_token, offer_id)
-            if response_obj.status_code in [401, 404]:
-                instance_id.get_bol_token()
-                response_obj, product_data = BolAPI.get('offer', instance_id.bol_auth_token,
-                                                        offer_id)
+            response_obj, product_data = bol_api.get('offer', offer_id)
         except Exception as e:
             transaction_vals = {'message': e,
                                 'log_book_id': log_rec.id}
@@ -221,25 +288,111 @@ class BolOfferEpt(models.Model):
         @author : Ekta Bhut
         """
         context = dict(self._context)
-        product_obj = self.env['product.product']
-        export_stock_from_date = instance.inventory_last_sync_on
-        if not export_stock_from_date:
-            export_stock_from_date = datetime.now() - timedelta(30)
-        if context.get('call_from_bol_cron'):
-            instance.write({'inventory_last_sync_on': datetime.now()})
-        odoo_products_ids = product_obj.get_products_based_on_movement_date_ept(export_stock_from_date,
-                                                                                instance.company_id)
+        # The real-time stock export reads the stock change journal with its own cursor.
+        cursor_field = 'bol_realtime_stock_cursor' if context.get('bol_realtime_stock_export') \
+            else 'stock_change_cursor'
+        # The products of which the stock is changed are read from the stock change journal after the cursor.
+        changed_product_ids, stock_change_cursor = self.env['stock.change.journal.ept'].get_stock_changes_ept(
+                instance.bol_fbr_warehouse_id, instance[cursor_field])
+        changed_product_ids = set(changed_product_ids)
         if not offer_ids:
             offer_ids = self.search([('bol_instance_id', '=', instance.id), ('exported_in_bol', '=', True),
                                      ('fulfillment_by', '=', 'FBR')])
-        offer_ids = offer_ids.filtered(lambda l: l.odoo_product_id.id in odoo_products_ids)
+        offer_ids = offer_ids.filtered(lambda l: l.odoo_product_id.id in changed_product_ids)
         odoo_products_ids = offer_ids.mapped('odoo_product_id').ids
         product_stock_data = self.check_stock_type_and_get_product_stock(instance, odoo_products_ids)
+        offer_stocks = []
         for offer in offer_ids:
             stock = self.get_product_stock(offer, product_stock_data)
-            response = self.export_stock_to_bol_via_api(instance, offer, stock)
+            # The stock is exported only if it is changed since the last accepted update.
+            if offer.bol_stock_exported_on and offer.bol_exported_stock == int(stock):
+                continue
+            offer_stocks.append((offer, stock))
+        exported_offers = {}
+        retry_export = False
+        if len(offer_stocks) > 1 and AsyncBolAPI.is_available():
+            offer_requests = [('{0}/stock'.format(offer.bol_offer_id), self.prepare_stock_payload(stock))
+                              for offer, stock in offer_stocks]
+            status_codes = [status_code for status_code, product_response in
+                            self.put_offers_to_bol(instance, offer_requests)]
+        else:
+            status_codes = [self.export_stock_to_bol_via_api(instance, offer, stock)[1]
+                            for offer, stock in offer_stocks]
+        for (offer, stock), status_code in zip(offer_stocks, status_codes):
+            if self.log_stock_export_status(offer, stock, status_code) and status_code in (200, 202):
+                exported_offers.setdefault(int(stock), []).append(offer.id)
+            elif not status_code or status_code in _retry_stock_status_codes:
+                retry_export = True
+        self.set_exported_stock(exported_offers)
+        self.log_stock_export_result(instance, offer_stocks, exported_offers, len(offer_ids) - len(offer_stocks))
+        if context.get('call_from_bol_cron'):
+            vals = {} if context.get('bol_realtime_stock_export') else {'inventory_last_sync_on': datetime.now()}
+            # The cursor stays if a stock update can be accepted when it is sent again, the changes are read
+            # again by the next export then.
+            if not retry_export:
+                vals[cursor_field] = stock_change_cursor
+            instance.write(vals)
         return True
 
+    def log_stock_export_result(self, instance, offer_stocks, exported_offers, skipped_count):
+        """
+        This method is used to create the log book of the stock export, with the number of offers of which the
+        stock is unchanged and not exported, and the offers of which the stock is not accepted by Bol.com.
+        :param instance: Bol Instance
+        :param offer_stocks: List of offer and stock sent to Bol.com
+        :param exported_offers: Dictionary of stock and the offer IDs accepted by Bol.com
+        :param skipped_count: Number of offers of which the stock is unchanged
+        :return: Log book or False
+        """
+        log_book_obj = self.env['common.log.book.ept']
+        common_log_line = self.env['common.log.lines.ept']
+        exported_offer_ids = {offer_id for offer_ids in exported_offers.values() for offer_id in offer_ids}
+        failed_offers = [offer for offer, stock in offer_stocks if offer.id not in exported_offer_ids]
+        _logger.info("Stock of %s offers is exported, %s offers are unchanged and skipped.", len(exported_offer_ids),
+                     skipped_count)
+        if not skipped_count and not failed_offers:
+            return False
+        model_id = self.env['ir.model']._get('bol.offer.ept').id
+        message = "Perform Operation for export Product Stock"
+        bol_job = log_book_obj.bol_create_common_log_book('export', instance, model_id, message, False)
+        if skipped_count:
+            message = "Stock of {0} offers is exported, {1} offers are unchanged and not exported again".format(
+                    len(exported_offer_ids), skipped_count)
+            common_log_line.bol_create_order_log_line(message, model_id, False, bol_job)
+        for offer in failed_offers:
+            message = 'Stock is not exported for the Offer {0}'.format(offer.bol_offer_id)
+            common_log_line.bol_create_order_log_line(message, model_id, False, bol_job)
+        return bol_job
+
+    def set_exported_stock(self, exported_offers):
+        """
+        This method is used to store the stock accepted by Bol.com on the offers, the offers of the same stock are
+        written at once.
+        :param exported_offers: Dictionary of stock and the offer IDs
+        :return: True
+        """
+        exported_on = fields.Datetime.now()
+        for stock, offer_ids in exported_offers.items():
+            self.browse(offer_ids).write({'bol_exported_stock': stock, 'bol_stock_exported_on': exported_on})
+        return True
+
+    def put_offers_to_bol(self, instance, offer_requests):
+        """
+        This method is used to send many offer updates to Bol.com at once with the asyncio client.
+        :param instance: Bol Instance
+        :param offer_requests: List of (query string, payload) for the offer endpoint
+        :return: List of (status code, response) in the order of offer_requests, status code is False for a
+        failed request
+        """
+        results = AsyncBolAPI.run_batch(instance.get_bol_api(), _put_offer, offer_requests)
+        offer_responses = []
+        for offer_request, result in zip(offer_requests, results):
+            if isinstance(result, Exception):
+                _logger.warning("Bol.com offer request %s failed: %s", offer_request[0], result)
+                result = (False, {})
+            offer_responses.append(result)
+        return offer_responses
+
     def get_product_stock(self, offer, product_stock_data):
         """
         This method is used to get product stock based on configuration
@@ -262,27 +415,40 @@ class BolOfferEpt(models.Model):
         This method is used to export stock with API
         :param offer: Bol Offer
         :param quantity: Quantity
-        :return: Response
+        :return: Response, Status code
         """
+        bol_api = instance.get_bol_api()
         bol_offer_id = '{0}/stock'.format(offer.bol_offer_id)
-        payload = {
+        payload = self.prepare_stock_payload(quantity)
+        response_obj, product_response = bol_api.put('offer', bol_offer_id, payload)
+        return product_response, response_obj.status_code
+
+    def prepare_stock_payload(self, quantity):
+        """
+        This method is used to prepare the payload of the stock update of an offer
+        :param quantity: Quantity
+        :return: Payload
+        """
+        return {
             "amount": int(quantity),
             "managedByRetailer": True
         }
-        response_obj, product_response = BolAPI.put('offer', instance.bol_auth_token, bol_offer_id, payload)
-        if response_obj.status_code in [400, 401]:
-            instance.get_bol_token()
-            response_obj, product_response = BolAPI.put('offer', instance.bol_auth_token, bol_offer_id, payload)
-        if response_obj.status_code == 429:
-            time.sleep(5)
-            response_obj, product_response = BolAPI.put('offer', instance.bol_auth_token, bol_offer_id, payload)
-        if response_obj.status_code == 404:
+
+    def log_stock_export_status(self, offer, quantity, status_code):
+        """
+        This method is used to log the result of the stock update of an offer
+        :param offer: Bol Offer
+        :param quantity: Quantity
+        :param status_code: Status code of the response
+        :return: False if the offer is not found in Bol.com
+        """
+        if status_code == 404:
             _logger.info("STOCK IS NOT EXPORTED FOR OFFER ID -- {0}".format(offer.bol_offer_id))
-            return {}
-        if response_obj.status_code == 202:
+            return False
+        if status_code == 202:
             _logger.info("Stock is successfully exported for offer ID {0} & quantity {1}".format(offer.bol_offer_id,
                                                                                                  int(quantity)))
-        return product_response
+        return True
 
     def check_stock_type_and_get_product_stock(self, instance, product_ids):
         """
@@ -319,11 +485,21 @@ class BolOfferEpt(models.Model):
         model_id = self.env['ir.model']._get('bol.offer.ept').id
         bol_job = log_book_obj.bol_create_common_log_book('export', self.bol_instance_id, model_id,
                                                           message, self.id)
+        offer_prices = []
         for offer in offer_ids:
             price = offer.bol_instance_id.bol_pricelist_id.get_product_price_ept(offer.odoo_product_id)
-            price = price and round(price, 2) or 0.0
-            offer_id = offer.bol_offer_id
-            response, status_code = self.update_product_price_to_bol_via_api(instance, offer, price)
+            offer_prices.append((offer, price and round(price, 2) or 0.0))
+        if len(offer_prices) > 1 and AsyncBolAPI.is_available():
+            offer_requests = [('{0}/price'.format(offer.bol_offer_id), self.prepare_price_payload(price))
+                              for offer, price in offer_prices]
+            offer_responses = self.put_offers_to_bol(instance, offer_requests)
+            status_codes = [status_code for status_code, product_response in offer_responses]
+            for (offer, price), status_code in zip(offer_prices, status_codes):
+                self.log_price_export_status(offer, price, status_code)
+        else:
+            status_codes = [self.update_product_price_to_bol_via_api(instance, offer, price)[1]
+                            for offer, price in offer_prices]
+        for (offer, price), status_code in zip(offer_prices, status_codes):
             if status_code == 404:
                 message = 'Price is not exported for the Offer {0}'.format(offer.bol_offer_id)
                 log_line = common_log_line.bol_create_order_log_line(message, model_id.id, False, bol_job)
@@ -339,8 +515,21 @@ class BolOfferEpt(models.Model):
         :return: Response code
         @author : Ekta Bhut
         """
+        bol_api = instance.get_bol_api()
         bol_offer_id = '{0}/price'.format(offer.bol_offer_id)
-        payload = {
+        payload = self.prepare_price_payload(price)
+        response_obj, product_response = bol_api.put('offer', bol_offer_id, payload)
+        if not self.log_price_export_status(offer, price, response_obj.status_code):
+            return {}, response_obj.status_code
+        return product_response, response_obj.status_code
+
+    def prepare_price_payload(self, price):
+        """
+        This method is used to prepare the payload of the price update of an offer
+        :param price: Price
+        :return: Payload
+        """
+        return {
             "pricing": {
                 "bundlePrices": [
                     {
@@ -350,19 +539,43 @@ class BolOfferEpt(models.Model):
                 ]
             }
         }
-        response_obj, product_response = BolAPI.put('offer', instance.bol_auth_token, bol_offer_id, payload)
-        if response_obj.status_code in [400, 401]:
-            instance.get_bol_token()
-            response_obj, product_response = BolAPI.put('offer', instance.bol_auth_token, bol_offer_id, payload)
-        if response_obj.status_code == 429:
-            time.sleep(5)
-            response_obj, product_response = BolAPI.put('offer', instance.bol_auth_token, bol_offer_id, payload)
-        if response_obj.status_code == 404:
+
+    def log_price_export_status(self, offer, price, status_code):
+        """
+        This method is used to log the result of the price update of an offer
+        :param offer: Bol Offer
+        :param price: Price
+        :param status_code: Status code of the response
+        :return: False if the offer is not found in Bol.com
+        """
+        if status_code == 404:
             _logger.info("PRICE IS NOT EXPORTED FOR OFFER -- {0}".format(offer.bol_offer_id))
-            return {}, response_obj.status_code
-        if response_obj.status_code == 202:
+            return False
+        if status_code == 202:
             _logger.info("Price is successfully exported for Offer {0} & Price {1}".format(offer.bol_offer_id, price))
-        return product_response, response_obj.status_code
+        return True
+
+    @api.model
+    def auto_push_bol_stock(self):
+        """
+        This method is used to export the stock of the changed FBR products in near real time, it is called by the
+        cron for the instances with real-time stock export. The cron is triggered when the stock changes, see
+        stock.change.journal.ept, and runs every minute as well. The changes of a product since the last run are
+        collapsed in one update and the unchanged stock is skipped, see export_product_stock_to_bol.
+        An instance which is exported by another cron at the same time is skipped.
+        :return: True
+        """
+        instances = self.env['bol.instance.ept'].search([('bol_realtime_stock_export', '=', True),
+                                                         ('bol_fbr_warehouse_id', '!=', False)])
+        for instance in instances:
+            if not instance.lock_bol_instance():
+                _logger.info("Stock of Bol instance %s is exported by another cron, it is skipped.", instance.name)
+                continue
+            self.with_context({'call_from_bol_cron': True,
+                               'bol_realtime_stock_export': True}).export_product_stock_to_bol(instance, self)
+            # The lock of the instance is released by the commit.
+            self._cr.commit()
+        return True
 
     @api.model
     def auto_update_fbr_product_stock(self, ctx={}):
@@ -376,4 +589,10 @@ class BolOfferEpt(models.Model):
         instance_id = ctx.get('bol_instance_id')
         if instance_id:
             instance = bol_instance_obj.browse(instance_id)
+            # The stock of the instance is exported by the real-time stock export, see auto_push_bol_stock.
+            if instance.bol_realtime_stock_export:
+                return True
+            if not instance.lock_bol_instance():
+                _logger.info("Stock of Bol instance %s is exported by another cron, it is skipped.", instance.name)
+                return True
             self.with_context({'call_from_bol_cron': True}).export_product_stock_to_bol(instance, self)
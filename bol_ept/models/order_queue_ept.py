@@ -2,19 +2,26 @@
 # See LICENSE file for full copyright and licensing details.
 import json
 import logging
-import time
+from datetime import datetime, timedelta
 
-from odoo import models, fields, api
+from dateutil import parser
+from pytz import utc
 
-from ..bol_api.bol_api import BolAPI
+from odoo import models, fields, api
 
 _logger = logging.getLogger(__name__)
 
+# Orders placed this long before the watermark are still compared by id, as they can be listed late by Bol.com.
+_watermark_overlap = timedelta(hours=1)
+
 class BolOrderQueueEpt(models.Model):
     _name = 'bol.queue.ept'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'bol.queue.mixin.ept']
     _description = "Bol Order Queue"
     _order = "create_date desc"
+    _bol_queue_line_model = 'bol.order.data.queue.line.ept'
+    _bol_queue_lines_field = 'order_data_queue_line_ids'
+    _bol_queue_cron = 'bol_ept.ir_cron_process_bol_open_order_queue'
 
     name = fields.Char('Queue Reference', readonly=True, required=True, copy=False, default="New")
     bol_instance_id = fields.Many2one('bol.instance.ept', string="Instance")
@@ -148,39 +155,47 @@ class BolOrderQueueEpt(models.Model):
         :return:
         @author : Ekta Bhut
         """
+        bol_api = instance.get_bol_api()
         transaction_log_obj = self.env['common.log.lines.ept']
         bol_order_queue_line_obj = self.env['bol.order.data.queue.line.ept']
         order_queue_id = self.env['bol.queue.ept'].create({'bol_instance_id': instance.id,
                                                            'fulfilment_by': fulfilment_by})
         order_queue_list = [order_queue_id.id]
+        incremental = instance.bol_incremental_order_import
+        watermark, recent_order_ids = self.get_open_order_watermark(instance, fulfilment_by)
+        seen_orders = {}
         page = 0
         counter = 0
         try:
             while True:
-                counter += 1
-                if counter == 11:
-                    order_queue_id = self.env['bol.queue.ept'].create({'bol_instance_id': instance.id,
-                                                                       'fulfilment_by': fulfilment_by})
-                    order_queue_list.append(order_queue_id.id)
-                    counter = 0
-                    self._cr.commit()
                 page = page + 1
                 query_string = "fulfilment-method=" + fulfilment_by + "&" + "page=" + str(page)
                 _logger.info("IMPORT ORDER PAGE COUNTER %s" % page)
-                response_obj, response = BolAPI.get('orders', instance.bol_auth_token, query_string)
-                if response_obj.status_code in [400, 401]:
-                    instance.get_bol_token()
-                    response_obj, response = BolAPI.get('orders', instance.bol_auth_token,
-                                                        query_string)
+                response_obj, response = bol_api.get('orders', query_string)
                 if response.get('orders'):
-                    bol_order_queue_line_obj.create({'bol_order_data': json.dumps(response.get('orders')),
-                                                     'bol_instance_id': instance.id,
-                                                     'bol_order_data_queue_id': order_queue_id.id,
-                                                     'bol_order_id': page,
-                                                     'total_number_of_orders': len(response.get('orders'))})
+                    orders = response.get('orders')
+                    if incremental:
+                        seen_orders.update({order.get('orderId'): self.get_order_placed_date(order)
+                                            for order in orders})
+                        orders = self.filter_known_open_orders(orders, watermark, recent_order_ids)
+                        if not orders:
+                            continue
+                    counter += 1
+                    if counter == 11:
+                        order_queue_id = self.env['bol.queue.ept'].create({'bol_instance_id': instance.id,
+                                                                           'fulfilment_by': fulfilment_by})
+                        order_queue_list.append(order_queue_id.id)
+                        counter = 0
+                        self._cr.commit()
+                    bol_order_queue_line_obj.create([{'bol_order_data': json.dumps(order),
+                                                      'bol_instance_id': instance.id,
+                                                      'bol_order_data_queue_id': order_queue_id.id,
+                                                      'bol_order_id': order.get('orderId')} for order in orders])
                 else:
                     _logger.info("Break loop because of response : %s" % response)
                     break
+            if incremental and seen_orders:
+                self.set_open_order_watermark(instance, fulfilment_by, watermark, seen_orders)
         except Exception as e:
             transaction_vals = {'message': e,
                                 'log_book_id': log_rec.id}
@@ -195,110 +210,87 @@ class BolOrderQueueEpt(models.Model):
 
         return order_queue_list
 
-    def process_order_queue(self):
+    def get_open_order_watermark(self, instance, fulfilment_by):
         """
-        This method is used to process queue record
-        :return:
-        @author : Ekta Bhut
+        This method is used to get the watermark of the incremental open order import
+        :param instance: Bol Instance
+        :param fulfilment_by: 'FBB' or 'FBR'
+        :return: Latest order placed date seen by the previous import, Set of the recent order ids
         """
-        common_log_book_obj = self.env['common.log.book.ept']
-        sale_obj = self.env['sale.order']
-        model_id = self.env['ir.model']._get('bol.queue.ept').id
-        log_book = common_log_book_obj.search([('model_id', '=', model_id), ('res_id', '=', self.id)])
-        if len(log_book) > 1:
-            log_book.unlink()
-
-        if log_book and log_book.log_lines:
-            log_book.log_lines.unlink()
-
-        if not log_book:
-            log_book_vals = {
-                'type': 'import',
-                'model_id': model_id,
-                'res_id': self.id,
-                'bol_instance_id': self.bol_instance_id.id,
-                'module': 'bol_ept',
-                'active': True
-            }
-            log_book = common_log_book_obj.create(log_book_vals)
-
-        queue_line_ids = self.order_data_queue_line_ids.filtered(lambda line: line.state in ['draft', 'failed'])
-        fulfilment_by = self.fulfilment_by
-        for queue_line in queue_line_ids:
-            sale_obj.process_bol_open_order_queue_line(self.bol_instance_id, queue_line,
-                                                       fulfilment_by,
-                                                       log_book)
-            if not queue_line.bol_order_data:
-                queue_line.write({'state': 'done'})
-            queue_line._cr.commit()
-
-        if log_book and not log_book.log_lines:
-            log_book.unlink()
+        if fulfilment_by == 'FBB':
+            watermark = instance.fbb_open_order_watermark
+            recent_order_ids = instance.fbb_open_order_recent_ids
+        else:
+            watermark = instance.fbr_open_order_watermark
+            recent_order_ids = instance.fbr_open_order_recent_ids
+        return watermark, set(json.loads(recent_order_ids)) if recent_order_ids else set()
 
-        status = self.order_data_queue_line_ids.filtered(lambda x: x.state in ('draft', 'failed'))
-        if status:
-            self.write({'state': 'partial'})
+    def set_open_order_watermark(self, instance, fulfilment_by, watermark, seen_orders):
+        """
+        This method is used to move the watermark to the latest order seen by the import. The ids of the orders
+        placed within the overlap before it are kept, so they are not queued again.
+        :param instance: Bol Instance
+        :param fulfilment_by: 'FBB' or 'FBR'
+        :param watermark: Previous watermark
+        :param seen_orders: Dict of order id and order placed date of the open orders seen by the import
+        :return: True
+        """
+        watermark = max([date for date in seen_orders.values() if date] + [watermark or datetime.min])
+        cutoff = watermark - _watermark_overlap
+        recent_order_ids = json.dumps(sorted(order_id for order_id, date in seen_orders.items()
+                                             if not date or date >= cutoff))
+        if fulfilment_by == 'FBB':
+            instance.write({'fbb_open_order_watermark': watermark, 'fbb_open_order_recent_ids': recent_order_ids})
         else:
-            self.write({'state': 'done'})
+            instance.write({'fbr_open_order_watermark': watermark, 'fbr_open_order_recent_ids': recent_order_ids})
         return True
 
+    def filter_known_open_orders(self, orders, watermark, recent_order_ids):
+        """
+        This method is used to remove the orders which are already seen by a previous import, these are the
+        recent order ids and the orders placed before the watermark minus the overlap.
+        :param orders: Orders of a page of the open orders API
+        :param watermark: Latest order placed date seen by the previous import
+        :param recent_order_ids: Set of the recent order ids
+        :return: New orders
+        """
+        cutoff = watermark and watermark - _watermark_overlap
+        new_orders = []
+        for order in orders:
+            if order.get('orderId') in recent_order_ids:
+                continue
+            order_date = self.get_order_placed_date(order)
+            if cutoff and order_date and order_date < cutoff:
+                continue
+            new_orders.append(order)
+        return new_orders
+
+    def get_order_placed_date(self, order):
+        """
+        This method is used to get the placed date of a Bol order in UTC
+        :param order: Order data of the open orders API
+        :return: Datetime or False
+        """
+        order_date = order.get('orderPlacedDateTime')
+        return order_date and parser.parse(order_date).astimezone(utc).replace(tzinfo=None) or False
+
     @api.model
     def auto_process_open_order_queue(self):
         """
-        This method is used to process all the open order queue.
-        :return:
+        This method is used to process the open order queues, it is called by every queue worker cron.
+        :return: True
         """
-        order_data_queue_ids = []
+        return self.auto_process_bol_queue()
 
-        query = """select queue.id
-                    from bol_order_data_queue_line_ept as queue_line
-                    inner join bol_queue_ept as queue on queue_line.bol_order_data_queue_id = queue.id
-                    where queue_line.state='draft' and queue.is_action_require = 'False' 
-                    GROUP BY queue.id,queue_line.create_date
-                    ORDER BY queue_line.create_date ASC"""
-        self._cr.execute(query)
-        order_data_queue_list = self._cr.fetchall()
-        if not order_data_queue_list:
-            return
-
-        for result in order_data_queue_list:
-            order_data_queue_ids.append(result[0])
-
-        queues = self.browse(list(set(order_data_queue_ids)))
-        self.process_product_queue_and_post_message(queues)
-        return True
-
-    def process_product_queue_and_post_message(self, queues):
+    def process_bol_queue_lines(self, queue_lines, log_book):
         """
-        This method is used to post a message if the queue is process more than 3 times otherwise
-        it calls the child method to process the product queue line.
-        :param queues: Records of product queue.
-        @author: Ekta Bhut
+        This method is used to process the queue lines of the queue, see bol.queue.mixin.ept.
+        :param queue_lines: Queue lines of the queue
+        :param log_book: Common log book record
+        :return: True
         """
-        ir_model_obj = self.env["ir.model"]
-        common_log_book_obj = self.env["common.log.book.ept"]
-        start = time.time()
-        product_queue_process_cron_time = queues.bol_instance_id.get_bol_cron_execution_time(
-                "bol_ept.ir_cron_process_bol_open_order_queue")
-
-        for queue in queues:
-            queue.process_order_queue()
-            # For counting the queue crashes and creating schedule activity for the queue.
-            queue.queue_process_count += 1
-            if queue.queue_process_count > 3:
-                queue.is_action_require = True
-                note = "<p>Need to process this product queue manually.There are 3 attempts been made by " \
-                       "automated action to process this queue,<br/>- Ignore, if this queue is already processed.</p>"
-                queue.message_post(body=note)
-                if queue.bol_instance_id.is_bol_create_schedule:
-                    model_id = ir_model_obj.search([("model", "=", "bol.queue.ept")]).id
-                    common_log_book_obj.create_crash_queue_schedule_activity(queue, model_id, note)
-                return True
-
-            self._cr.commit()
-            if time.time() - start > product_queue_process_cron_time - 60:
-                return True
-        return True
+        return self.env['sale.order'].process_bol_open_order_queue_line(self.bol_instance_id, queue_lines,
+                                                                        self.fulfilment_by, log_book)
 
     @api.model
     def auto_import_fbr_open_order_queue(self, ctx={}):
@@ -7,14 +7,12 @@ from odoo import models, fields
 class BolOrderQueueLineEpt(models.Model):
     _name = 'bol.order.data.queue.line.ept'
     _description = "Bol Order Data Queue Line"
-    _rec_name = "bol_order_data_queue_id"
-
-    def _get_total_number_of_orders(self):
-        for record in self:
-            record.total_orders_in_queue_line = len(json.loads(record.bol_order_data)) if record.bol_order_data else 0
+    _inherit = 'bol.queue.line.mixin.ept'
+    _rec_name = "bol_order_id"
+    _bol_queue_field = 'bol_order_data_queue_id'
 
     bol_order_data_queue_id = fields.Many2one('bol.queue.ept', ondelete="cascade")
-    bol_order_id = fields.Char('Order Id', readonly=True, required=True, copy=False, default="New")
+    bol_order_id = fields.Char('Order Id', readonly=True, required=True, copy=False, default="New", index=True)
     bol_order_data = fields.Char('Order Data', readonly=True)
     bol_instance_id = fields.Many2one('bol.instance.ept', string='Instance',
                                       help="Order imported from this Bol Instance.")
@@ -30,5 +28,30 @@ class BolOrderQueueLineEpt(models.Model):
                                                      help="Log lines created against which line.")
     processed_at = fields.Datetime(help="Shows Date and Time, When the data is processed",
                                    copy=False)
-    total_number_of_orders = fields.Integer(readonly=1)
-    total_orders_in_queue_line = fields.Integer(compute="_get_total_number_of_orders")
+    attempt_count = fields.Integer('Attempts', readonly=True, copy=False,
+                                   help="Number of times the order of this line is processed.")
+    error_message = fields.Text('Error', readonly=True, copy=False,
+                                help="Reason why the order is not created in the last attempt.")
+
+    def split_page_queue_lines(self):
+        """
+        This method is used to split the lines which hold a whole page of orders, as created by the earlier
+        versions, into one line per order. The new lines keep the claim of the page line, so no other queue
+        worker claims them.
+        :return: Queue lines with one order each
+        """
+        page_lines = self.filtered(lambda line: line.bol_order_data and line.bol_order_data.startswith('['))
+        if not page_lines:
+            return self
+        vals_list = []
+        for page_line in page_lines:
+            for order_data in json.loads(page_line.bol_order_data):
+                vals_list.append({'bol_order_data': json.dumps(order_data),
+                                  'bol_order_id': order_data.get('orderId'),
+                                  'bol_instance_id': page_line.bol_instance_id.id,
+                                  'claim_token': page_line.claim_token,
+                                  'claim_expires_at': page_line.claim_expires_at,
+                                  'bol_order_data_queue_id': page_line.bol_order_data_queue_id.id})
+        order_lines = self.create(vals_list)
+        page_lines.unlink()
+        return (self - page_lines) | order_lines
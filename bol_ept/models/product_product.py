@@ -0,0 +1,29 @@
+# -*- coding: UTF-8 -*-
+# See LICENSE file for full copyright and licensing details.
+from odoo import models, api
+
+class ProductProduct(models.Model):
+    _inherit = 'product.product'
+
+    @api.model
+    def get_bol_product_index(self, default_codes, barcodes):
+        """
+        This method is used to get the index of the active products of the given default codes and barcodes,
+        used to map the Bol offers to the Odoo products of a sync run without a search per offer.
+        :param default_codes: Default codes
+        :param barcodes: Barcodes
+        :return: Dictionary of default code and barcode, each mapping the value to the product ID
+        """
+        product_index = {'default_code': {}, 'barcode': {}}
+        default_codes = [default_code for default_code in default_codes if default_code]
+        barcodes = [barcode for barcode in barcodes if barcode]
+        if not default_codes and not barcodes:
+            return product_index
+        products = self.with_context(active_test=True).search_read(['|', ('default_code', 'in', default_codes),
+                                                                    ('barcode', 'in', barcodes)],
+                                                                   ['default_code', 'barcode'])
+        for product in products:
+            for field_name in ('default_code', 'barcode'):
+                if product[field_name]:
+                    product_index[field_name].setdefault(product[field_name], product['id'])
+        return product_index
@@ -1,19 +1,25 @@
 # -*- coding: UTF-8 -*-
 # See LICENSE file for full copyright and licensing details.
 
-import base64
 import csv
+import io
+import itertools
 import logging
+import mmap
+import os
+import tempfile
 import time
-from _io import StringIO
 
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
 
-from ..bol_api.bol_api import BolAPI
-
 _logger = logging.getLogger(__name__)
 
+_offer_file_header = "offerId,ean,conditionName,conditionCategory,conditionComment,bundlePricesPrice," \
+                     "fulfilmentDeliveryCode,stockAmount,onHoldByRetailer,fulfilmentType,mutationDateTime,referenceCode"
+# Rows of the offer file of which the products are indexed together, see bol.offer.ept.index_bol_products.
+_offer_row_batch_size = 500
+
 class BolProductSync(models.Model):
     _name = 'bol.product.sync.ept'
     _inherit = ['mail.thread']
@@ -82,12 +88,8 @@ class BolProductSync(models.Model):
         :return: response object, result
         @author : Ekta Bhut, 16th March 2021
         """
-        response_obj, result = BolAPI.post('export_offer_file',
-                                           self.bol_instance_id.bol_auth_token, {"format": "CSV"})
-        if response_obj.status_code == 401:
-            self.bol_instance_id.get_bol_token()
-            response_obj, result = BolAPI.post('export_offer_file',
-                                               self.bol_instance_id.bol_auth_token, {"format": "CSV"})
+        bol_api = self.bol_instance_id.get_bol_api()
+        response_obj, result = bol_api.post('export_offer_file', {"format": "CSV"})
         return response_obj, result
 
     def get_processed_product_sync_report(self):
@@ -96,19 +98,19 @@ class BolProductSync(models.Model):
         :return: Response Object, Result
         @author : Ekta Bhut, 16th March 2021
         """
-        request_process_obj, result = BolAPI.get('process_status',
-                                                 self.bol_instance_id.bol_auth_token, self.export_offer_file_id)
+        bol_api = self.bol_instance_id.get_bol_api()
+        request_process_obj, result = bol_api.get('process_status', self.export_offer_file_id)
         return request_process_obj, result
 
-    def get_product_report_file(self):
+    def get_product_report_file(self, file_obj):
         """
-        This method is used to get CSV report from Bol.com
-        :return: Response Onject, Result
+        This method is used to download the CSV report from Bol.com into the file.
+        :param file_obj: Binary file object
+        :return: Response Object
         @author : Ekta Bhut, 16th March 2021
         """
-        response_obj, result = BolAPI.get_csv('offer_file',
-                                              self.bol_instance_id.bol_auth_token, self.entity_id)
-        return response_obj, result
+        bol_api = self.bol_instance_id.get_bol_api()
+        return bol_api.get_csv_stream('offer_file', self.entity_id, file_obj)
 
     def request_file(self):
         """
@@ -134,7 +136,6 @@ class BolProductSync(models.Model):
                     self.export_offer_file_id = result.get('processStatusId')
                     request_process_obj, get_process_status_dict = self.get_processed_product_sync_report()
             else:
-                self.bol_instance_id.get_bol_token()
                 request_process_obj, get_process_status_dict = self.get_processed_product_sync_report()
         except Exception as e:
             bol_job and bol_job.write({'log_lines': [(0, 0, {'message': e})]})
@@ -156,7 +157,6 @@ class BolProductSync(models.Model):
         log_book_obj = self.env['common.log.book.ept']
         if not self.entity_id:
             raise Warning(_('Entity Id does not exists, Please first request product file'))
-        bol_instance_id = self.bol_instance_id
         model_id = self.env['ir.model']._get('bol.product.sync.ept').id
         message = "Perform Operation for Get Product file from bol.com"
         bol_job = log_book_obj.search([('res_id', '=', self.id), ('model_id', '=', model_id), ('bol_instance_id', '=',
@@ -164,30 +164,47 @@ class BolProductSync(models.Model):
         if not bol_job:
             bol_job = log_book_obj.bol_create_common_log_book('import', self.bol_instance_id, model_id,
                                                               message, self.id)
+        file_descriptor, file_path = tempfile.mkstemp(prefix='bol_offers_', suffix='.csv')
         try:
-            response_obj, response = self.get_product_report_file()
-            if response_obj.status_code == 401:
-                bol_instance_id.get_bol_token()
-                response_obj, response = self.get_product_report_file()
-        except Exception as e:
-            bol_job.write({'log_lines': [(0, 0, {'message': e})]})
-            return True
-        if not response.__contains__(
-                "offerId,ean,conditionName,conditionCategory,conditionComment,bundlePricesPrice,"
-                "fulfilmentDeliveryCode,stockAmount,onHoldByRetailer,fulfilmentType,mutationDateTime,referenceCode"):
-            bol_job.write({'log_lines': [(0, 0, {'message': "Response not in proper format\n%s" % response})]})
-            return True
-        if response_obj.status_code == 200:
-            file_name = self.name + time.strftime("%Y_%m_%d_%H%M%S") + "_offers.csv"
-            attachment = self.env['ir.attachment'].create({
-                'name': file_name, 'res_model': 'mail.compose.message', 'type': 'binary',
-                'datas': base64.b64encode(response.encode(encoding='utf_8', errors='strict'))})
-            self.sudo().message_post(body=_("<b>Product File Downloaded</b>"), attachment_ids=attachment.ids)
-            self.write({'attachment_id': attachment.id, 'state': 'downloaded'})
+            try:
+                with os.fdopen(file_descriptor, 'wb') as csv_file:
+                    response_obj = self.get_product_report_file(csv_file)
+            except Exception as e:
+                bol_job.write({'log_lines': [(0, 0, {'message': e})]})
+                return True
+            with open(file_path, encoding='utf_8', errors='replace') as csv_file:
+                first_line = csv_file.readline()
+                if not first_line.startswith(_offer_file_header):
+                    bol_job.write({'log_lines': [(0, 0, {
+                        'message': "Response not in proper format\n%s" % (first_line + csv_file.read(1000))})]})
+                    return True
+            if response_obj.status_code == 200:
+                file_name = self.name + time.strftime("%Y_%m_%d_%H%M%S") + "_offers.csv"
+                attachment = self.create_attachment_from_file(file_path, file_name)
+                self.sudo().message_post(body=_("<b>Product File Downloaded</b>"), attachment_ids=attachment.ids)
+                self.write({'attachment_id': attachment.id, 'state': 'downloaded'})
+        finally:
+            if os.path.exists(file_path):
+                os.remove(file_path)
         if not bol_job.log_lines:
             bol_job.unlink()
         return True
 
+    def create_attachment_from_file(self, file_path, file_name):
+        """
+        This method is used to create the attachment of a downloaded file. The file is mapped in memory and
+        given as raw to the ORM, so the storage of the database applies to it and the content is written to the
+        storage from the file, without a copy of it in memory.
+        The mimetype is not text, so no index content is built from the whole file.
+        :param file_path: Path of the downloaded file
+        :param file_name: Name of the attachment
+        :return: Attachment
+        """
+        with open(file_path, 'rb') as csv_file, mmap.mmap(csv_file.fileno(), 0, access=mmap.ACCESS_READ) as raw:
+            return self.env['ir.attachment'].create({'name': file_name, 'res_model': 'mail.compose.message',
+                                                     'type': 'binary', 'mimetype': 'application/octet-stream',
+                                                     'raw': raw})
+
     def process_file(self):
         """
         This method is used to process file for product.
@@ -199,12 +216,11 @@ class BolProductSync(models.Model):
         if not self.bol_instance_id:
             raise Warning(_("Instance not found "))
 
-        imp_file = StringIO(base64.b64decode(self.attachment_id.datas).decode())
-        reader = csv.DictReader(imp_file, delimiter=',')
         model_id = self.env['ir.model']._get('bol.product.sync.ept').id,
         log_book_obj = self.env['common.log.book.ept']
         transaction_log_obj = self.env['common.log.lines.ept']
-        bol_offer_obj = self.env['bol.offer.ept']
+        # The offers and products of the file are looked up in indexes built for the file.
+        bol_offer_obj = self.env['bol.offer.ept'].with_context(bol_offer_index={}, bol_product_index={})
         log_rec = log_book_obj.search([('res_id', '=', self.id), ('model_id', '=', model_id), ('bol_instance_id', '=',
                                                                                                self.bol_instance_id.id)])
         if not log_rec:
@@ -212,17 +228,38 @@ class BolProductSync(models.Model):
                                                               "", self.id)
 
         instance_id = self.bol_instance_id
-        for row in reader:
-            bol_offer_id = row.get('offerId') or ''
-            _logger.info("processing bol product with offer id %s", bol_offer_id)
-            bol_offer_obj.sync_product(instance_id, log_rec, bol_offer_id, self.update_price_in_pricelist,
-                                       self.auto_create_product)
+        with self.open_attachment_file() as imp_file:
+            reader = csv.DictReader(imp_file, delimiter=',')
+            rows = list(itertools.islice(reader, _offer_row_batch_size))
+            while rows:
+                bol_offer_obj.index_bol_products([row.get('referenceCode') for row in rows],
+                                                 [row.get('ean') for row in rows])
+                for row in rows:
+                    bol_offer_id = row.get('offerId') or ''
+                    _logger.info("processing bol product with offer id %s", bol_offer_id)
+                    bol_offer_obj.sync_product(instance_id, log_rec, bol_offer_id, self.update_price_in_pricelist,
+                                               self.auto_create_product)
+                rows = list(itertools.islice(reader, _offer_row_batch_size))
 
         self.write({'state': 'processed'})
         if not log_rec.log_lines:
             log_rec.unlink()
         return True
 
+    def open_attachment_file(self):
+        """
+        This method is used to open the attachment as text file, so the rows can be read one by one. The file of
+        the filestore is read as it is, the content is loaded only when the attachment is stored elsewhere.
+        :return: File object
+        """
+        attachment = self.attachment_id
+        full_path = attachment.store_fname and attachment._full_path(attachment.store_fname)
+        if full_path and os.path.isfile(full_path):
+            binary_file = open(full_path, 'rb')
+        else:
+            binary_file = io.BytesIO(attachment.raw)
+        return io.TextIOWrapper(binary_file, encoding='utf_8', errors='replace', newline='')
+
     def list_of_logs(self):
         """
         This Method relocate mismatch log.
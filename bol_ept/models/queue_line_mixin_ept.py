@@ -0,0 +1,72 @@
+# -*- coding: UTF-8 -*-
+# See LICENSE file for full copyright and licensing details.
+import uuid
+from datetime import timedelta
+
+from odoo import models, fields
+
+# Failed lines are claimed again until they are processed this number of times, see claim_queue_lines.
+_max_queue_line_attempts = 3
+# Time after which a failed line is claimed again.
+_failed_queue_line_retry_delay = timedelta(minutes=15)
+
+class BolQueueLineMixinEpt(models.AbstractModel):
+    """ Mixin class for the queue lines processed by several queue workers."""
+    _name = 'bol.queue.line.mixin.ept'
+    _description = 'Bol Queue Line Mixin'
+
+    # Many2one field of the line to its queue, set by the inheriting model.
+    _bol_queue_field = None
+
+    claim_token = fields.Char(readonly=True, copy=False,
+                              help="Queue worker which claimed the line, see claim_queue_lines.")
+    claim_expires_at = fields.Datetime(readonly=True, copy=False, index=True,
+                                       help="The line can be claimed by another queue worker after this time.")
+
+    def claim_queue_lines(self, batch_size, claim_seconds):
+        """
+        This method is used to claim a batch of draft queue lines for a queue worker. The lines are locked with
+        SKIP LOCKED, so the workers running at the same time never claim the same line. The claim is committed at
+        once and expires after claim_seconds, then the lines can be claimed again if the worker crashed.
+        Failed lines are claimed again after a delay, until they are processed _max_queue_line_attempts times.
+        :param batch_size: Maximum number of lines to claim
+        :param claim_seconds: Seconds the claim is valid
+        :return: 1) Claimed queue lines, 2) IDs of the claimed lines of which an earlier claim expired
+        """
+        now = fields.Datetime.now()
+        queue_field = self._fields[self._bol_queue_field]
+        query = """WITH claimable AS (
+                        SELECT queue_line.id, queue_line.claim_expires_at
+                        FROM %(line_table)s AS queue_line
+                        INNER JOIN %(queue_table)s AS queue ON queue_line.%(queue_column)s = queue.id
+                        WHERE (queue_line.state = 'draft'
+                               OR (queue_line.state = 'failed' AND queue_line.attempt_count < %%s
+                                   AND queue_line.processed_at < %%s))
+                        AND queue.is_action_require IS NOT TRUE
+                        AND (queue_line.claim_expires_at IS NULL OR queue_line.claim_expires_at < %%s)
+                        ORDER BY queue_line.id
+                        LIMIT %%s
+                        FOR UPDATE OF queue_line SKIP LOCKED)
+                    UPDATE %(line_table)s AS queue_line
+                    SET claim_token = %%s, claim_expires_at = %%s
+                    FROM claimable
+                    WHERE queue_line.id = claimable.id
+                    RETURNING queue_line.id, claimable.claim_expires_at IS NOT NULL""" % {
+            'line_table': self._table,
+            'queue_table': self.env[queue_field.comodel_name]._table,
+            'queue_column': queue_field.name}
+        self._cr.execute(query, (_max_queue_line_attempts, now - _failed_queue_line_retry_delay, now, batch_size,
+                                 uuid.uuid4().hex, now + timedelta(seconds=claim_seconds)))
+        result = self._cr.fetchall()
+        self._cr.commit()
+        line_ids = [line_id for line_id, reclaimed in result]
+        self.invalidate_cache(['claim_token', 'claim_expires_at'], line_ids)
+        return self.browse(line_ids), [line_id for line_id, reclaimed in result if reclaimed]
+
+    def release_queue_lines(self):
+        """
+        This method is used to release the claim of the queue lines.
+        :return: True
+        """
+        self.write({'claim_token': False, 'claim_expires_at': False})
+        return True
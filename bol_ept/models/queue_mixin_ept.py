@@ -0,0 +1,172 @@
+# -*- coding: UTF-8 -*-
+# See LICENSE file for full copyright and licensing details.
+import logging
+import time
+
+from psycopg2 import OperationalError
+
+from odoo import models, api
+
+_logger = logging.getLogger(__name__)
+
+# Queue lines claimed together by a queue worker.
+_queue_line_batch_size = 50
+
+class BolQueueMixinEpt(models.AbstractModel):
+    """ Mixin class for the queues processed by several queue workers. The inheriting model processes its lines
+    with process_bol_queue_lines(queue_lines, log_book)."""
+    _name = 'bol.queue.mixin.ept'
+    _description = 'Bol Queue Mixin'
+
+    # Queue line model, One2many field of the queue to its lines and queue worker cron, set by the inheriting model.
+    _bol_queue_line_model = None
+    _bol_queue_lines_field = None
+    _bol_queue_cron = None
+
+    @api.model
+    def auto_process_bol_queue(self):
+        """
+        This method is used to process the queues, it is called by every queue worker cron.
+        The worker claims a batch of draft queue lines, processes it and claims the next one until no line is
+        left or the time of the cron is over. The workers running at the same time never get the same line, see
+        bol.queue.line.mixin.ept.claim_queue_lines.
+        :return: True
+        """
+        # The offers of the order lines are looked up in indexes built once for the cron run, see
+        # bol.offer.ept.search_bol_product.
+        self = self.with_context(bol_offer_index={})
+        queue_line_obj = self.env[self._bol_queue_line_model]
+        queue_field = queue_line_obj._bol_queue_field
+        cron_time = self.env['bol.instance.ept'].get_bol_cron_execution_time(self._bol_queue_cron)
+        start = time.time()
+        processed_queues = self.browse()
+        while time.time() - start < cron_time - 60:
+            queue_lines, reclaimed_line_ids = queue_line_obj.claim_queue_lines(_queue_line_batch_size, cron_time)
+            if not queue_lines:
+                break
+            crashed_queues = queue_line_obj.browse(reclaimed_line_ids).mapped(queue_field)
+            action_queues = crashed_queues.filtered(lambda queue: queue.count_queue_crash())
+            if action_queues:
+                action_lines = queue_lines.filtered(lambda line: line[queue_field] in action_queues)
+                action_lines.release_queue_lines()
+                queue_lines -= action_lines
+            for queue in queue_lines.mapped(queue_field):
+                queue.process_claimed_queue_lines(queue_lines.filtered(lambda line: line[queue_field] == queue))
+                processed_queues |= queue
+        for queue in processed_queues:
+            queue.safe_update_queue_state()
+        return True
+
+    def process_order_queue(self):
+        """
+        This method is used to process the draft and failed lines of the queue manually, in batches of
+        _queue_line_batch_size lines.
+        :return: True
+        """
+        # The offers of the order lines are looked up in indexes built once for the run.
+        self = self.with_context(bol_offer_index={})
+        log_book = self.get_queue_log_book(clear_log_lines=True)
+        queue_lines = self[self._bol_queue_lines_field].filtered(lambda line: line.state in ['draft', 'failed'])
+        queue_lines = queue_lines.split_page_queue_lines()
+        for start in range(0, len(queue_lines), _queue_line_batch_size):
+            self.process_bol_queue_lines(queue_lines[start:start + _queue_line_batch_size], log_book)
+            self._cr.commit()
+
+        if log_book and not log_book.log_lines:
+            log_book.unlink()
+
+        self.update_queue_state()
+        return True
+
+    def get_queue_log_book(self, clear_log_lines=False):
+        """
+        This method is used to get the log book of the queue, it is created if not found.
+        :param clear_log_lines: Remove the log lines of the earlier processing
+        :return: Log book
+        """
+        common_log_book_obj = self.env['common.log.book.ept']
+        model_id = self.env['ir.model']._get(self._name).id
+        log_book = common_log_book_obj.search([('model_id', '=', model_id), ('res_id', '=', self.id)])
+        if len(log_book) > 1:
+            if not clear_log_lines:
+                return log_book[0]
+            log_book.unlink()
+            log_book = common_log_book_obj
+
+        if clear_log_lines and log_book and log_book.log_lines:
+            log_book.log_lines.unlink()
+
+        if not log_book:
+            log_book_vals = {
+                'type': 'import',
+                'model_id': model_id,
+                'res_id': self.id,
+                'bol_instance_id': self.bol_instance_id.id,
+                'module': 'bol_ept',
+                'active': True
+            }
+            log_book = common_log_book_obj.create(log_book_vals)
+        return log_book
+
+    def update_queue_state(self):
+        """
+        This method is used to set the state of the queue from the state of its lines.
+        :return: True
+        """
+        status = self[self._bol_queue_lines_field].filtered(lambda x: x.state in ('draft', 'failed'))
+        if status:
+            self.write({'state': 'partial'})
+        else:
+            self.write({'state': 'done'})
+        return True
+
+    def process_claimed_queue_lines(self, queue_lines):
+        """
+        This method is used to process the queue lines of the queue claimed by the worker, the result is
+        committed and the claim is released.
+        :param queue_lines: Claimed queue lines of the queue
+        :return: True
+        """
+        log_book = self.get_queue_log_book()
+        queue_lines = queue_lines.split_page_queue_lines()
+        self.process_bol_queue_lines(queue_lines, log_book)
+        queue_lines.release_queue_lines()
+        self._cr.commit()
+        self.safe_update_queue_state()
+        return True
+
+    def safe_update_queue_state(self):
+        """
+        This method is used to update the state of the queue while other workers process lines of the same
+        queue. If a worker updates the queue at the same time, the update is skipped, the last worker of the
+        queue sets the final state.
+        :return: True
+        """
+        try:
+            with self._cr.savepoint():
+                self.update_queue_state()
+        except OperationalError:
+            _logger.info("Queue %s is updated by another worker, its state is not updated.", self.name)
+            return True
+        self._cr.commit()
+        return True
+
+    def count_queue_crash(self):
+        """
+        This method is used to count a crash of a worker on the queue, it is detected when the claim of its
+        lines expired. After 3 crashes the queue needs to be processed manually and a message is posted.
+        :return: True if the queue needs to be processed manually
+        """
+        common_log_book_obj = self.env["common.log.book.ept"]
+        # For counting the queue crashes and creating schedule activity for the queue.
+        self.queue_process_count += 1
+        if self.queue_process_count > 3:
+            self.is_action_require = True
+            note = "<p>Need to process this product queue manually.There are 3 attempts been made by " \
+                   "automated action to process this queue,<br/>- Ignore, if this queue is already processed.</p>"
+            self.message_post(body=note)
+            if self.bol_instance_id.is_bol_create_schedule:
+                model_id = self.env['ir.model']._get(self._name).id
+                common_log_book_obj.create_crash_queue_schedule_activity(self, model_id, note)
+        self._cr.commit()
+        return self.is_action_require
@@ -1,8 +1,56 @@
 # -*- coding: UTF-8 -*-
 # See LICENSE file for full copyright and licensing details.
-from odoo import models, fields
+import hashlib
+
+from odoo import models, fields, api
+
+# Address fields of the partner used by the address fingerprint, see get_bol_address_fingerprint.
+_address_fingerprint_fields = ['name', 'street', 'street2', 'city', 'zip', 'phone', 'country_id']
 
 class ResPartner(models.Model):
     _inherit = 'res.partner'
 
     is_bol_customer = fields.Boolean("Is Bol Customer?")
+    bol_address_fingerprint = fields.Char("Address Fingerprint", index=True, copy=False, readonly=True,
+                                          help="Hash of the normalized address of a Bol customer, used to find the "
+                                               "Bol customers.")
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        partners = super(ResPartner, self).create(vals_list)
+        partners.filtered('is_bol_customer').set_bol_address_fingerprint()
+        return partners
+
+    def write(self, vals):
+        res = super(ResPartner, self).write(vals)
+        if 'is_bol_customer' in vals or any(field_name in vals for field_name in _address_fingerprint_fields):
+            self.filtered('is_bol_customer').set_bol_address_fingerprint()
+        return res
+
+    def set_bol_address_fingerprint(self):
+        """
+        This method is used to store the address fingerprint of the Bol customers, only they are searched by it.
+        :return: True
+        """
+        for partner in self:
+            fingerprint = self.get_bol_address_fingerprint(
+                    {field_name: partner[field_name] for field_name in _address_fingerprint_fields})
+            if partner.bol_address_fingerprint != fingerprint:
+                partner.write({'bol_address_fingerprint': fingerprint})
+        return True
+
+    @api.model
+    def get_bol_address_fingerprint(self, vals):
+        """
+        This method is used to get the fingerprint of an address. The values are compared case insensitive and
+        with the spaces normalized, like the =ilike search of _find_partner_ept.
+        :param vals: Dictionary of the address fields, the country as record or ID
+        :return: Fingerprint
+        """
+        values = []
+        for field_name in _address_fingerprint_fields:
+            value = vals.get(field_name)
+            if isinstance(value, models.BaseModel):
+                value = value.id
+            values.append(" ".join(str(value).split()).lower() if value else "")
+        return hashlib.sha1("|".join(values).encode('utf-8')).hexdigest()
@@ -7,13 +7,15 @@ from datetime import datetime
 
 import pytz
 from dateutil import parser
+from psycopg2 import IntegrityError, errorcodes
 from odoo import models, fields, api
 
-from ..bol_api.bol_api import BolAPI
-
 utc = pytz.utc
 _logger = logging.getLogger(__name__)
 
+# Orders of which the auto workflow is processed together, see auto_process_bol_order_workflow.
+_workflow_batch_size = 50
+
 class SaleOrder(models.Model):
     _inherit = 'sale.order'
 
@@ -66,32 +68,34 @@ class SaleOrder(models.Model):
     updated_in_bol = fields.Boolean(compute="_get_bol_order_status", search="_search_bol_order_ids")
     bol_order_id = fields.Char(string="Bol Order ID", copy=False)
     bol_fulfillment_by = fields.Selection([('FBR', 'FBR'), ('FBB', 'FBB')], default='FBR', copy=False)
+    bol_workflow_pending = fields.Boolean("Auto Workflow Pending", copy=False, index=True,
+                                          help="The auto workflow of the imported order is not processed yet.")
 
-    _sql_constraints = [('unique_bol_order',
-                         'unique(bol_instance_id,bol_order_number,bol_fulfillment_by)',
+    _sql_constraints = [('unique_bol_instance_order',
+                         'unique(bol_instance_id,bol_fulfillment_by,bol_order_id)',
                          "Bol order must be Unique.")]
 
     # Following methods are there for Process bol open orders
-    def process_bol_open_order_queue_line(self, instance, queue_line, fulfillment_by, log_rec):
+    def process_bol_open_order_queue_line(self, instance, queue_lines, fulfillment_by, log_rec):
         """
-        This method is used to Process bol open order queue line.
+        This method is used to Process bol open order queue lines, every line holds one order.
         :param instance: Bol Instance
         :param fulfillment_by: FBB or FBR
-        :param queue_line: Queue line
+        :param queue_lines: Queue lines
         :param log_rec: Common log book record
         :return:
         """
+        # The partners found or created for the orders of the batch, see search_or_create_bol_partner_ept, the
+        # onchange values of the orders, see create_sales_order_vals_ept, and the countries and states of the
+        # addresses, see res.partner.get_country.
+        self = self.with_context(bol_partner_cache={}, onchange_cache_ept={}, lookup_cache_ept={})
         log_lines = []
-        order_queue_data = json.loads(queue_line.bol_order_data)
-        order_data_temp = []
-        count = 0
-        for order_data in order_queue_data:
-            logs = []
-            count = count + 1
-            if count == 10:
-                count = 0
-                self._cr.commit()
-            bol_order_id = order_data.get('orderId')
+        pending_queue_lines = []
+        duplicate_queue_lines = []
+        existing_orders = self.get_bol_orders(instance, queue_lines.mapped('bol_order_id'), fulfillment_by)
+        for queue_line in queue_lines:
+            order_data = json.loads(queue_line.bol_order_data)
+            bol_order_id = queue_line.bol_order_id
             date_order = order_data.get('orderPlacedDateTime')
             date_order = parser.parse(date_order).astimezone(utc).strftime('%Y-%m-%d %H:%M:%S')
             order_date = datetime.strptime(date_order, '%Y-%m-%d %H:%M:%S')
@@ -102,34 +106,261 @@ class SaleOrder(models.Model):
                     queue_line.id, 'order_ref': bol_order_id}
                 log_lines.append([0, 0, vals])
                 _logger.info(message)
+                queue_line.write({'state': 'cancel', 'error_message': message,
+                                  'processed_at': fields.Datetime.now()})
                 continue
-            is_order_exist = self.search_bol_order_exist_or_not(instance, bol_order_id,
-                                                                fulfillment_by)
-            if is_order_exist:
-                order_data_temp.append(order_data)
+            existing_order = existing_orders.get(bol_order_id)
+            if existing_order:
+                queue_line.write({'state': 'done', 'sale_order_id': existing_order.id, 'error_message': False,
+                                  'processed_at': fields.Datetime.now()})
                 continue
+            pending_queue_lines.append(queue_line)
+
+        order_responses = self.prefetch_bol_responses(instance, 'single_order',
+                                                      [queue_line.bol_order_id for queue_line in
+                                                       pending_queue_lines])
+        created_orders = self.create_bol_orders_from_queue_lines(
+                self.prepare_bol_order_ept, instance, pending_queue_lines, fulfillment_by,
+                {queue_line.id: order_responses.get(queue_line.bol_order_id) for queue_line in pending_queue_lines},
+                log_rec)
+        for queue_line in pending_queue_lines:
+            logs = []
+            order = False
+            bol_order_id = queue_line.bol_order_id
+            order_response = order_responses.get(bol_order_id)
+            if order_response:
+                order, logs = created_orders.get(queue_line.id) or self.create_bol_order_from_queue_line(
+                        self.create_bol_order_ept, instance, queue_line, fulfillment_by, order_response, log_rec)
+                if order is None:
+                    duplicate_queue_lines.append(queue_line)
+                    continue
+                if order:
+                    # The auto workflow is processed later in batches, see auto_process_bol_order_workflow.
+                    order.write({'bol_workflow_pending': True})
             else:
+                message = "Order can not be found with open order API %s" % bol_order_id
+                vals = {'message': message, 'log_book_id': log_rec.id, 'bol_order_data_queue_line_id':
+                    queue_line.id, 'order_ref': bol_order_id}
+                logs.append([0, 0, vals])
+                _logger.info(message)
+            self.set_bol_queue_line_result(queue_line, order, logs)
+            self._cr.commit()
+            log_lines = log_lines + logs
+        log_rec.write({'log_lines': log_lines})
+        if duplicate_queue_lines:
+            # The orders created by the other process are visible in a new transaction only.
+            self._cr.commit()
+        self.set_bol_duplicate_queue_lines_result(instance, duplicate_queue_lines, fulfillment_by)
+        return True
 
-                order_response = self.get_single_order_response(instance, bol_order_id)
-                if order_response:
-                    order, logs = self.create_bol_order_ept(instance, queue_line, fulfillment_by,
-                                                            order_response, log_rec)
-                    if order:
-                        order_data_temp.append(order_data)
+    def create_bol_order_from_queue_line(self, create_method, instance, queue_line, fulfillment_by, order_response,
+                                         log_rec):
+        """
+        This method is used to create the order of a queue line in a savepoint, so an error fails only this line.
+        :param create_method: create_bol_order_ept or create_bol_shipped_order_ept, their prepare method or
+                              create_prepared_bol_order_ept
+        :param instance: Bol Instance
+        :param queue_line: Queue line
+        :param fulfillment_by: FBB or FBR
+        :param order_response: Order or shipment response
+        :param log_rec: Common log book record
+        :return: Order, False if it is not created or None if it is created by another process meanwhile,
+                 Log lines
+        """
+        try:
+            with self._cr.savepoint():
+                return create_method(instance, queue_line, fulfillment_by, order_response, log_rec)
+        except IntegrityError as error:
+            if error.pgcode != errorcodes.UNIQUE_VIOLATION or error.diag.constraint_name != \
+                    'sale_order_unique_bol_instance_order':
+                raise
+            _logger.info("Order %s is already created by another process.", queue_line.bol_order_id)
+            return None, []
+        except Exception as error:
+            message = "Order %s is not created: %s" % (queue_line.bol_order_id, error)
+            _logger.exception(message)
+            queue_line_field = 'bol_order_data_queue_line_id'
+            if queue_line._name == 'bol.shipped.data.queue.line.ept':
+                queue_line_field = 'bol_shipped_order_queue_line_id'
+            return False, [[0, 0, {'message': message, 'log_book_id': log_rec.id, queue_line_field: queue_line.id,
+                                   'order_ref': queue_line.bol_order_id}]]
+
+    def create_bol_orders_from_queue_lines(self, prepare_method, instance, queue_lines, fulfillment_by, responses,
+                                           log_rec):
+        """
+        This method is used to create the orders of many queue lines at once. The lines of every order are mapped
+        to the offers first and an order with an unmapped line is dropped, then all the orders and all their
+        lines are created with one create per model. If the creation fails, e.g. an order is created by another
+        process meanwhile, the prepared orders are created one by one, they are not prepared again.
+        :param prepare_method: prepare_bol_order_ept or prepare_bol_shipped_order_ept
+        :param instance: Bol Instance
+        :param queue_lines: Queue lines
+        :param fulfillment_by: FBB or FBR
+        :param responses: Dictionary of queue line ID and order or shipment response
+        :param log_rec: Common log book record
+        :return: Dictionary of queue line ID and (Order or False, Log lines)
+        """
+        results = {}
+        prepared_orders = []
+        bol_order_ids = set()
+        for queue_line in queue_lines:
+            response = responses.get(queue_line.id)
+            # Shipments of the same order are left to the caller, the order is created once.
+            if not response or queue_line.bol_order_id in bol_order_ids:
+                continue
+            bol_order_ids.add(queue_line.bol_order_id)
+            prepared_order, logs = self.create_bol_order_from_queue_line(prepare_method, instance, queue_line,
+                                                                         fulfillment_by, response, log_rec)
+            if prepared_order:
+                prepared_orders.append((queue_line, prepared_order, logs))
+            else:
+                results[queue_line.id] = (False, logs)
+        if not prepared_orders:
+            return results
+        try:
+            with self._cr.savepoint():
+                orders = self.create_bol_orders_from_prepared_vals(
+                        [prepared_order for queue_line, prepared_order, logs in prepared_orders])
+        except Exception as error:
+            _logger.info("Orders of %s queue lines are not created at once, they are created one by one: %s",
+                         len(prepared_orders), error)
+            for queue_line, prepared_order, logs in prepared_orders:
+                order, create_logs = self.create_bol_order_from_queue_line(
+                        self.create_prepared_bol_order_ept, instance, queue_line, fulfillment_by, prepared_order,
+                        log_rec)
+                results[queue_line.id] = (order, logs + create_logs)
+            return results
+        for order, (queue_line, prepared_order, logs) in zip(orders, prepared_orders):
+            results[queue_line.id] = (order, logs)
+        return results
+
+    def create_prepared_bol_order_ept(self, instance, queue_line, fulfillment_by, prepared_order, log_rec):
+        """
+        This method is used to create the order of a queue line from its prepared values, it is given as create
+        method to create_bol_order_from_queue_line.
+        :param instance: Bol Instance
+        :param queue_line: Queue line
+        :param fulfillment_by: FBB or FBR
+        :param prepared_order: Order vals and mapped order lines, see prepare_bol_order_ept
+        :param log_rec: Common log book record
+        :return: Order, Log lines
+        """
+        return self.create_bol_orders_from_prepared_vals([prepared_order]), []
+
+    def create_bol_orders_from_prepared_vals(self, prepared_orders):
+        """
+        This method is used to create the orders and their lines from the prepared values.
+        :param prepared_orders: List of order vals and mapped order lines, see prepare_bol_order_ept
+        :return: Orders, in the order of prepared_orders
+        """
+        sale_order_line_obj = self.env['sale.order.line']
+        orders = self.create([order_vals for order_vals, mapped_lines in prepared_orders])
+        order_line_vals_list = []
+        for order, (order_vals, mapped_lines) in zip(orders, prepared_orders):
+            for order_line, bol_product in mapped_lines:
+                order_line_vals_list.append(self.prepare_bol_order_line_vals(order, order_line, bol_product))
+        sale_order_line_obj.create(order_line_vals_list)
+        return orders
+
+    @api.model
+    def auto_process_bol_order_workflow(self):
+        """
+        This method is used to process the auto workflow of the imported open orders, it is called by the cron.
+        The orders are taken in batches and the orders of the same workflow are confirmed, invoiced and paid
+        together, see process_bol_order_workflow.
+        :return: True
+        """
+        cron_time = self.env['bol.instance.ept'].get_bol_cron_execution_time(
+                "bol_ept.ir_cron_process_bol_order_workflow")
+        start = time.time()
+        while time.time() - start < cron_time - 60:
+            orders = self.search([('bol_workflow_pending', '=', True)], limit=_workflow_batch_size, order='id')
+            if not orders:
+                break
+            for instance in orders.bol_instance_id:
+                instance_orders = orders.filtered(lambda order: order.bol_instance_id == instance)
+                for workflow in instance_orders.auto_workflow_process_id:
+                    instance_orders.filtered(
+                            lambda order: order.auto_workflow_process_id == workflow).process_bol_order_workflow()
+            orders.filtered(lambda order: not order.auto_workflow_process_id or not order.bol_instance_id).write(
+                    {'bol_workflow_pending': False})
+            self._cr.commit()
+        return True
+
+    def process_bol_order_workflow(self):
+        """
+        This method is used to process the auto workflow of orders of the same instance and workflow at once. If it
+        fails, the orders are processed one by one and the error of an order is posted on it and written to the
+        log book of the workflow.
+        :return: True
+        """
+        common_log_line_obj = self.env['common.log.lines.ept']
+        model_id = self.env['ir.model']._get('sale.order').id
+        log_book = self.env['common.log.book.ept'].bol_create_common_log_book(
+                'import', self.bol_instance_id[:1], model_id, "Perform Operation for the auto workflow of orders",
+                False)
+        # The orders of which the invoice date is locked are written to the log book, see is_invoice_date_locked_ept.
+        self = self.with_context(log_book_id=log_book.id)
+        try:
+            with self._cr.savepoint():
+                self.process_orders_and_invoices_batch_ept()
+        except Exception as error:
+            _logger.info("Auto workflow of %s orders is not processed at once, they are processed one by one: %s",
+                         len(self), error)
+            for order in self:
+                try:
+                    with self._cr.savepoint():
                         order.process_orders_and_invoices_ept()
-                    self._cr.commit()
-                else:
-                    message = "Order can not be found with open order API %s" % bol_order_id
-                    vals = {'message': message, 'log_book_id': log_rec.id, 'bol_order_data_queue_line_id':
-                        queue_line.id, 'order_ref': bol_order_id}
-                    logs.append([0, 0, vals])
-                    _logger.info(message)
-                log_lines = log_lines + logs
-        log_rec.write({'log_lines': log_lines})
-        order_queue_data = [item for item in order_queue_data if item not in order_data_temp]
-        queue_line.write({'bol_order_data': json.dumps(order_queue_data) if order_queue_data else ''})
+                except Exception as order_error:
+                    _logger.exception("Auto workflow of order %s failed", order.name)
+                    message = "Auto workflow of the order failed: %s" % order_error
+                    order.message_post(body=message)
+                    common_log_line_obj.create({'message': message, 'order_ref': order.name,
+                                                'log_book_id': log_book.id})
+        self.write({'bol_workflow_pending': False})
+        if not log_book.log_lines:
+            log_book.unlink()
+        self._cr.commit()
         return True
 
+    def set_bol_queue_line_result(self, queue_line, order, logs):
+        """
+        This method is used to set the state of a queue line after its order is processed.
+        :param queue_line: Queue line
+        :param order: Created order or False
+        :param logs: Log lines of the order
+        :return: True
+        """
+        vals = {'attempt_count': queue_line.attempt_count + 1, 'processed_at': fields.Datetime.now()}
+        if order:
+            vals.update({'state': 'done', 'sale_order_id': order.id, 'error_message': False})
+        else:
+            messages = [str(log[2].get('message')) for log in logs]
+            vals.update({'state': 'failed', 'error_message': "\n".join(messages) or False})
+        queue_line.write(vals)
+        return True
+
+    def prefetch_bol_responses(self, instance, endpoint, resource_ids):
+        """
+        This method is used to fetch the details of many Bol resources concurrently, before the records are
+        created. Only the HTTP calls run in the threads of the Bol API client, the ORM work stays on the cursor
+        of the caller.
+        :param instance: Bol Instance
+        :param endpoint: Endpoint, 'single_order' or 'single_shipment_list'
+        :param resource_ids: Order IDs or Shipment IDs
+        :return: Dictionary of resource ID and response, the response is empty if the resource is not found.
+        """
+        resource_responses = {}
+        if not resource_ids:
+            return resource_responses
+        results = instance.get_bol_api().get_many(endpoint, [str(resource_id) for resource_id in resource_ids])
+        for resource_id, (response_obj, response) in zip(resource_ids, results):
+            if not response_obj or response_obj.status_code == 404:
+                _logger.info("%s %s NOT FOUND SO SKIP IT" % (endpoint, resource_id))
+                response = {}
+            resource_responses[resource_id] = response
+        return resource_responses
+
     def get_single_order_response(self, instance, bol_order_id):
         """
         This method is used to get single order response
@@ -138,16 +369,8 @@ class SaleOrder(models.Model):
         :return: Order Response
         @author : Ekta Bhut
         """
-        response_obj, order_response = BolAPI.get('single_order', instance.bol_auth_token,
-                                                  bol_order_id)
-        if response_obj.status_code in [400, 401]:
-            instance.get_bol_token()
-            response_obj, order_response = BolAPI.get('single_order', instance.bol_auth_token,
-                                                      bol_order_id)
-        if response_obj.status_code == 429:
-            time.sleep(5)
-            response_obj, order_response = BolAPI.get('single_order', instance.bol_auth_token,
-                                                      bol_order_id)
+        bol_api = instance.get_bol_api()
+        response_obj, order_response = bol_api.get('single_order', bol_order_id)
         if response_obj.status_code == 404:
             _logger.info("ORDER %s NOT FOUND SO SKIP IT" % bol_order_id)
             return {}
@@ -162,6 +385,23 @@ class SaleOrder(models.Model):
         :return:
         @author : Ekta Bhut
         """
+        prepared_order, log_lines = self.prepare_bol_order_ept(instance, queue_line, fulfillment_by, order_data,
+                                                               log_rec)
+        if not prepared_order:
+            return False, log_lines
+        return self.create_bol_orders_from_prepared_vals([prepared_order]), log_lines
+
+    def prepare_bol_order_ept(self, instance, queue_line, fulfillment_by, order_data, log_rec):
+        """
+        This method is used to prepare the values of a Bol open order and to map its lines to the offers. Only the
+        partners are created, the order is not.
+        :param instance: Bol Instance
+        :param queue_line: Queue line or False
+        :param fulfillment_by: FBB or FBR
+        :param order_data: Order response
+        :param log_rec: Common log book record
+        :return: Order vals and mapped order lines or False if a line is not mapped, Log lines
+        """
         log_lines = []
         res_partner_obj = self.env['res.partner']
         partner_resposne = order_data.get('billingDetails') and order_data.get('billingDetails').get(
@@ -175,67 +415,87 @@ class SaleOrder(models.Model):
         vals = self.prepare_vals_for_bol_order(instance, order_data, partner or partner_invoice_id,
                                                partner_invoice_id, partner_shipping_id,
                                                fulfillment_by)
-        order = self.create(vals)
-        logs, skip_order = self.create_bol_order_line(instance, queue_line, fulfillment_by, order,
-                                                      order_data.get(
-                                                              'orderItems'), log_rec)
+        mapped_lines, logs, skip_order = self.map_bol_order_lines(instance, queue_line, fulfillment_by,
+                                                                  order_data.get('orderId'),
+                                                                  order_data.get('orderItems'), log_rec)
         if logs:
             log_lines = log_lines + logs
         if skip_order:
-            order.unlink()
             return False, log_lines
-        return order, log_lines
+        return (vals, mapped_lines), log_lines
 
     # Following methods are there for process bol shipped orders
-    def process_bol_shipped_order_queue_line(self, instance, queue_line, fulfillment_by, log_rec):
+    def process_bol_shipped_order_queue_line(self, instance, queue_lines, fulfillment_by, log_rec):
         """
-        This method is used to Process bol open order queue line.
+        This method is used to Process bol shipped order queue lines, every line holds one shipment.
         :param instance: Bol Instance
         :param fulfillment_by: FBB or FBR
-        :param queue_line: Queue line
+        :param queue_lines: Queue lines
         :param log_rec: Common log book record
         :return:
         """
+        # The partners found or created for the orders of the batch, see search_or_create_bol_partner_ept, the
+        # onchange values of the orders, see create_sales_order_vals_ept, and the countries and states of the
+        # addresses, see res.partner.get_country.
+        self = self.with_context(bol_partner_cache={}, onchange_cache_ept={}, lookup_cache_ept={})
         log_lines = []
-        count = 0
-        shipped_queue_data = json.loads(queue_line.bol_shipped_data)
-        order_data_temp = []
-        for shipped_order_data in shipped_queue_data:
-            count += 1
-            if count == 10:
-                count = 0
-                self._cr.commit()
-            bol_order_id = shipped_order_data.get('order').get('orderId')
-            _logger.info(bol_order_id)
+        pending_queue_lines = []
+        duplicate_queue_lines = []
+        existing_orders = self.get_bol_orders(instance, queue_lines.mapped('bol_order_id'), fulfillment_by)
+        for queue_line in queue_lines:
+            shipped_order_data = json.loads(queue_line.bol_shipped_data)
+            bol_order_id = queue_line.bol_order_id
             date_order = shipped_order_data.get('order').get('orderPlacedDateTime')
-            shipment_id = str(shipped_order_data.get('shipmentId'))
             date_order = parser.parse(date_order).astimezone(utc).strftime('%Y-%m-%d %H:%M:%S')
             order_date = datetime.strptime(date_order, '%Y-%m-%d %H:%M:%S')
             if instance.bol_import_order_after_date > order_date:
+                queue_line.write({'state': 'cancel', 'processed_at': fields.Datetime.now(),
+                                  'error_message': "Order %s is created before %s" % (
+                                      bol_order_id, instance.bol_import_order_after_date)})
                 continue
-            is_order_exist = self.search_bol_order_exist_or_not(instance, bol_order_id,
-                                                                fulfillment_by)
-            if is_order_exist:
-                order_data_temp.append(shipped_order_data)
+            existing_order = existing_orders.get(bol_order_id)
+            if existing_order:
+                queue_line.write({'state': 'done', 'sale_order_id': existing_order.id, 'error_message': False,
+                                  'processed_at': fields.Datetime.now()})
                 continue
+            pending_queue_lines.append(queue_line)
+
+        shipment_responses = self.prefetch_bol_responses(instance, 'single_shipment_list',
+                                                         [queue_line.bol_shipment_id for queue_line in
+                                                          pending_queue_lines])
+        created_orders = self.create_bol_orders_from_queue_lines(
+                self.prepare_bol_shipped_order_ept, instance, pending_queue_lines, fulfillment_by,
+                {queue_line.id: shipment_responses.get(queue_line.bol_shipment_id) for queue_line in
+                 pending_queue_lines}, log_rec)
+        for queue_line in pending_queue_lines:
+            bol_order_id = queue_line.bol_order_id
+            _logger.info(bol_order_id)
+            logs = []
+            order = False
+            order_response = shipment_responses.get(queue_line.bol_shipment_id)
+            if order_response:
+                order, logs = created_orders.get(queue_line.id) or self.create_bol_order_from_queue_line(
+                        self.create_bol_shipped_order_ept, instance, queue_line, fulfillment_by, order_response,
+                        log_rec)
+                if order is None:
+                    duplicate_queue_lines.append(queue_line)
+                    continue
+                if order:
+                    order.auto_workflow_process_id.shipped_order_workflow_ept(order)
             else:
-                logs = []
-                order_response = self.get_single_order_shipment_response(instance, shipment_id)
-                if order_response:
-                    order, logs = self.create_bol_shipped_order_ept(instance, queue_line, fulfillment_by,
-                                                                    order_response, log_rec)
-                    if order:
-                        order.auto_workflow_process_id.shipped_order_workflow_ept(order)
-                        order_data_temp.append(shipped_order_data)
-                else:
-                    message = "Order can not be found with open order API %s" % bol_order_id
-                    vals = {'message': message, 'log_book_id': log_rec.id, 'bol_shipped_order_queue_line_id':
-                        queue_line.id, 'order_ref': bol_order_id}
-                    logs.append([0, 0, vals])
-                    _logger.info(message)
-                log_lines = log_lines + logs
-        order_queue_data = [item for item in shipped_queue_data if item not in order_data_temp]
-        queue_line.write({'bol_shipped_data': json.dumps(order_queue_data) if order_queue_data else ''})
+                message = "Order can not be found with open order API %s" % bol_order_id
+                vals = {'message': message, 'log_book_id': log_rec.id, 'bol_shipped_order_queue_line_id':
+                    queue_line.id, 'order_ref': bol_order_id}
+                logs.append([0, 0, vals])
+                _logger.info(message)
+            self.set_bol_queue_line_result(queue_line, order, logs)
+            self._cr.commit()
+            log_lines = log_lines + logs
+        log_rec.write({'log_lines': log_lines})
+        if duplicate_queue_lines:
+            # The orders created by the other process are visible in a new transaction only.
+            self._cr.commit()
+        self.set_bol_duplicate_queue_lines_result(instance, duplicate_queue_lines, fulfillment_by)
         return True
 
     def get_single_order_shipment_response(self, instance, shipment_id):
@@ -246,15 +506,8 @@ class SaleOrder(models.Model):
         :return:
         @author : Ekta Bhut
         """
-        response_obj, shipment_response = BolAPI.get('single_shipment_list', instance.bol_auth_token, shipment_id)
-        if response_obj.status_code in [400, 401]:
-            instance.get_bol_token()
-            response_obj, shipment_response = BolAPI.get('single_shipment_list', instance.bol_auth_token,
-                                                         shipment_id)
-        if response_obj.status_code == 429:
-            time.sleep(5)
-            response_obj, shipment_response = BolAPI.get('single_shipment_list', instance.bol_auth_token,
-                                                         shipment_id)
+        bol_api = instance.get_bol_api()
+        response_obj, shipment_response = bol_api.get('single_shipment_list', shipment_id)
         if response_obj.status_code == 404:
             _logger.info("Shipment %s NOT FOUND SO SKIP IT" % shipment_id)
             return {}
@@ -269,11 +522,54 @@ class SaleOrder(models.Model):
         :return: True or False
         @author : Ekta Bhut
         """
-        bol_order = self.search([('bol_instance_id', '=', instance.id),
-                                 ('bol_fulfillment_by', '=', fulfillment_by),
-                                 ('bol_order_id', '=', bol_order_id)])
+        bol_order = self.get_bol_order(instance, bol_order_id, fulfillment_by)
         return True if bol_order else False
 
+    def get_bol_orders(self, instance, bol_order_ids, fulfillment_by):
+        """
+        This method is used to get the orders imported for many Bol orders with one query
+        :param instance: Bol Instance
+        :param bol_order_ids: Bol Order IDs
+        :param fulfillment_by: FBB or FBR
+        :return: Dictionary of Bol Order ID and sale order
+        """
+        if not bol_order_ids:
+            return {}
+        orders = self.search([('bol_instance_id', '=', instance.id),
+                              ('bol_fulfillment_by', '=', fulfillment_by),
+                              ('bol_order_id', 'in', list(set(bol_order_ids)))])
+        return {order.bol_order_id: order for order in orders}
+
+    def set_bol_duplicate_queue_lines_result(self, instance, queue_lines, fulfillment_by):
+        """
+        This method is used to link the queue lines of which the order is created by another process meanwhile,
+        to that order. A line stays in draft if the order is not found, e.g. the other process is rolled back.
+        :param instance: Bol Instance
+        :param queue_lines: Queue lines
+        :param fulfillment_by: FBB or FBR
+        :return: True
+        """
+        existing_orders = self.get_bol_orders(instance, [queue_line.bol_order_id for queue_line in queue_lines],
+                                              fulfillment_by)
+        for queue_line in queue_lines:
+            existing_order = existing_orders.get(queue_line.bol_order_id)
+            if existing_order:
+                queue_line.write({'state': 'done', 'sale_order_id': existing_order.id, 'error_message': False,
+                                  'processed_at': fields.Datetime.now()})
+        return True
+
+    def get_bol_order(self, instance, bol_order_id, fulfillment_by):
+        """
+        This method is used to get the order imported for the Bol order
+        :param instance: Bol Instance
+        :param bol_order_id: Bol Order ID
+        :param fulfillment_by: FBB or FBR
+        :return: Sale order
+        """
+        return self.search([('bol_instance_id', '=', instance.id),
+                            ('bol_fulfillment_by', '=', fulfillment_by),
+                            ('bol_order_id', '=', bol_order_id)], limit=1)
+
     def create_bol_shipped_order_ept(self, instance, queue_line, fulfillment_by, shipped_order_data, log_rec):
         """
         This method is used to create bol shipped orders
@@ -284,6 +580,23 @@ class SaleOrder(models.Model):
         :return: Order , loglines
         @author : Ekta Bhut
         """
+        prepared_order, log_lines = self.prepare_bol_shipped_order_ept(instance, queue_line, fulfillment_by,
+                                                                       shipped_order_data, log_rec)
+        if not prepared_order:
+            return False, log_lines
+        return self.create_bol_orders_from_prepared_vals([prepared_order]), log_lines
+
+    def prepare_bol_shipped_order_ept(self, instance, queue_line, fulfillment_by, shipped_order_data, log_rec):
+        """
+        This method is used to prepare the values of a Bol shipped order and to map its lines to the offers. Only
+        the partners are created, the order is not.
+        :param instance: Bol Instance
+        :param queue_line: Shipped queue line
+        :param fulfillment_by: FBB or FBR
+        :param shipped_order_data: Shipment response
+        :param log_rec: Common log book record
+        :return: Order vals and mapped order lines or False if a line is not mapped, Log lines
+        """
         log_lines = []
         res_partner_obj = self.env['res.partner']
         bol_order_id = shipped_order_data.get('order') and shipped_order_data.get('order').get('orderId')
@@ -305,20 +618,16 @@ class SaleOrder(models.Model):
                                                partner or partner_invoice_id,
                                                partner_invoice_id, partner_shipping_id,
                                                fulfillment_by)
-        order = self.create(vals)
-        logs, skip_order = self.with_context(shipped_order=True).create_bol_order_line(instance, queue_line,
-                                                                                       fulfillment_by,
-                                                                                       order,
-                                                                                       shipped_order_data.get(
-                                                                                               'shipmentItems'),
-                                                                                       log_rec)
+        mapped_lines, logs, skip_order = self.map_bol_order_lines(instance, queue_line, fulfillment_by,
+                                                                  bol_order_id,
+                                                                  shipped_order_data.get('shipmentItems'),
+                                                                  log_rec)
         _logger.info("FBB order is importing {0}".format(shipped_order_data.get('order').get('orderId')))
         if logs:
             log_lines = log_lines + logs
         if skip_order:
-            order.unlink()
             return False, log_lines
-        return order, log_lines
+        return (vals, mapped_lines), log_lines
 
     def import_bol_order_by_id(self, instance, order_id, log_rec):
         """
@@ -393,19 +702,21 @@ class SaleOrder(models.Model):
         country_id = partner_dict.get('countryCode') and res_partner_obj.get_country(
             partner_dict.get('countryCode')) or False
         partner_vals.update({'country_id': country_id.id})
-        address_key_list = ["name", "street", "street2", "city", "zip", "phone", "country_id"]
-        # search partner based on email.
-        # partner = res_partner_obj.search_partner_by_email(partner_vals.get('email'))
-        extra_domain = [('type', '=', address_type)]
-        if parent_id:
-            extra_domain.append(('parent_id', '=', parent_id.id))
-        # if partner:
-        partner = res_partner_obj._find_partner_ept(partner_vals, address_key_list, extra_domain)
+        # The Bol customer of the same type and parent is searched by its address fingerprint.
+        fingerprint = res_partner_obj.get_bol_address_fingerprint(partner_vals)
+        partner_cache = self._context.get('bol_partner_cache', {})
+        cache_key = (fingerprint, address_type, parent_id and parent_id.id)
+        partner = res_partner_obj.browse(partner_cache.get(cache_key, [])).exists()
         if not partner:
-            partner = res_partner_obj._find_partner_ept(partner_vals, address_key_list, [])
+            domain = [('bol_address_fingerprint', '=', fingerprint), ('is_bol_customer', '=', True),
+                      ('type', '=', address_type)]
+            if parent_id:
+                domain.append(('parent_id', '=', parent_id.id))
+            partner = res_partner_obj.search(domain, order='id', limit=1)
         if not partner:
             partner_vals.update({'type': address_type, 'is_company': False, 'is_bol_customer': True})
             partner = res_partner_obj.create(partner_vals)
+        partner_cache[cache_key] = partner.id
         return partner
 
     def get_bol_order_name(self, instance, fulfillment_by, bol_order_id):
@@ -478,30 +789,30 @@ class SaleOrder(models.Model):
 
         return ordervals
 
-    def create_bol_order_line(self, instance, queue_line, fulfillment_by, order, order_line_data, log_rec):
+    def map_bol_order_lines(self, instance, queue_line, fulfillment_by, bol_order_id, order_line_data, log_rec):
         """
-        Create Bol order line
+        Map the Bol order lines to the offers, before the order is created
         :param instance: Bol Instance
+        :param queue_line: Queue line or False
         :param fulfillment_by: FBB or FBR
-        :param order: Order
+        :param bol_order_id: Bol Order ID
         :param order_line_data: Order line response
-        :return:
+        :param log_rec: Common log book record
+        :return: List of order line response and offer, Log lines, True if a line is not mapped
         @author : Ekta Bhut
         """
-        common_log_line_obj = self.env['common.log.lines.ept']
-        context = dict(self._context)
         bol_offer_obj = self.env['bol.offer.ept']
-        sale_order_line_obj = self.env['sale.order.line']
         log_lines = []
-        bol_order_id = order.bol_order_id
+        mapped_lines = []
         skip_order = False
+        queue_line_field = 'bol_order_data_queue_line_id'
+        if queue_line and queue_line._name == 'bol.shipped.data.queue.line.ept':
+            queue_line_field = 'bol_shipped_order_queue_line_id'
         for order_line in order_line_data:
             offer_data = order_line.get('offer', {})
             bol_offer_id = offer_data.get('offerId')
             bol_sku = offer_data.get('reference')
             ean = order_line.get('product').get('ean')
-            name = order_line.get('product').get('title')
-            order_item_id = order_line.get('orderItemId')
             bol_product = bol_offer_obj.search_bol_product(bol_offer_id, bol_sku, ean,
                                                            instance, fulfillment_by)
             if not bol_product and instance.bol_auto_create_product:
@@ -513,30 +824,39 @@ class SaleOrder(models.Model):
                 message = "Odoo product is not found with SKU {0} or EAN number {1}".format(
                         bol_sku, ean)
                 vals = {'message': message, 'log_book_id': log_rec.id, 'order_ref': bol_order_id}
-                if context.get('shipped_order'):
-                    vals.update({'bol_shipped_order_queue_line_id': queue_line.id})
-                else:
-                    vals.update({'bol_order_data_queue_line_id': queue_line.id})
+                if queue_line:
+                    vals.update({queue_line_field: queue_line.id})
                 log_lines.append([0, 0, vals])
                 skip_order = True
                 continue
-            if not skip_order:
-                product = bol_product.odoo_product_id
-                uom_id = product and product.uom_id and product.uom_id.id or False
-                line_vals = {
-                    'product_id': product and product.ids[0] or False,
-                    'order_id': order.id,
-                    'company_id': order.company_id.id,
-                    'product_uom': uom_id,
-                    'name': name,
-                    'price_unit': float(order_line.get('unitPrice')),
-                    'order_qty': float(order_line.get('quantity')),
-                    'bol_order_item_id': order_item_id
-                }
-                order_line_vals = sale_order_line_obj.create_sale_order_line_ept(line_vals)
-                order_line_vals.update({'bol_order_item_id': order_item_id})
-                order_line = sale_order_line_obj.create(order_line_vals)
-        return log_lines, skip_order
+            mapped_lines.append((order_line, bol_product))
+        return mapped_lines, log_lines, skip_order
+
+    def prepare_bol_order_line_vals(self, order, order_line, bol_product):
+        """
+        Prepare the values of a Bol order line
+        :param order: Order
+        :param order_line: Order line response
+        :param bol_product: Offer of the line
+        :return: Order line vals
+        """
+        sale_order_line_obj = self.env['sale.order.line']
+        order_item_id = order_line.get('orderItemId')
+        product = bol_product.odoo_product_id
+        uom_id = product and product.uom_id and product.uom_id.id or False
+        line_vals = {
+            'product_id': product and product.ids[0] or False,
+            'order_id': order.id,
+            'company_id': order.company_id.id,
+            'product_uom': uom_id,
+            'name': order_line.get('product').get('title'),
+            'price_unit': float(order_line.get('unitPrice')),
+            'order_qty': float(order_line.get('quantity')),
+            'bol_order_item_id': order_item_id
+        }
+        order_line_vals = sale_order_line_obj.create_sale_order_line_ept(line_vals)
+        order_line_vals.update({'bol_order_item_id': order_item_id})
+        return order_line_vals
 
     def _prepare_invoice(self):
         """
@@ -559,12 +879,7 @@ class SaleOrder(models.Model):
         @author : Ekta Bhut
         """
         picking_ids = self.search_picking_for_update_order_status(instance)
-        count = 0
         for picking in picking_ids:
-            count += 1
-            if count == 10:
-                count = 0
-                self._cr.commit()
             picking_vals = {}
             order = picking.sale_id
             _logger.info("Order status is going to update {0}".format(order.name))
@@ -588,6 +903,8 @@ class SaleOrder(models.Model):
                                                                               and shipment_response.get(
                                                                    'transport').get('transportId', '')})
             picking.write(picking_vals)
+            # The status is updated in Bol.com already, it is not sent again if a later picking fails.
+            self._cr.commit()
 
     def search_picking_for_update_order_status(self, instance):
         """
@@ -629,13 +946,8 @@ class SaleOrder(models.Model):
         return update_data
 
     def update_order_status_via_bol_api(self, instance, vals):
-        response_obj, shipment_response = BolAPI.put('update_order_status', instance.bol_auth_token, '', vals)
-        if response_obj.status_code in [400, 401]:
-            instance.get_bol_token()
-            response_obj, shipment_response = BolAPI.put('update_order_status', instance.bol_auth_token, '', vals)
-        if response_obj.status_code == 429:
-            time.sleep(5)
-            response_obj, shipment_response = BolAPI.put('update_order_status', instance.bol_auth_token, '', vals)
+        bol_api = instance.get_bol_api()
+        response_obj, shipment_response = bol_api.put('update_order_status', '', vals)
         if response_obj.status_code == 400:
             _logger.info("Some issue in the requested data")
             return {}, response_obj.status_code
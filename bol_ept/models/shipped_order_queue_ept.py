@@ -8,15 +8,17 @@ from datetime import datetime
 
 from odoo import models, fields, api, _
 
-from ..bol_api.bol_api import BolAPI
-
 _logger = logging.getLogger(__name__)
 
+
 class BolShippedOrderQueue(models.Model):
     _name = 'bol.shipped.data.queue.ept'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'bol.queue.mixin.ept']
     _description = 'BOl Shipped Order Data Queue'
     _order = "create_date desc"
+    _bol_queue_line_model = 'bol.shipped.data.queue.line.ept'
+    _bol_queue_lines_field = 'shipped_order_data_queue_line_ids'
+    _bol_queue_cron = 'bol_ept.ir_cron_process_bol_shipped_order_queue'
 
     name = fields.Char(size=120, string='Name')
     import_time = fields.Datetime('Imported at', default=lambda self: fields.Datetime.now())
@@ -201,6 +203,7 @@ class BolShippedOrderQueue(models.Model):
         :param log_rec:
         :return:
         """
+        bol_api = instance.get_bol_api()
         transaction_log_obj = self.env['common.log.lines.ept']
         bol_shipped_order_queue_line_obj = self.env['bol.shipped.data.queue.line.ept']
         shipped_order_queue_id = self.env['bol.shipped.data.queue.ept'].create({
@@ -224,26 +227,16 @@ class BolShippedOrderQueue(models.Model):
                 _logger.info('PROCESSING SHIPMENT PAGE COUNTER %s', page)
                 query_string = "fulfilment-method=" + fulfilment_by + "&" + "page=" + str(page)
                 _logger.info("IMPORT ORDER PAGE COUNTER %s , %s" % (page, fulfilment_by))
-                response_obj, response = BolAPI.get('shipment_list', instance.bol_auth_token,
-                                                    query_string)
-                if response_obj.status_code in [400, 401]:
-                    time.sleep(5)
-                    instance.get_bol_token()
-                    response_obj, shipped_order_data = BolAPI.get('shipment_list',
-                                                                  instance.bol_auth_token,
-                                                                  query_string)
-
-                if response_obj.status_code == 429:
-                    time.sleep(5)
-                    continue
+                response_obj, response = bol_api.get('shipment_list', query_string)
                 if response.get('shipments'):
-                    bol_shipped_order_queue_line_obj.create({
-                        'bol_order_id': page,
-                        'bol_shipped_data': json.dumps(response.get('shipments')),
+                    bol_shipped_order_queue_line_obj.create([{
+                        'bol_order_id': shipment.get('order', {}).get('orderId'),
+                        'bol_shipment_id': str(shipment.get('shipmentId')),
+                        'bol_shipped_data': json.dumps(shipment),
                         'bol_instance_id': instance.id,
                         'fulfillment_by': fulfilment_by,
-                        'bol_shipped_order_queue_id': shipped_order_queue_id.id,
-                        'total_number_of_orders': len(response.get('shipments'))})
+                        'bol_shipped_order_queue_id': shipped_order_queue_id.id} for shipment in
+                        response.get('shipments')])
                     page = page + 1
                 else:
                     _logger.info("Break loop because of response : %s" % response)
@@ -270,109 +263,20 @@ class BolShippedOrderQueue(models.Model):
 
         return True
 
-    def process_order_queue(self):
-        common_log_book_obj = self.env['common.log.book.ept']
-        sale_obj = self.env['sale.order']
-        model_id = self.env['ir.model']._get('bol.shipped.data.queue.ept').id
-        log_book = common_log_book_obj.search(
-                [('model_id', '=', model_id), ('res_id', '=', self.id)])
-        if len(log_book) > 1:
-            log_book.unlink()
-
-        if log_book and log_book.log_lines:
-            log_book.log_lines.unlink()
-
-        if not log_book:
-            log_book_vals = {
-                'type': 'import',
-                'model_id': model_id,
-                'res_id': self.id,
-                'bol_instance_id': self.bol_instance_id.id,
-                'module': 'bol_ept',
-                'active': True
-            }
-            log_book = common_log_book_obj.create(log_book_vals)
-
-        queue_line_ids = self.shipped_order_data_queue_line_ids.filtered(
-                lambda line: line.state in ['draft', 'failed'])
-        fulfilment_by = self.fulfilment_by
-        count = 0
-        for queue_line in queue_line_ids:
-            count = count + 1
-            if count == 10:
-                count = 0
-                self._cr.commit()
-            sale_obj.process_bol_shipped_order_queue_line(self.bol_instance_id, queue_line,
-                                                          fulfilment_by,
-                                                          log_book)
-            queue_line.write({'state': 'done'})
-            queue_line._cr.commit()
-
-        if log_book and not log_book.log_lines:
-            log_book.unlink()
-
-        status = self.shipped_order_data_queue_line_ids.filtered(
-                lambda x: x.state in ('draft', 'failed'))
-        if status:
-            self.write({'state': 'partial'})
-        else:
-            self.write({'state': 'done'})
-        return True
-
     @api.model
     def auto_process_shipped_order_queue(self):
         """
-        This method is used to process all the open order queue.
-        :return:
+        This method is used to process the shipped order queues, it is called by every queue worker cron.
+        :return: True
         """
-        shipped_order_data_queue_ids = []
-
-        query = """select queue.id
-                    from bol_shipped_data_queue_line_ept as queue_line
-                    inner join bol_shipped_data_queue_ept as queue on queue_line.bol_shipped_order_queue_id = queue.id
-                    where queue_line.state='draft' and queue.is_action_require = 'False' 
-                    GROUP BY queue.id,queue_line.create_date
-                    ORDER BY queue_line.create_date ASC"""
-        self._cr.execute(query)
-        shipped_order_data_queue_data = self._cr.fetchall()
-        if not shipped_order_data_queue_data:
-            return
+        return self.auto_process_bol_queue()
 
-        for result in shipped_order_data_queue_data:
-            shipped_order_data_queue_ids.append(result[0])
-
-        queues = self.browse(list(set(shipped_order_data_queue_ids)))
-        self.process_product_queue_and_post_message(queues)
-        return
-
-    def process_product_queue_and_post_message(self, queues):
+    def process_bol_queue_lines(self, queue_lines, log_book):
         """
-        This method is used to post a message if the queue is process more than 3 times otherwise
-        it calls the child method to process the product queue line.
-        :param queues: Records of product queue.
-        @author: Ekta Bhut
+        This method is used to process the queue lines of the queue, see bol.queue.mixin.ept.
+        :param queue_lines: Queue lines of the queue
+        :param log_book: Common log book record
+        :return: True
         """
-        ir_model_obj = self.env["ir.model"]
-        common_log_book_obj = self.env["common.log.book.ept"]
-        start = time.time()
-        product_queue_process_cron_time = queues.bol_instance_id.get_bol_cron_execution_time(
-                "bol_ept.ir_cron_process_bol_shipped_order_queue")
-
-        for queue in queues:
-            queue.process_order_queue()
-            # For counting the queue crashes and creating schedule activity for the queue.
-            queue.queue_process_count += 1
-            if queue.queue_process_count > 3:
-                queue.is_action_require = True
-                note = "<p>Need to process this product queue manually.There are 3 attempts been made by " \
-                       "automated action to process this queue,<br/>- Ignore, if this queue is already processed.</p>"
-                queue.message_post(body=note)
-                if queue.bol_instance_id.is_bol_create_schedule:
-                    model_id = ir_model_obj.search([("model", "=", "bol.shipped.data.queue.ept")]).id
-                    common_log_book_obj.create_crash_queue_schedule_activity(queue, model_id, note)
-                return True
-
-            self._cr.commit()
-            if time.time() - start > product_queue_process_cron_time - 60:
-                return True
-        return True
+        return self.env['sale.order'].process_bol_shipped_order_queue_line(self.bol_instance_id, queue_lines,
+                                                                           self.fulfilment_by, log_book)
@@ -1,5 +1,5 @@
 # -*- coding: UTF-8 -*-
-# See LICENSE file for full copyright and licensing details.bol_shipped_data
+# See LICENSE file for full copyright and licensing details.
 import json
 
 from odoo import models, fields
@@ -7,18 +7,18 @@ from odoo import models, fields
 class BolShippedOrderQueueLine(models.Model):
     _name = "bol.shipped.data.queue.line.ept"
     _description = 'BOL Shipped Order Data Queue Line Ept'
-
-    def _get_total_number_of_orders(self):
-        for record in self:
-            record.total_orders_in_queue_line = len(
-                json.loads(record.bol_shipped_data)) if record.bol_shipped_data else 0
+    _inherit = 'bol.queue.line.mixin.ept'
+    _rec_name = "bol_order_id"
+    _bol_queue_field = 'bol_shipped_order_queue_id'
 
     bol_instance_id = fields.Many2one('bol.instance.ept', string='Bol Instance', help="Bol Instance")
-    bol_order_id = fields.Char(string='Order Id')
+    bol_order_id = fields.Char(string='Order Id', index=True)
+    bol_shipment_id = fields.Char(string='Shipment Id', index=True)
     order_data_id = fields.Char(string='Order Data Id')
     bol_shipped_data = fields.Char('Shipped Data', readonly=True)
     fulfillment_by = fields.Selection([('FBB', 'FBB'), ('FBR', 'FBR')], default='FBR')
-    state = fields.Selection([('draft', 'Draft'), ('failed', 'Failed'), ('done', 'Done')], default='draft')
+    state = fields.Selection([('draft', 'Draft'), ('failed', 'Failed'), ('done', 'Done'), ('cancel', 'Cancel')],
+                             default='draft')
     bol_shipped_order_queue_id = fields.Many2one('bol.shipped.data.queue.ept', string='Shipped Order Data Queue',
                                                  ondelete="cascade")
     sale_order_id = fields.Many2one("sale.order", copy=False,
@@ -27,5 +27,32 @@ class BolShippedOrderQueueLine(models.Model):
                                                        "bol_shipped_order_queue_line_id",
                                                        help="Log lines created against which line.")
     processed_at = fields.Datetime(help="Shows Date and Time, When the data is processed", copy=False)
-    total_number_of_orders = fields.Integer(readonly=1)
-    total_orders_in_queue_line = fields.Integer(compute="_get_total_number_of_orders")
+    attempt_count = fields.Integer('Attempts', readonly=True, copy=False,
+                                   help="Number of times the shipment of this line is processed.")
+    error_message = fields.Text('Error', readonly=True, copy=False,
+                                help="Reason why the order is not created in the last attempt.")
+
+    def split_page_queue_lines(self):
+        """
+        This method is used to split the lines which hold a whole page of shipments, as created by the earlier
+        versions, into one line per shipment. The new lines keep the claim of the page line, so no other queue
+        worker claims them.
+        :return: Queue lines with one shipment each
+        """
+        page_lines = self.filtered(lambda line: line.bol_shipped_data and line.bol_shipped_data.startswith('['))
+        if not page_lines:
+            return self
+        vals_list = []
+        for page_line in page_lines:
+            for shipped_order_data in json.loads(page_line.bol_shipped_data):
+                vals_list.append({'bol_shipped_data': json.dumps(shipped_order_data),
+                                  'bol_order_id': shipped_order_data.get('order', {}).get('orderId'),
+                                  'bol_shipment_id': str(shipped_order_data.get('shipmentId')),
+                                  'bol_instance_id': page_line.bol_instance_id.id,
+                                  'claim_token': page_line.claim_token,
+                                  'claim_expires_at': page_line.claim_expires_at,
+                                  'fulfillment_by': page_line.fulfillment_by,
+                                  'bol_shipped_order_queue_id': page_line.bol_shipped_order_queue_id.id})
+        shipment_lines = self.create(vals_list)
+        page_lines.unlink()
+        return (self - page_lines) | shipment_lines
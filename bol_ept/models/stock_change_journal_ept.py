@@ -0,0 +1,26 @@
+# -*- coding: UTF-8 -*-
+# See LICENSE file for full copyright and licensing details.
+from odoo import models, api
+
+
+class StockChangeJournalEpt(models.Model):
+    _inherit = "stock.change.journal.ept"
+
+    @api.model
+    def record_stock_changes_ept(self, changes):
+        """
+        Inherited for starting the real-time stock export right after the stock is changed in the FBR warehouse
+        of an instance with real-time stock export. The cron is triggered once, the changes recorded before it
+        runs are exported by the same run, see bol.offer.ept.auto_push_bol_stock.
+        :param changes: Set of product ID, warehouse ID and company ID.
+        :return: True
+        """
+        res = super(StockChangeJournalEpt, self).record_stock_changes_ept(changes)
+        warehouse_ids = list({warehouse_id for product_id, warehouse_id, company_id in changes})
+        if not warehouse_ids or not self.env['bol.instance.ept'].sudo().search_count(
+                [('bol_realtime_stock_export', '=', True), ('bol_fbr_warehouse_id', 'in', warehouse_ids)]):
+            return res
+        cron = self.env.ref('bol_ept.ir_cron_push_bol_stock', raise_if_not_found=False)
+        if cron and cron.active and not self.env['ir.cron.trigger'].sudo().search_count([('cron_id', '=', cron.id)]):
+            cron.sudo()._trigger()
+        return res
@@ -5,8 +5,6 @@ import time
 
 from odoo import models, fields
 
-from ..bol_api.bol_api import BolAPI
-
 _logger = logging.getLogger(__name__)
 
 class StockInventory(models.Model):
@@ -47,6 +45,7 @@ class StockInventory(models.Model):
         :return:
         @author: Ekta bhut
         """
+        bol_api = instance.get_bol_api()
         common_log_line = self.env['common.log.lines.ept']
         offers = []
         page = 0
@@ -54,10 +53,7 @@ class StockInventory(models.Model):
             while True:
                 page = page + 1
                 page_number = "page=%s" % page
-                response_obj, response = BolAPI.get('inventory', instance.bol_auth_token, page_number)
-                if response_obj.status_code in [400, 401]:
-                    instance.get_bol_token()
-                    response_obj, response = BolAPI.get('inventory', instance.bol_auth_token, page_number)
+                response_obj, response = bol_api.get('inventory', page_number)
                 if not response:
                     break
                 _logger.info(page)
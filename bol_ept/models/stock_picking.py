@@ -1,13 +1,10 @@
 # -*- coding: UTF-8 -*-
 # See LICENSE file for full copyright and licensing details.
 import logging
-import time
 from datetime import datetime
 
 from odoo import models, fields, api
 
-from ..bol_api.bol_api import BolAPI
-
 _logger = logging.getLogger(__name__)
 
 class StockPicking(models.Model):
@@ -46,9 +43,10 @@ class StockPicking(models.Model):
                 self._cr.commit()
             bol_order_id = order.bol_order_id
             shipment_response = self.get_single_shipment_order_response(instance, bol_order_id)
-            for shipment in shipment_response.get('shipments', []):
-                shipment_id = str(shipment.get('shipmentId'))
-                shipment_full_response = order.get_single_order_shipment_response(instance, shipment_id)
+            shipment_ids = [str(shipment.get('shipmentId')) for shipment in shipment_response.get('shipments', [])]
+            shipment_full_responses = order.prefetch_bol_responses(instance, 'single_shipment_list', shipment_ids)
+            for shipment_id in shipment_ids:
+                shipment_full_response = shipment_full_responses.get(shipment_id)
                 if shipment_full_response:
                     _logger.info("Order is processing {0}".format(order.bol_order_id))
                     if order.state == 'draft':
@@ -144,16 +142,9 @@ class StockPicking(models.Model):
         :return:
         @author : Ekta Bhut
         """
+        bol_api = instance.get_bol_api()
         order_id = 'order-id=%s' % order_id
-        response_obj, shipment_response = BolAPI.get('shipment_list', instance.bol_auth_token, order_id)
-        if response_obj.status_code in [400, 401]:
-            instance.get_bol_token()
-            response_obj, shipment_response = BolAPI.get('shipment_list', instance.bol_auth_token,
-                                                         order_id)
-        if response_obj.status_code == 429:
-            time.sleep(5)
-            response_obj, shipment_response = BolAPI.get('shipment_list', instance.bol_auth_token,
-                                                         order_id)
+        response_obj, shipment_response = bol_api.get('shipment_list', order_id)
         if response_obj.status_code == 404:
             _logger.info("Shipment %s NOT FOUND SO SKIP IT" % order_id)
             return {}
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+# See LICENSE file for full copyright and licensing details.
+"""
+End-to-end throughput benchmark of the Bol order pipeline against the local simulator (see simulator.py).
+
+It seeds the offers and their products in Odoo, serves N synthetic orders of K customers from the simulator and
+runs every stage of the pipeline on the given instance: open order queue import, queue processing, auto workflow
+(confirmation and invoicing), shipment import and order status update. Per stage it reports the processed records,
+records per second, SQL queries, API calls per record and the peak Python memory, and writes the result as JSON.
+
+The pipeline commits as it goes, so run it on a scratch database, e.g. from an Odoo shell:
+    from odoo.addons.bol_ept.tests.benchmark import run_benchmark
+    run_benchmark(env, env['bol.instance.ept'].browse(1), orders=2000, offers=500, customers=400,
+                  output='/tmp/bol_benchmark.json')
+"""
+import json
+import logging
+import time
+import tracemalloc
+from datetime import datetime
+
+from .simulator import BolSimulator
+
+_logger = logging.getLogger(__name__)
+
+_api_base_url_parameter = "bol_ept.api_base_url"
+_seed_stock = 100000
+
+
+def seed_offers(env, instance, seller):
+    """
+    This method is used to create the products and FBR offers of the simulated seller, with enough stock in the
+    FBR warehouse to deliver all the orders. Offers already in the database are kept.
+    @param env: Odoo environment.
+    @param instance: Bol instance of the benchmark.
+    @param seller: SimulatedSeller.
+    @return: Number of created offers.
+    """
+    product_obj = env["product.product"]
+    offer_obj = env["bol.offer.ept"]
+    quant_obj = env["stock.quant"]
+    location = instance.bol_fbr_warehouse_id.lot_stock_id
+    existing_offer_ids = set(offer_obj.search([("bol_instance_id", "=", instance.id)]).mapped("bol_offer_id"))
+    created = 0
+    for offer_index in range(seller.offers):
+        offer = seller.get_offer(offer_index)
+        if offer["offerId"] in existing_offer_ids:
+            continue
+        product = product_obj.create({"name": offer["store"]["productTitle"], "default_code": offer["reference"],
+                                      "barcode": offer["ean"], "type": "product"})
+        offer_obj.create({"name": product.name, "odoo_product_id": product.id, "bol_instance_id": instance.id,
+                          "bol_offer_id": offer["offerId"], "ean_product": offer["ean"],
+                          "reference_code": offer["reference"], "fulfillment_by": "FBR", "exported_in_bol": True})
+        location and quant_obj._update_available_quantity(product, location, _seed_stock)
+        created += 1
+    env.cr.commit()
+    return created
+
+
+def run_stage(name, simulator, cr, function, count_function):
+    """
+    This method is used to run one stage of the pipeline and measure it.
+    @param name: Name of the stage.
+    @param simulator: Running BolSimulator.
+    @param cr: Cursor used by the pipeline, its query counter is read.
+    @param function: Function running the stage.
+    @param count_function: Function returning the number of records processed so far by the stage.
+    @return: Dict with the measures of the stage.
+    """
+    api_calls = sum(simulator.stats.values())
+    queries = getattr(cr, "sql_log_count", 0)
+    records = count_function()
+    error = False
+    tracemalloc.start()
+    start = time.time()
+    try:
+        function()
+    except Exception as exception:
+        _logger.exception("Benchmark stage %s failed", name)
+        cr.rollback()
+        error = str(exception)
+    seconds = time.time() - start
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    records = count_function() - records
+    api_calls = sum(simulator.stats.values()) - api_calls
+    result = {
+        "stage": name,
+        "seconds": round(seconds, 3),
+        "records": records,
+        "records_per_second": round(records / seconds, 3) if seconds else 0.0,
+        "sql_queries": getattr(cr, "sql_log_count", 0) - queries,
+        "api_calls": api_calls,
+        "api_calls_per_record": round(api_calls / records, 3) if records else None,
+        "peak_memory_mb": round(peak_memory / 1024.0 / 1024.0, 3),
+        "error": error,
+    }
+    _logger.info("Benchmark stage %s: %s", name, result)
+    return result
+
+
+def run_benchmark(env, instance, orders=1000, offers=200, customers=200, page_size=50, latency=(0.0, 0.0),
+                  throttle_rate=0.0, output="bol_benchmark.json"):
+    """
+    This method is used to run the benchmark of the order pipeline on the instance and write the result.
+    The instance is pointed at the simulator for the run, its credentials and the API base URL are restored at
+    the end.
+    @param env: Odoo environment.
+    @param instance: Configured Bol instance (warehouse, pricelist, auto workflow).
+    @param orders: Open FBR orders served by the simulator.
+    @param offers: Offers of the seller, seeded in Odoo as well.
+    @param customers: Customers the orders are spread over.
+    @param page_size: Orders of a page of the orders API.
+    @param latency: Minimum and maximum seconds added to every API response.
+    @param throttle_rate: Share of the API requests answered with 429.
+    @param output: Path of the JSON result file.
+    @return: Result dict, as written to the file.
+    """
+    cr = env.cr
+    config_parameter_obj = env["ir.config_parameter"].sudo()
+    queue_obj = env["bol.queue.ept"]
+    sale_order_obj = env["sale.order"]
+    picking_obj = env["stock.picking"]
+    simulator = BolSimulator(sellers=1, orders=orders, offers=offers, customers=customers, page_size=page_size,
+                             fbb_share=0, latency=latency, throttle_rate=throttle_rate).start()
+    seller = simulator.sellers[0]
+    instance_vals = {"client_id": instance.client_id, "secret_id": instance.secret_id,
+                     "bol_import_order_after_date": instance.bol_import_order_after_date}
+    api_base_url = config_parameter_obj.get_param(_api_base_url_parameter, False)
+    queue_ids = []
+    order_domain = [("bol_instance_id", "=", instance.id), ("bol_fulfillment_by", "=", "FBR")]
+    picking_domain = [("sale_id.bol_instance_id", "=", instance.id), ("picking_type_code", "=", "outgoing")]
+    try:
+        config_parameter_obj.set_param(_api_base_url_parameter, simulator.base_url)
+        instance.write({"client_id": seller.client_id, "secret_id": seller.client_secret,
+                        "bol_import_order_after_date": datetime(2020, 1, 1)})
+        cr.commit()
+        seeded_offers = seed_offers(env, instance, seller)
+        simulator.reset_stats()
+        stages = [
+            run_stage("queue_import", simulator, cr,
+                      lambda: queue_ids.extend(queue_obj.import_order_queue(instance, "FBR")),
+                      lambda: len(queue_obj.browse(queue_ids).mapped("order_data_queue_line_ids"))),
+            run_stage("queue_process", simulator, cr,
+                      lambda: [queue.process_order_queue() for queue in queue_obj.browse(queue_ids)],
+                      lambda: sale_order_obj.search_count(order_domain)),
+            run_stage("workflow", simulator, cr,
+                      sale_order_obj.auto_process_bol_order_workflow,
+                      lambda: sale_order_obj.search_count(order_domain + [("state", "in", ["sale", "done"])])),
+            run_stage("shipment_import", simulator, cr,
+                      lambda: picking_obj.import_bol_order_shipment(instance),
+                      lambda: picking_obj.search_count(picking_domain + [("state", "=", "done")])),
+            run_stage("status_update", simulator, cr,
+                      lambda: sale_order_obj.update_order_status_in_bol(instance),
+                      lambda: picking_obj.search_count(picking_domain + [("updated_in_bol", "=", True)])),
+        ]
+        cr.commit()
+    finally:
+        simulator.stop()
+        instance.write(instance_vals)
+        config_parameter_obj.set_param(_api_base_url_parameter, api_base_url)
+        cr.commit()
+
+    module = env["ir.module.module"].search([("name", "=", "bol_ept")], limit=1)
+    seconds = sum(stage["seconds"] for stage in stages)
+    result = {
+        "benchmark": "bol_order_pipeline",
+        "date": datetime.now().isoformat(),
+        "database": cr.dbname,
+        "module_version": module.latest_version or module.installed_version,
+        "parameters": {"orders": orders, "offers": offers, "customers": customers, "page_size": page_size,
+                       "latency": list(latency), "throttle_rate": throttle_rate, "seeded_offers": seeded_offers},
+        "stages": stages,
+        "total": {
+            "seconds": round(seconds, 3),
+            "orders_per_second": round(stages[1]["records"] / seconds, 3) if seconds else 0.0,
+            "sql_queries": sum(stage["sql_queries"] for stage in stages),
+            "api_calls": sum(stage["api_calls"] for stage in stages),
+            "throttled": simulator.stats.get("throttled", 0),
+        },
+    }
+    with open(output, "w") as result_file:
+        json.dump(result, result_file, indent=2)
+    _logger.info("Bol benchmark result is written to %s", output)
+    return result
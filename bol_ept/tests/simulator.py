@@ -0,0 +1,549 @@
+# -*- coding: utf-8 -*-
+# See LICENSE file for full copyright and licensing details.
+"""
+Local simulator of the Bol.com Retailer API for load and benchmark testing.
+
+It serves the endpoints of _api_endpoints from synthetic sellers: orders and shipments paging and details, offers
+GET/PUT, inventory paging, the offer export file, process status and token. Point the connector at it with the
+system parameter bol_ept.api_base_url (or BolAPI(base_url=...)) and use the credentials of the sellers as
+instance credentials.
+
+Run standalone:
+    python simulator.py --sellers 2 --orders 5000 --latency 0.02 0.1 --throttle-rate 0.01
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+_logger = logging.getLogger(__name__)
+
+# Order, shipment and order item ids carry the seller number, so a request for the data of another seller
+# is recognised as a token crossover.
+_seller_id_base = 10 ** 8
+_order_date = datetime(2021, 1, 1)
+_countries = (("NL", ("1011AB", "2511CV", "3011AD", "9711LM")), ("BE", ("1000", "2000", "9000", "3500")))
+_transporters = ("TNT", "DHL", "DPD-NL", "POSTNL")
+
+
+class SimulatedSeller:
+    """
+    Synthetic seller of the simulator. Its data is generated on request from the seller number and the index of
+    the record, so large volumes need no memory and are the same on every run.
+    """
+
+    def __init__(self, number, orders, offers, customers, fbb_share):
+        self.number = number
+        self.client_id = "simulated-client-%s" % number
+        self.client_secret = "simulated-secret-%s" % number
+        self.orders = orders
+        self.offers = offers
+        self.customers = customers
+        fbb_every = int(1 / fbb_share) if fbb_share else 0
+        self.order_indexes = {"FBR": [], "FBB": []}
+        for index in range(orders):
+            method = "FBB" if fbb_every and index % fbb_every == 0 else "FBR"
+            self.order_indexes[method].append(index)
+        self.fbb_indexes = set(self.order_indexes["FBB"])
+
+    def owns(self, resource_id):
+        try:
+            return int(resource_id) // _seller_id_base == self.number
+        except (TypeError, ValueError):
+            return False
+
+    def get_index(self, resource_id):
+        index = int(resource_id) % _seller_id_base
+        return index if index < self.orders else None
+
+    def get_order_id(self, index):
+        return str(self.number * _seller_id_base + index)
+
+    def get_offer_id(self, index):
+        return str(uuid.UUID(int=self.number * _seller_id_base + index))
+
+    def get_offer_index(self, offer_id):
+        try:
+            value = uuid.UUID(offer_id).int
+        except ValueError:
+            return None
+        if value // _seller_id_base != self.number or value % _seller_id_base >= self.offers:
+            return None
+        return value % _seller_id_base
+
+    def get_ean(self, offer_index):
+        return str(8700000000000 + self.number * 100000 + offer_index)
+
+    def get_method(self, index):
+        return "FBB" if index in self.fbb_indexes else "FBR"
+
+    def get_customer(self, customer_index):
+        rnd = random.Random("%s-customer-%s" % (self.number, customer_index))
+        country, zip_codes = rnd.choice(_countries)
+        return {
+            "salutation": rnd.choice(("MALE", "FEMALE")),
+            "firstName": "Customer%s" % customer_index,
+            "surname": "Seller%s" % self.number,
+            "streetName": "Simulatorstraat",
+            "houseNumber": str(rnd.randint(1, 400)),
+            "zipCode": rnd.choice(zip_codes),
+            "city": "Simcity %s" % rnd.randint(1, 50),
+            "countryCode": country,
+            "email": "customer%s.seller%s@example.com" % (customer_index, self.number),
+            "deliveryPhoneNumber": "06%08d" % customer_index,
+            "language": "nl",
+        }
+
+    def get_order_items(self, index):
+        rnd = random.Random("%s-order-%s" % (self.number, index))
+        method = self.get_method(index)
+        order_id = self.get_order_id(index)
+        items = []
+        for item_index in range(rnd.randint(1, 3)):
+            offer_index = rnd.randrange(self.offers)
+            items.append({
+                "orderItemId": "%s%02d" % (order_id, item_index),
+                "cancellationRequest": False,
+                "fulfilment": {"method": method, "distributionParty": "RETAILER" if method == "FBR" else "BOL"},
+                "offer": {"offerId": self.get_offer_id(offer_index), "reference": "SIM-%s-%s" % (self.number,
+                                                                                               offer_index)},
+                "product": {"ean": self.get_ean(offer_index), "title": "Simulated product %s" % offer_index},
+                "quantity": rnd.randint(1, 3),
+                "quantityShipped": 0,
+                "quantityCancelled": 0,
+                "unitPrice": round(rnd.uniform(5, 150), 2),
+                "commission": 1.5,
+            })
+        return items
+
+    def get_order_date(self, index):
+        return (_order_date + timedelta(minutes=index)).strftime("%Y-%m-%dT%H:%M:%S+01:00")
+
+    def get_order(self, index):
+        customer = self.get_customer(random.Random("%s-order-%s" % (self.number, index)).randrange(self.customers))
+        return {
+            "orderId": self.get_order_id(index),
+            "pickupPoint": False,
+            "orderPlacedDateTime": self.get_order_date(index),
+            "shipmentDetails": customer,
+            "billingDetails": customer,
+            "orderItems": self.get_order_items(index),
+        }
+
+    def get_order_summary(self, index):
+        return {
+            "orderId": self.get_order_id(index),
+            "orderPlacedDateTime": self.get_order_date(index),
+            "orderItems": [{"orderItemId": item["orderItemId"], "quantity": item["quantity"],
+                            "quantityShipped": 0, "quantityCancelled": 0, "cancellationRequest": False}
+                           for item in self.get_order_items(index)],
+        }
+
+    def get_shipment_summary(self, index):
+        return {
+            "shipmentId": int(self.get_order_id(index)),
+            "shipmentDateTime": self.get_order_date(index),
+            "shipmentReference": "SIM-%s" % index,
+            "order": {"orderId": self.get_order_id(index), "orderPlacedDateTime": self.get_order_date(index)},
+            "transport": {"transportId": int(self.get_order_id(index))},
+        }
+
+    def get_shipment(self, index):
+        order = self.get_order(index)
+        shipment = self.get_shipment_summary(index)
+        shipment.update({
+            "shipmentItems": [{"orderItemId": item["orderItemId"], "orderId": order["orderId"],
+                               "orderDate": order["orderPlacedDateTime"], "ean": item["product"]["ean"],
+                               "title": item["product"]["title"], "quantity": item["quantity"],
+                               "offerPrice": item["unitPrice"], "offerReference": item["offer"]["reference"],
+                               "fulfilmentMethod": item["fulfilment"]["method"]} for item in order["orderItems"]],
+            "transport": {"transportId": shipment["transport"]["transportId"],
+                          "transporterCode": _transporters[index % len(_transporters)],
+                          "trackAndTrace": "3SSIM%010d" % index},
+            "shipmentDetails": order["shipmentDetails"],
+            "billingDetails": order["billingDetails"],
+        })
+        return shipment
+
+    def get_offer(self, offer_index):
+        rnd = random.Random("%s-offer-%s" % (self.number, offer_index))
+        return {
+            "offerId": self.get_offer_id(offer_index),
+            "ean": self.get_ean(offer_index),
+            "reference": "SIM-%s-%s" % (self.number, offer_index),
+            "onHoldByRetailer": False,
+            "unknownProductTitle": "",
+            "pricing": {"bundlePrices": [{"quantity": 1, "unitPrice": round(rnd.uniform(5, 150), 2)}]},
+            "stock": {"amount": rnd.randint(0, 100), "correctedStock": 0, "managedByRetailer": True},
+            "fulfilment": {"method": "FBB" if offer_index % 5 == 0 else "FBR", "deliveryCode": "24uurs-23"},
+            "store": {"productTitle": "Simulated product %s" % offer_index, "visible": [{"countryCode": "NL"}]},
+            "condition": {"name": "NEW"},
+        }
+
+    def get_inventory(self, offer_index):
+        rnd = random.Random("%s-inventory-%s" % (self.number, offer_index))
+        return {
+            "ean": self.get_ean(offer_index),
+            "bsku": "SIM%s%06d" % (self.number, offer_index),
+            "gradedStock": rnd.randint(0, 2),
+            "regularStock": rnd.randint(0, 100),
+            "title": "Simulated product %s" % offer_index,
+        }
+
+    def get_offer_file(self):
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(["offerId", "ean", "conditionName", "conditionCategory", "conditionComment", "bundlePricesPrice",
+                         "fulfilmentDeliveryCode", "stockAmount", "onHoldByRetailer", "fulfilmentType",
+                         "mutationDateTime", "referenceCode", "correctedStock"])
+        for offer_index in range(self.offers):
+            offer = self.get_offer(offer_index)
+            writer.writerow([offer["offerId"], offer["ean"], "NEW", "NEW", "",
+                             offer["pricing"]["bundlePrices"][0]["unitPrice"], "24uurs-23",
+                             offer["stock"]["amount"], "false", offer["fulfilment"]["method"],
+                             _order_date.isoformat(), offer["reference"], 0])
+        return output.getvalue()
+
+
+class BolSimulator:
+    """
+    Threaded HTTP server simulating the Bol.com Retailer API for the given number of synthetic sellers.
+    @param sellers: Number of sellers, the credentials are in self.sellers.
+    @param orders: Open orders of every seller, every order is also served as shipment.
+    @param offers: Offers of every seller.
+    @param customers: Customers of every seller, the orders are spread over them.
+    @param page_size: Records of a page of orders, shipments and inventory.
+    @param fbb_share: Share of the orders fulfilled by Bol.com.
+    @param latency: Minimum and maximum seconds added to every response.
+    @param throttle_rate: Share of the requests answered with 429.
+    @param retry_after: Retry-After seconds of a 429 response.
+    @param token_lifetime: Seconds an access token is valid.
+    """
+
+    def __init__(self, sellers=1, orders=1000, offers=100, customers=200, page_size=50, fbb_share=0.2,
+                 latency=(0.0, 0.0), throttle_rate=0.0, retry_after=1, token_lifetime=299, host="127.0.0.1",
+                 port=0):
+        self.sellers = [SimulatedSeller(number, orders, offers, customers, fbb_share)
+                        for number in range(1, sellers + 1)]
+        self.page_size = page_size
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.token_lifetime = token_lifetime
+        self.tokens = {}
+        self.process_statuses = {}
+        self.stats = Counter()
+        self.crossovers = []
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), _SimulatorHandler)
+        self.server.daemon_threads = True
+        self.server.simulator = self
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return "http://%s:%s" % (host, port)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats.clear()
+            self.crossovers = []
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def issue_token(self, client_id, client_secret):
+        for seller in self.sellers:
+            if seller.client_id == client_id and seller.client_secret == client_secret:
+                token = uuid.uuid4().hex
+                with self.lock:
+                    self.tokens[token] = (seller, time.monotonic() + self.token_lifetime)
+                return token
+        return False
+
+    def get_seller(self, authorization):
+        token = (authorization or "").replace("Bearer", "").strip()
+        with self.lock:
+            seller, expires_at = self.tokens.get(token, (None, 0))
+        return seller if expires_at > time.monotonic() else None
+
+    def record_crossover(self, seller, path):
+        with self.lock:
+            self.crossovers.append((seller.number, path))
+        _logger.warning("Token of seller %s is used for %s", seller.number, path)
+
+    def create_process_status(self, seller, event_type, entity_id=""):
+        process_status_id = str(uuid.uuid4().int % 10 ** 12)
+        with self.lock:
+            self.process_statuses[process_status_id] = (seller.number, entity_id)
+        return {"processStatusId": process_status_id, "entityId": entity_id, "eventType": event_type,
+                "status": "PENDING", "createTimestamp": datetime.now().isoformat()}
+
+
+class _SimulatorHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        _logger.debug(format, *args)
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+    def do_PUT(self):
+        self.handle_request("PUT")
+
+    def do_DELETE(self):
+        self.handle_request("DELETE")
+
+    def handle_request(self, method):
+        simulator = self.server.simulator
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        parts = [part for part in url.path.split("/") if part]
+        if simulator.latency[1]:
+            time.sleep(random.uniform(*simulator.latency))
+        if parts == ["token"]:
+            simulator.count("token")
+            form = {key: values[0] for key, values in parse_qs(body.decode()).items()}
+            form.update(query)
+            token = simulator.issue_token(form.get("client_id"), form.get("client_secret"))
+            if not token:
+                return self.send_json(401, {"error": "invalid_client"})
+            return self.send_json(200, {"access_token": token, "token_type": "Bearer",
+                                        "expires_in": simulator.token_lifetime, "scope": "RETAILER"})
+        seller = simulator.get_seller(self.headers.get("Authorization"))
+        if not seller:
+            simulator.count("unauthorized")
+            return self.send_json(401, {"title": "Expired JWT", "status": 401})
+        if simulator.throttle_rate and random.random() < simulator.throttle_rate:
+            simulator.count("throttled")
+            return self.send_json(429, {"title": "Too many requests", "status": 429},
+                                  {"Retry-After": str(simulator.retry_after)})
+        route = self.route(method, parts)
+        simulator.count("%s %s" % (method, route and route.__name__[6:] or "unknown"))
+        if not route:
+            return self.send_json(404, {"title": "Not Found", "status": 404})
+        return route(simulator, seller, parts, query, body)
+
+    def route(self, method, parts):
+        if parts[:1] in (["retailer"], ["shared"]):
+            parts = parts[1:]
+        routes = {
+            ("GET", "orders", 1): self.serve_orders,
+            ("GET", "orders", 2): self.serve_single_order,
+            ("PUT", "orders", 2): self.serve_order_shipment,
+            ("GET", "shipments", 1): self.serve_shipments,
+            ("GET", "shipments", 2): self.serve_single_shipment,
+            ("GET", "offers", 2): self.serve_offer,
+            ("PUT", "offers", 3): self.serve_offer_update,
+            ("POST", "offers", 2): self.serve_offer_export,
+            ("GET", "offers", 3): self.serve_offer_file,
+            ("GET", "inventory", 1): self.serve_inventory,
+            ("GET", "process-status", 1): self.serve_process_statuses,
+            ("GET", "process-status", 2): self.serve_process_status,
+        }
+        return parts and routes.get((method, parts[0], len(parts)))
+
+    def get_page(self, records, query):
+        page = max(int(query.get("page") or 1), 1)
+        page_size = self.server.simulator.page_size
+        return records[(page - 1) * page_size:page * page_size]
+
+    def serve_orders(self, simulator, seller, parts, query, body):
+        indexes = self.get_page(seller.order_indexes.get(query.get("fulfilment-method", "FBR"), []), query)
+        if not indexes:
+            return self.send_json(200, {})
+        return self.send_json(200, {"orders": [seller.get_order_summary(index) for index in indexes]})
+
+    def get_owned_index(self, simulator, seller, resource_id):
+        if not seller.owns(resource_id):
+            simulator.record_crossover(seller, self.path)
+            return None
+        return seller.get_index(resource_id)
+
+    def serve_single_order(self, simulator, seller, parts, query, body):
+        index = self.get_owned_index(simulator, seller, parts[-1])
+        if index is None:
+            return self.send_json(404, {"title": "Not Found", "status": 404})
+        return self.send_json(200, seller.get_order(index))
+
+    def serve_order_shipment(self, simulator, seller, parts, query, body):
+        payload = json.loads(body or b"{}")
+        for item in payload.get("orderItems", []):
+            order_item_id = str(item.get("orderItemId", ""))
+            if order_item_id[:-2] and self.get_owned_index(simulator, seller, order_item_id[:-2]) is None:
+                return self.send_json(400, {"title": "Bad Request", "status": 400})
+        return self.send_json(202, simulator.create_process_status(seller, "CONFIRM_SHIPMENT"))
+
+    def serve_shipments(self, simulator, seller, parts, query, body):
+        if query.get("order-id"):
+            index = self.get_owned_index(simulator, seller, query["order-id"])
+            shipments = index is not None and [seller.get_shipment_summary(index)] or []
+            return self.send_json(200, shipments and {"shipments": shipments} or {})
+        indexes = self.get_page(seller.order_indexes.get(query.get("fulfilment-method", "FBR"), []), query)
+        if not indexes:
+            return self.send_json(200, {})
+        return self.send_json(200, {"shipments": [seller.get_shipment_summary(index) for index in indexes]})
+
+    def serve_single_shipment(self, simulator, seller, parts, query, body):
+        index = self.get_owned_index(simulator, seller, parts[-1])
+        if index is None:
+            return self.send_json(404, {"title": "Not Found", "status": 404})
+        return self.send_json(200, seller.get_shipment(index))
+
+    def serve_offer(self, simulator, seller, parts, query, body):
+        offer_index = seller.get_offer_index(parts[-1])
+        if offer_index is None:
+            return self.send_json(404, {"title": "Not Found", "status": 404})
+        return self.send_json(200, seller.get_offer(offer_index))
+
+    def serve_offer_update(self, simulator, seller, parts, query, body):
+        if parts[-1] not in ("stock", "price") or seller.get_offer_index(parts[-2]) is None:
+            return self.send_json(404, {"title": "Not Found", "status": 404})
+        event_type = parts[-1] == "stock" and "UPDATE_OFFER_STOCK" or "UPDATE_OFFER_PRICE"
+        return self.send_json(202, simulator.create_process_status(seller, event_type, parts[-2]))
+
+    def serve_offer_export(self, simulator, seller, parts, query, body):
+        if parts[-1] != "export":
+            return self.send_json(404, {"title": "Not Found", "status": 404})
+        entity_id = str(seller.number * _seller_id_base + random.randrange(_seller_id_base))
+        return self.send_json(202, simulator.create_process_status(seller, "CREATE_OFFER_EXPORT", entity_id))
+
+    def serve_offer_file(self, simulator, seller, parts, query, body):
+        if parts[-2] != "export" or not seller.owns(parts[-1]):
+            return self.send_json(404, {"title": "Not Found", "status": 404})
+        return self.send_body(200, seller.get_offer_file().encode(), "application/vnd.retailer.v8+csv")
+
+    def serve_inventory(self, simulator, seller, parts, query, body):
+        indexes = self.get_page(range(seller.offers), query)
+        if not indexes:
+            return self.send_json(200, {})
+        return self.send_json(200, {"inventory": [seller.get_inventory(index) for index in indexes]})
+
+    def serve_process_statuses(self, simulator, seller, parts, query, body):
+        return self.send_json(200, {"processStatuses": []})
+
+    def serve_process_status(self, simulator, seller, parts, query, body):
+        with simulator.lock:
+            seller_number, entity_id = simulator.process_statuses.get(parts[-1], (None, ""))
+        if seller_number != seller.number:
+            return self.send_json(404, {"title": "Not Found", "status": 404})
+        return self.send_json(200, {"processStatusId": parts[-1], "entityId": entity_id, "status": "SUCCESS",
+                                    "createTimestamp": datetime.now().isoformat()})
+
+    def send_json(self, status, data, extra_headers=None):
+        return self.send_body(status, json.dumps(data).encode(), "application/vnd.retailer.v8+json", extra_headers)
+
+    def send_body(self, status, body, content_type, extra_headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (extra_headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def check_token_crossover(instances=20, orders=200, workers=8, simulator=None):
+    """
+    This method is used to check that concurrent Bol API clients never send the token of one seller on the
+    request of another. Every client fetches the orders of its own seller concurrently, with a fan-out of its own,
+    and every response must belong to the seller of the client.
+    @param instances: Number of concurrent clients, one per seller.
+    @param orders: Orders fetched by every client.
+    @param workers: Fan-out threads of every client.
+    @param simulator: Running BolSimulator with at least `instances` sellers, a new one is started when not given.
+    @return: Dict with the number of requests, crossovers seen by the server and responses of another seller.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from ..bol_api.bol_api import BolAPI
+
+    own_simulator = not simulator
+    if own_simulator:
+        simulator = BolSimulator(sellers=instances, orders=orders).start()
+    try:
+        simulator.reset_stats()
+        sellers = simulator.sellers[:instances]
+
+        def run_client(seller):
+            client = BolAPI(seller.client_id, seller.client_secret, base_url=simulator.base_url)
+            order_ids = [seller.get_order_id(index) for index in range(min(orders, seller.orders))]
+            responses = client.get_many("single_order", order_ids, max_workers=workers)
+            return sum(1 for order_id, (response, order) in zip(order_ids, responses)
+                       if order.get("orderId") != order_id)
+
+        with ThreadPoolExecutor(max_workers=len(sellers)) as executor:
+            mismatches = sum(executor.map(run_client, sellers))
+        return {
+            "requests": sum(count for key, count in simulator.stats.items() if key != "token"),
+            "crossovers": len(simulator.crossovers),
+            "mismatches": mismatches,
+            "ok": not simulator.crossovers and not mismatches,
+        }
+    finally:
+        if own_simulator:
+            simulator.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local simulator of the Bol.com Retailer API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9069)
+    parser.add_argument("--sellers", type=int, default=1)
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--offers", type=int, default=100)
+    parser.add_argument("--customers", type=int, default=200)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--fbb-share", type=float, default=0.2)
+    parser.add_argument("--latency", type=float, nargs=2, default=(0.0, 0.0), metavar=("MIN", "MAX"))
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--token-lifetime", type=int, default=299)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    simulator = BolSimulator(sellers=args.sellers, orders=args.orders, offers=args.offers, customers=args.customers,
+                             page_size=args.page_size, fbb_share=args.fbb_share, latency=tuple(args.latency),
+                             throttle_rate=args.throttle_rate, retry_after=args.retry_after,
+                             token_lifetime=args.token_lifetime, host=args.host, port=args.port)
+    _logger.info("Bol.com simulator on %s, set it as system parameter bol_ept.api_base_url", simulator.base_url)
+    for seller in simulator.sellers:
+        _logger.info("Seller %s: client id %s, secret %s", seller.number, seller.client_id, seller.client_secret)
+    try:
+        simulator.server.serve_forever()
+    except KeyboardInterrupt:
+        simulator.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# See LICENSE file for full copyright and licensing details.
+from concurrent.futures import ThreadPoolExecutor
+
+from odoo.tests.common import BaseCase, tagged
+
+from ..bol_api.bol_api import BolAPI, csv_headers, headers
+from .simulator import BolSimulator, check_token_crossover
+
+
+@tagged('post_install', '-at_install')
+class TestBolApiToken(BaseCase):
+    """
+    Stress tests of the token handling of BolAPI against the local simulator, the clients of many sellers run
+    concurrently and no request may carry the token of another seller.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestBolApiToken, cls).setUpClass()
+        # The tokens live a few seconds only, so they are refreshed while the other threads send requests.
+        cls.simulator = BolSimulator(sellers=8, orders=60, token_lifetime=32).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.simulator.stop()
+        super(TestBolApiToken, cls).tearDownClass()
+
+    def test_no_token_crossover(self):
+        result = check_token_crossover(instances=8, orders=60, workers=8, simulator=self.simulator)
+        self.assertTrue(result["requests"] >= 8 * 60)
+        self.assertEqual(result["crossovers"], 0, "A request was sent with the token of another seller.")
+        self.assertEqual(result["mismatches"], 0, "A client received the data of another seller.")
+
+    def test_shared_clients_keep_their_token(self):
+        """
+        The clients registered per instance are shared by the threads of a worker, every thread must keep using
+        the token of its own instance.
+        """
+        sellers = self.simulator.sellers
+        self.simulator.reset_stats()
+
+        def fetch_orders(seller):
+            client = BolAPI.get_client(("test_bol_api_token", seller.number), seller.client_id,
+                                       seller.client_secret, base_url=self.simulator.base_url)
+            return [client.get("single_order", seller.get_order_id(index))[1].get("orderId") ==
+                    seller.get_order_id(index) for index in range(20)]
+
+        with ThreadPoolExecutor(max_workers=len(sellers) * 2) as executor:
+            results = list(executor.map(fetch_orders, sellers + sellers))
+        self.assertTrue(all(all(result) for result in results))
+        self.assertFalse(self.simulator.crossovers)
+        self.assertNotIn("Authorization", headers)
+        self.assertNotIn("Authorization", csv_headers)
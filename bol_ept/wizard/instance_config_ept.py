@@ -34,7 +34,8 @@ class BolInstanceConfigEpt(models.TransientModel):
         if instance_exist:
             raise UserError(_("Instance already exist with given Credential."))
         try:
-            result = BolAPI.get_bol_token(self.client_id, self.secret_id)
+            base_url = self.env['bol.instance.ept'].get_bol_api_base_url()
+            result = BolAPI(base_url=base_url).get_bol_token(self.client_id, self.secret_id)
             if not result.get("access_token"):
                 raise UserError(_("Given Credentials are incorrect, please provide Correct Credentials."))
             bol_auth_token = "Bearer" + " " + result.get("access_token")
@@ -28,6 +28,9 @@ class ResConfigSettings(models.TransientModel):
     fbb_bol_order_prefix = fields.Char("FBB Order Prefix")
     bol_import_order_after_date = fields.Datetime("Import Order After date", help="System will "
                                                                                   "import only those orders which are created after this date.")
+    bol_incremental_order_import = fields.Boolean("Incremental Open Order Import",
+                                                  help="Queue only the open orders which are not seen by the "
+                                                       "previous import.")
     fbr_auto_workflow_id = fields.Many2one("sale.workflow.process.ept", string="Auto Workflow (FBR)")
     fbb_auto_workflow_id = fields.Many2one("sale.workflow.process.ept", string="Auto Workflow (FBB)")
     bol_import_shipment_order_type = fields.Selection([("FBB", "FBB"), ("FBR", "FBR"), ("Both", "FBR & FBB")],
@@ -38,6 +41,9 @@ class ResConfigSettings(models.TransientModel):
     bol_inventory_last_sync_on = fields.Datetime(string="Last stock export date", help="Last stock "
                                                                                        "export date'")
     bol_auto_validate_inventory = fields.Boolean(string="Auto validate inventory")
+    bol_realtime_stock_export = fields.Boolean("Real-time Stock Export",
+                                               help="Export the stock of the changed FBR products right after "
+                                                    "the change.")
     is_bol_create_schedule = fields.Boolean("Create Schedule Activity ? ", default=False,
                                             help="If checked, Then Schedule Activity create on order data queues"
                                                  " will any queue line failed.")
@@ -46,6 +52,8 @@ class ResConfigSettings(models.TransientModel):
     bol_activity_type_id = fields.Many2one("mail.activity.type", string="Bol Activity Type")
     bol_date_deadline = fields.Integer("Deadline Lead Days for Bol", default=1,
                                        help="its add number of  days in schedule activity deadline date ")
+    bol_queue_worker_count = fields.Integer("Queue Workers", default=1, config_parameter="bol_ept.queue_worker_count",
+                                            help="Number of crons processing the order queues at the same time.")
 
     @api.onchange('bol_instance_id')
     def onchange_bol_instance_id(self):
@@ -74,7 +82,9 @@ class ResConfigSettings(models.TransientModel):
             self.bol_instance_stock_field = bol_instance_id.stock_field
             self.bol_inventory_last_sync_on = bol_instance_id.inventory_last_sync_on
             self.bol_auto_validate_inventory = bol_instance_id.auto_validate_inventory
+            self.bol_realtime_stock_export = bol_instance_id.bol_realtime_stock_export
             self.bol_import_order_after_date = bol_instance_id.bol_import_order_after_date
+            self.bol_incremental_order_import = bol_instance_id.bol_incremental_order_import
             self.is_bol_create_schedule = bol_instance_id.is_bol_create_schedule
             self.bol_user_ids = bol_instance_id.bol_user_ids or False
             self.bol_activity_type_id = bol_instance_id.bol_activity_type_id.id or False
@@ -107,13 +117,16 @@ class ResConfigSettings(models.TransientModel):
             values['stock_field'] = self.bol_instance_stock_field
             values['inventory_last_sync_on'] = self.bol_inventory_last_sync_on
             values['auto_validate_inventory'] = self.bol_auto_validate_inventory
+            values['bol_realtime_stock_export'] = self.bol_realtime_stock_export
             values['bol_import_order_after_date'] = self.bol_import_order_after_date
+            values['bol_incremental_order_import'] = self.bol_incremental_order_import
             values['is_bol_create_schedule'] = self.is_bol_create_schedule
             values['bol_user_ids'] = [(6, 0, self.bol_user_ids.ids)]
             values['bol_activity_type_id'] = self.bol_activity_type_id.id or False
             values['bol_date_deadline'] = self.bol_date_deadline or False
 
             bol_instance_id.write(values)
+        self.env['ir.cron'].sudo().set_bol_queue_worker_crons(self.bol_queue_worker_count)
         return res
 
     def set_values(self):
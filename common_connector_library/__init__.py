@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
 # See LICENSE file for full copyright and licensing details.
 from . import models
+from . import wizard
 from . import controllers
@@ -25,6 +25,8 @@
              'view/sale_workflow_process_view.xml',
              'data/automatic_workflow_data.xml',
              'view/common_log_lines_ept.xml',
+             'view/postal_code_state_view.xml',
+             'wizard/postal_code_import_ept_view.xml',
             'view/assets.xml',
     ],
     'qweb': [
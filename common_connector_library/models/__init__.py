@@ -22,3 +22,7 @@ from . import account_move
 from . import ir_cron
 from . import data_queue_mixin_ept
 from . import account_bank_statement_line
+from . import postal_code_state_ept
+from . import stock_change_journal_ept
+from . import stock_move
+from . import stock_quant
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 # See LICENSE file for full copyright and licensing details.
 import logging
+from bisect import bisect_right
+
 from odoo import fields, models, api
 
 _logger = logging.getLogger(__name__)
@@ -47,33 +49,113 @@ class AccountFiscalPosition(models.Model):
             return False
         if self._context.get('is_b2b_amz_order', False):
             vat_required = self._context.get('is_b2b_amz_order', False)
-        base_domain = [('vat_required', '=', vat_required), ('company_id', 'in', [self.env.company.id, False]),
-                       ('origin_country_ept', 'in', [origin_country_id, False])]
-        null_state_dom = state_domain = [('state_ids', '=', False)]
-        null_zip_dom = zip_domain = [('zip_from', '=', False), ('zip_to', '=', False)]
-        null_country_dom = [('country_id', '=', False), ('country_group_id', '=', False)]
-        is_amazon_fpos = self._context.get('is_amazon_fpos', False)
-        if is_amazon_fpos:
-            base_domain.append(('is_amazon_fpos', '=', is_amazon_fpos))
+        state_id = state_id or False
+        zipcode = zipcode or False
+        fpos_index = self.get_origin_country_fpos_index(self.env.company.id,
+                                                        self._context.get('is_amazon_fpos', False))
+        country_index = fpos_index['country'].get(country_id, {'zip_from': [], 'zip': [], 'no_zip': []})
+        no_zip_entries = country_index['no_zip']
+        zip_entries = no_zip_entries
         if zipcode:
-            zip_domain = [('zip_from', '<=', zipcode), ('zip_to', '>=', zipcode)]
-        if state_id:
-            state_domain = [('state_ids', '=', state_id)]
-        domain_country = base_domain + [('country_id', '=', country_id)]
-        domain_group = base_domain + [('country_group_id.country_ids', '=', country_id)]
-        # Build domain to search records with exact matching criteria
-        fpos = self.search(domain_country + state_domain + zip_domain, limit=1)
+            # The ranges are sorted by their start, only the ranges starting before the zip code can match.
+            zip_entries = country_index['zip'][:bisect_right(country_index['zip_from'], zipcode)]
+        # Build criteria to find records with exact matching criteria
+        criteria = [(zip_entries, state_id, zipcode)]
         # return records that fit the most the criteria, and fallback on less specific fiscal positions if any can be found
-        if not fpos and state_id:
-            fpos = self.search(domain_country + null_state_dom + zip_domain, limit=1)
-        if not fpos and zipcode:
-            fpos = self.search(domain_country + state_domain + null_zip_dom, limit=1)
-        if not fpos and state_id and zipcode:
-            fpos = self.search(domain_country + null_state_dom + null_zip_dom, limit=1)
+        if state_id:
+            criteria.append((zip_entries, False, zipcode))
+        if zipcode:
+            criteria.append((no_zip_entries, state_id, False))
+        if state_id and zipcode:
+            criteria.append((no_zip_entries, False, False))
         # fallback: country group with no state/zip range
-        if not fpos:
-            fpos = self.search(domain_group + null_state_dom + null_zip_dom, limit=1)
-        if not fpos:
-            # Fallback on catchall (no country, no group)
-            fpos = self.search(base_domain + null_country_dom, limit=1)
-        return fpos
+        criteria.append((fpos_index['group'].get(country_id, []), False, False))
+        # Fallback on catchall (no country, no group)
+        criteria.append((fpos_index['catchall'], None, None))
+        for fpos_entries, fpos_state_id, fpos_zipcode in criteria:
+            fpos_id = self._match_origin_country_fpos(fpos_entries, origin_country_id, vat_required, fpos_state_id,
+                                                      fpos_zipcode)
+            if fpos_id:
+                return self.browse(fpos_id)
+        return self.browse()
+
+    @api.model
+    def _match_origin_country_fpos(self, fpos_entries, origin_country_id, vat_required, state_id, zipcode):
+        """
+        This method finds the first fiscal position of the entries matching the criteria, like a search of
+        search_fiscal_position_based_on_origin_country.
+        :param fpos_entries: Entries of the fiscal position index, see get_origin_country_fpos_index
+        :param origin_country_id: Warehouse country id
+        :param vat_required: True / False
+        :param state_id: delivery state id, False to match the fiscal positions without states or None for any
+        :param zipcode: delivery zip code, False to match the fiscal positions without zip range or None for any
+        :return: fpos id or False
+        """
+        matched_entry = False
+        for entry in fpos_entries:
+            rank, fpos_id, fpos_vat_required, fpos_origin_country_id, fpos_state_ids, zip_from, zip_to = entry
+            if bool(fpos_vat_required) != bool(vat_required) or \
+                    fpos_origin_country_id not in (origin_country_id, False):
+                continue
+            if state_id is not None and ((state_id and state_id not in fpos_state_ids) or
+                                         (not state_id and fpos_state_ids)):
+                continue
+            if zipcode is not None and ((zipcode and not zip_from <= zipcode <= zip_to) or
+                                        (not zipcode and (zip_from or zip_to))):
+                continue
+            if not matched_entry or rank < matched_entry[0]:
+                matched_entry = entry
+        return matched_entry and matched_entry[1]
+
+    @api.model
+    def get_origin_country_fpos_index(self, company_id, is_amazon_fpos):
+        """
+        This method gives the index of the active fiscal positions of the company, used to find the fiscal
+        position based on origin country without a search per criteria. The index is built once per import run
+        when the lookup_cache_ept dictionary is given in the context.
+        :param company_id: company id
+        :param is_amazon_fpos: True to index the Amazon fiscal positions only
+        :return: Fiscal position index, see _prepare_origin_country_fpos_index
+        """
+        lookup_cache = self._context.get('lookup_cache_ept')
+        cache_key = (self._name, company_id, is_amazon_fpos)
+        if lookup_cache is not None and cache_key in lookup_cache:
+            return lookup_cache[cache_key]
+        fpos_index = self._prepare_origin_country_fpos_index(company_id, is_amazon_fpos)
+        if lookup_cache is not None:
+            lookup_cache[cache_key] = fpos_index
+        return fpos_index
+
+    @api.model
+    def _prepare_origin_country_fpos_index(self, company_id, is_amazon_fpos):
+        """
+        This method prepares the index of the active fiscal positions of the company.
+        Every entry is a tuple of rank (in the order of the fiscal positions), id, vat required, origin country id,
+        state ids, zip from and zip to.
+        :param company_id: company id
+        :param is_amazon_fpos: True to index the Amazon fiscal positions only
+        :return: Dictionary of the entries with a country by country id, split in the sorted zip ranges and the
+                 entries without zip range, the entries with a country group by country id and the catchall entries
+        """
+        domain = [('company_id', 'in', [company_id, False])]
+        if is_amazon_fpos:
+            domain.append(('is_amazon_fpos', '=', is_amazon_fpos))
+        fpos_index = {'country': {}, 'group': {}, 'catchall': []}
+        for rank, fpos in enumerate(self.search(domain)):
+            entry = (rank, fpos.id, fpos.vat_required, fpos.origin_country_ept.id, frozenset(fpos.state_ids.ids),
+                     fpos.zip_from or False, fpos.zip_to or False)
+            if fpos.country_id:
+                country_index = fpos_index['country'].setdefault(fpos.country_id.id,
+                                                                 {'zip_from': [], 'zip': [], 'no_zip': []})
+                if fpos.zip_from and fpos.zip_to:
+                    country_index['zip'].append(entry)
+                elif not fpos.zip_from and not fpos.zip_to:
+                    country_index['no_zip'].append(entry)
+            for country in fpos.country_group_id.country_ids:
+                fpos_index['group'].setdefault(country.id, []).append(entry)
+            if not fpos.country_id and not fpos.country_group_id:
+                fpos_index['catchall'].append(entry)
+        for country_index in fpos_index['country'].values():
+            country_index['zip'].sort(key=lambda entry: entry[5])
+            country_index['zip_from'] = [entry[5] for entry in country_index['zip']]
+        return fpos_index
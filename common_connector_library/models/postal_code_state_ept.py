@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+# See LICENSE file for full copyright and licensing details.
+import logging
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+# Columns of a GeoNames postal code file, see load_geonames_postal_codes_ept.
+_geonames_country_code = 0
+_geonames_postal_code = 1
+_geonames_state_name = 3
+_geonames_state_code = 4
+
+
+class PostalCodeStateEpt(models.Model):
+    _name = 'postal.code.state.ept'
+    _description = 'Postal Code State'
+    _rec_name = 'postal_code'
+    _order = 'country_id, postal_code'
+
+    country_id = fields.Many2one('res.country', string='Country', required=True, ondelete='cascade', index=True)
+    postal_code = fields.Char(required=True, index=True,
+                              help="Postal code or its prefix, the longest matching prefix of a zip code is used.")
+    state_id = fields.Many2one('res.country.state', string='State', required=True, ondelete='cascade',
+                               domain="[('country_id', '=', country_id)]")
+
+    _sql_constraints = [('unique_postal_code', 'unique(country_id,postal_code)',
+                         "Postal code must be unique per country.")]
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """
+        Inherited for normalizing the postal code.
+        """
+        for vals in vals_list:
+            if vals.get('postal_code'):
+                vals['postal_code'] = self.normalize_postal_code(vals['postal_code'])
+        return super(PostalCodeStateEpt, self).create(vals_list)
+
+    def write(self, vals):
+        if vals.get('postal_code'):
+            vals['postal_code'] = self.normalize_postal_code(vals['postal_code'])
+        return super(PostalCodeStateEpt, self).write(vals)
+
+    @api.model
+    def normalize_postal_code(self, zip_code):
+        """
+        This method will normalize the zip code, the spaces are removed and it is upper cased.
+        :param zip_code: Zip code
+        :return: Normalized zip code
+        """
+        return "".join(zip_code.split()).upper()
+
+    @api.model
+    def get_state_by_postal_code(self, country, zip_code):
+        """
+        This method will find the state of a zip code in the postal codes of the country. The states found in an
+        import run are kept in the lookup_cache_ept dictionary of the context, when it is given.
+        :param country: Record of country.
+        :param zip_code: Zip code.
+        :return: Record of state if found, otherwise empty recordset.
+        """
+        state_obj = self.env['res.country.state']
+        if not country or not zip_code:
+            return state_obj
+        postal_code = self.normalize_postal_code(zip_code)
+        lookup_cache = self._context.get('lookup_cache_ept')
+        cache_key = (self._name, country.id, postal_code)
+        if lookup_cache is not None and cache_key in lookup_cache:
+            return state_obj.browse(lookup_cache[cache_key])
+        state_id = self._get_state_id_by_postal_code(country.id, postal_code)
+        if lookup_cache is not None:
+            lookup_cache[cache_key] = state_id
+        return state_obj.browse(state_id)
+
+    @api.model
+    def _get_state_id_by_postal_code(self, country_id, postal_code):
+        """
+        This method will find the state of the longest postal code which is a prefix of the zip code, so both the
+        full postal codes and their prefixes can be loaded.
+        :param country_id: ID of country.
+        :param postal_code: Normalized zip code.
+        :return: ID of state or False.
+        """
+        prefixes = [postal_code[:length] for length in range(len(postal_code), 0, -1)]
+        records = self.search_read([('country_id', '=', country_id), ('postal_code', 'in', prefixes)],
+                                   ['postal_code', 'state_id'])
+        if not records:
+            return False
+        record = max(records, key=lambda postal_code_record: len(postal_code_record['postal_code']))
+        return record['state_id'][0]
+
+    @api.model
+    def load_geonames_postal_codes_ept(self, file_content):
+        """
+        This method will load the postal codes of a GeoNames postal code file, i.e. the tab separated files of
+        https://download.geonames.org/export/zip/. The missing states are created and the postal codes which are
+        loaded already are skipped.
+        :param file_content: Content of the file.
+        :return: Number of loaded postal codes.
+        """
+        partner_obj = self.env['res.partner']
+        state_obj = self.env['res.country.state']
+        existing_postal_codes = {(record['country_id'][0], record['postal_code']) for record in
+                                 self.search_read([], ['country_id', 'postal_code'])}
+        states = {}
+        vals_list = []
+        for line in file_content.splitlines():
+            columns = line.split('\t')
+            if len(columns) <= _geonames_state_code or not columns[_geonames_postal_code]:
+                continue
+            country = partner_obj.get_country(columns[_geonames_country_code])
+            state_name = columns[_geonames_state_name]
+            state_code = columns[_geonames_state_code] or state_name
+            postal_code = self.normalize_postal_code(columns[_geonames_postal_code])
+            if not country or not state_name or (country.id, postal_code) in existing_postal_codes:
+                continue
+            state_key = (country.id, state_code)
+            if state_key not in states:
+                state = state_obj.search([('country_id', '=', country.id), '|', ('code', '=', state_code),
+                                          ('name', '=', state_name)], limit=1)
+                if not state:
+                    state = state_obj.create({'name': state_name, 'code': state_code, 'country_id': country.id})
+                states[state_key] = state.id
+            existing_postal_codes.add((country.id, postal_code))
+            vals_list.append({'country_id': country.id, 'postal_code': postal_code,
+                              'state_id': states[state_key]})
+        self.create(vals_list)
+        _logger.info("%s postal codes are loaded.", len(vals_list))
+        return len(vals_list)
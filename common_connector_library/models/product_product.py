@@ -128,6 +128,23 @@ class ProductProduct(models.Model):
 
         return list(set(product_ids))
 
+    def check_for_kit_products_ept(self, component_ids):
+        """
+        This method gives the BoM products of which the components are in the list, their stock depends on the
+        stock of the components.
+        @param component_ids: Ids of component products.
+        @return: Ids of BoM products.
+        """
+        module_obj = self.env['ir.module.module']
+        mrp_module = module_obj.sudo().search([('name', '=', 'mrp'), ('state', '=', 'installed')])
+        if not mrp_module or not component_ids:
+            return []
+        self._cr.execute("""select distinct p.id from product_product as p
+                    inner join mrp_bom as mb on mb.product_tmpl_id=p.product_tmpl_id
+                    inner join mrp_bom_line as ml on ml.bom_id=mb.id
+                    where ml.product_id in %s""", (tuple(component_ids),))
+        return [row[0] for row in self._cr.fetchall()]
+
     def prepare_location_and_product_ids(self, warehouse, product_list):
         """
         This method prepares location and product ids from warehouse and list of product id.
@@ -1,8 +1,6 @@
 # -*- coding: utf-8 -*-
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
-import ast
-import requests
 from odoo import models, fields, api
 
 
@@ -62,8 +60,15 @@ class ResPartner(models.Model):
             @Updated By : Dipak Gogiya, 21/09/2020
             :return: res.country()
         """
+        # The countries found in an import run are kept in the lookup_cache_ept dictionary of the context.
+        lookup_cache = self._context.get('lookup_cache_ept')
+        cache_key = ('res.country', (country_name_or_code or '').lower())
+        if lookup_cache is not None and cache_key in lookup_cache:
+            return self.env['res.country'].browse(lookup_cache[cache_key])
         country = self.env['res.country'].search(['|', ('code', '=ilike', country_name_or_code),
                                                   ('name', '=ilike', country_name_or_code)], limit=1)
+        if lookup_cache is not None:
+            lookup_cache[cache_key] = country.id
         return country
 
     def create_or_update_state_ept(self, country_code, state_name_or_code, zip_code, country_obj=False):
@@ -72,52 +77,26 @@ class ResPartner(models.Model):
         @last_updated_on : 4/10/2019
         Modified the below method to set state from the api of zippopotam.
         Migration done by twinkalc August 2020
+        The state is found from the loaded postal codes instead of the api, see postal.code.state.ept.
         """
         if not country_obj:
             country = self.get_country(country_code)
         else:
             country = country_obj
-        state = self.env['res.country.state'].search(['|', ('name', '=ilike', state_name_or_code),
-                                                      ('code', '=ilike', state_name_or_code),
-                                                      ('country_id', '=', country.id)], limit=1)
+        # The states found in an import run are kept in the lookup_cache_ept dictionary of the context.
+        lookup_cache = self._context.get('lookup_cache_ept')
+        cache_key = ('res.country.state', country.id, (state_name_or_code or '').lower())
+        if lookup_cache is not None and cache_key in lookup_cache:
+            state = self.env['res.country.state'].browse(lookup_cache[cache_key])
+        else:
+            state = self.env['res.country.state'].search(['|', ('name', '=ilike', state_name_or_code),
+                                                          ('code', '=ilike', state_name_or_code),
+                                                          ('country_id', '=', country.id)], limit=1)
+            if lookup_cache is not None:
+                lookup_cache[cache_key] = state.id
 
         if not state and zip_code:
-            state = self.get_state_from_api(country_code, zip_code, country)
-        return state
-
-    def get_state_from_api(self, country_code, zip_code, country):
-        """
-        This method tries to find state from country and zip code from zippopotam api.
-        @param country_code: Code of country.
-        @param zip_code: Zip code.
-        @param country: Record of Country.
-        @return: Record of state if found, otherwise object.
-        @author: Maulik Barad on Date 22-Oct
-        """
-        state_obj = state = self.env['res.country.state']
-        country_obj = self.env['res.country']
-        try:
-            url = 'https://api.zippopotam.us/' + country_code + '/' + zip_code.split('-')[0]
-            response = requests.get(url)
-            response = ast.literal_eval(response.content.decode('utf-8'))
-        except:
-            return state_obj
-        if response:
-            if not country:
-                self.get_country(response.get('country abbreviation'))
-            if not country:
-                self.get_country(response.get('country'))
-            if not country:
-                country = country_obj.create({'name': response.get('country'),
-                                              'code': response.get('country abbreviation')})
-
-            state = state_obj.search(['|', ('name', '=', response.get('places')[0].get('state')),
-                                      ('code', '=', response.get('places')[0].get('state abbreviation')),
-                                      ('country_id', '=', country.id)], limit=1)
-            if not state:
-                state = state_obj.create({'name': response.get('places')[0].get('state'),
-                                          'code': response.get('places')[0].get('state abbreviation'),
-                                          'country_id': country.id})
+            state = self.env['postal.code.state.ept'].get_state_by_postal_code(country, zip_code)
         return state
 
     @api.model
@@ -37,25 +37,24 @@ class SaleOrder(models.Model):
         picking_policy,date_order
         Migration done by twinkalc August 2020
         """
-        sale_order = self.env['sale.order']
-        order_vals = {
-            'company_id': vals.get('company_id', False),
-            'partner_id': vals.get('partner_id', False),
-            'partner_invoice_id': vals.get('partner_invoice_id', False),
-            'partner_shipping_id': vals.get('partner_shipping_id', False),
-            'warehouse_id': vals.get('warehouse_id', False),
-        }
-
-        new_record = sale_order.new(order_vals)
-        # Return Pricelist- Payment terms- Invoice address- Delivery address
-        new_record.onchange_partner_id()
-        order_vals = sale_order._convert_to_write({name: new_record[name] for name in new_record._cache})
-
-        # Return Fiscal Position
-        order_vals.update({'partner_shipping_id': vals.get('partner_shipping_id', False)})
-        new_record = sale_order.new(order_vals)
-        new_record.onchange_partner_shipping_id()
-        order_vals = sale_order._convert_to_write({name: new_record[name] for name in new_record._cache})
+        partner = self.env['res.partner'].browse(vals.get('partner_id', False))
+        shipping_partner = self.env['res.partner'].browse(vals.get('partner_shipping_id', False))
+        # The onchange values of the orders of an import run are cached in the onchange_cache_ept dictionary of
+        # the context, when it is given. They depend only on the partner fields of the key, the invoice terms are
+        # translated in the language of the partner.
+        onchange_cache = self._context.get('onchange_cache_ept')
+        cache_key = ('sale.order', vals.get('company_id', False), vals.get('warehouse_id', False),
+                     partner.commercial_partner_id.id, partner.user_id.id, partner.lang,
+                     partner.allow_search_fiscal_based_on_origin_warehouse, shipping_partner.country_id.id,
+                     shipping_partner.state_id.id, shipping_partner.zip or False)
+        if onchange_cache is None or cache_key not in onchange_cache:
+            onchange_vals = self.get_onchange_sales_order_vals_ept(
+                vals.get('company_id', False), vals.get('warehouse_id', False), vals.get('partner_id', False),
+                vals.get('partner_invoice_id', False), vals.get('partner_shipping_id', False))
+            if onchange_cache is None:
+                onchange_cache = {}
+            onchange_cache[cache_key] = onchange_vals
+        order_vals = dict(onchange_cache[cache_key])
 
         fpos = order_vals.get('fiscal_position_id') or vals.get('fiscal_position_id', False)
         order_vals.update({
@@ -75,6 +74,38 @@ class SaleOrder(models.Model):
         })
         return order_vals
 
+    def get_onchange_sales_order_vals_ept(self, company_id, warehouse_id, partner_id, partner_invoice_id,
+                                          partner_shipping_id):
+        """
+        This method will give the values of the sale order onchange of the partner and the shipping partner
+        (pricelist, payment term, salesperson, fiscal position, invoice terms).
+        :param company_id: Company of the order
+        :param warehouse_id: Warehouse of the order
+        :param partner_id: Partner of the order
+        :param partner_invoice_id: Invoice partner of the order
+        :param partner_shipping_id: Shipping partner of the order
+        :return: Dictionary of sale order values
+        """
+        sale_order = self.env['sale.order']
+        order_vals = {
+            'company_id': company_id,
+            'partner_id': partner_id,
+            'partner_invoice_id': partner_invoice_id,
+            'partner_shipping_id': partner_shipping_id,
+            'warehouse_id': warehouse_id,
+        }
+
+        new_record = sale_order.new(order_vals)
+        # Return Pricelist- Payment terms- Invoice address- Delivery address
+        new_record.onchange_partner_id()
+        order_vals = sale_order._convert_to_write({name: new_record[name] for name in new_record._cache})
+
+        # Return Fiscal Position
+        order_vals.update({'partner_shipping_id': partner_shipping_id})
+        new_record = sale_order.new(order_vals)
+        new_record.onchange_partner_shipping_id()
+        return sale_order._convert_to_write({name: new_record[name] for name in new_record._cache})
+
     @api.onchange('partner_shipping_id', 'partner_id')
     def onchange_partner_shipping_id(self):
         """
@@ -191,22 +222,8 @@ class SaleOrder(models.Model):
         """
         self.ensure_one()
         if work_flow_process_record.create_invoice:
-            if work_flow_process_record.invoice_date_is_order_date:
-                fiscalyear_lock_date = self.company_id._get_user_fiscal_lock_date()
-                if self.date_order.date() <= fiscalyear_lock_date:
-                    log_book_id = self._context.get('log_book_id')
-                    if log_book_id:
-                        message = "You cannot create invoice for order (%s) " \
-                                  "prior to and inclusive of the lock date %s. " \
-                                  "So, order is created but invoice is not created." % (self.name, format_date(
-                            self.env, fiscalyear_lock_date))
-                        self.env['common.log.lines.ept'].create({
-                            'message': message,
-                            'order_ref': self.name,
-                            'log_book_id': log_book_id
-                        })
-                        _logger.info(message)
-                    return True
+            if work_flow_process_record.invoice_date_is_order_date and self.is_invoice_date_locked_ept():
+                return True
             ctx = self._context.copy()
             if work_flow_process_record.sale_journal_id:
                 ctx.update({'journal_ept': work_flow_process_record.sale_journal_id})
@@ -216,6 +233,85 @@ class SaleOrder(models.Model):
                 self.paid_invoice_ept(invoices)
         return True
 
+    def is_invoice_date_locked_ept(self):
+        """
+        This method will check the order date against the fiscal lock date of the company, the invoice can not be
+        dated on the order date if it is locked. A log line is created in the log book of the context.
+        :return: True if the order date is locked.
+        """
+        self.ensure_one()
+        fiscalyear_lock_date = self.company_id._get_user_fiscal_lock_date()
+        if self.date_order.date() > fiscalyear_lock_date:
+            return False
+        log_book_id = self._context.get('log_book_id')
+        if log_book_id:
+            message = "You cannot create invoice for order (%s) " \
+                      "prior to and inclusive of the lock date %s. " \
+                      "So, order is created but invoice is not created." % (self.name, format_date(
+                self.env, fiscalyear_lock_date))
+            self.env['common.log.lines.ept'].create({
+                'message': message,
+                'order_ref': self.name,
+                'log_book_id': log_book_id
+            })
+            _logger.info(message)
+        return True
+
+    def process_orders_and_invoices_batch_ept(self):
+        """
+        This method will confirm sale orders, create and paid related invoices like process_orders_and_invoices_ept,
+        with one confirmation, invoice creation and posting per workflow for all the orders.
+        :return: True
+        """
+        for work_flow_process_record in self.auto_workflow_process_id:
+            orders = self.filtered(lambda order: order.auto_workflow_process_id == work_flow_process_record and
+                                   order.invoice_status != 'invoiced')
+            if work_flow_process_record.validate_order:
+                orders.filtered(lambda order: order.state in ('draft', 'sent')).validate_orders_batch_ept()
+
+            invoice_orders = self.browse()
+            for order in orders:
+                order_lines = order.order_line.filtered(lambda l: l.product_id.invoice_policy == 'order')
+                if not order_lines.filtered(lambda l: l.product_id.type == 'product') and len(
+                        order.order_line) != len(order_lines.filtered(lambda l: l.product_id.type in ['service',
+                                                                                                   'consu'])):
+                    continue
+                invoice_orders |= order
+            invoice_orders.validate_and_paid_invoices_batch_ept(work_flow_process_record)
+        return True
+
+    def validate_orders_batch_ept(self):
+        """
+        This function validate sales orders like validate_order_ept, with one action_confirm for all the orders.
+        :return: True
+        """
+        date_orders = {order: order.date_order for order in self}
+        self.env['product.product'].invalidate_cache(fnames=['display_name'])
+        self.action_confirm()
+        for order, date_order in date_orders.items():
+            order.write({'date_order': date_order})
+        return True
+
+    def validate_and_paid_invoices_batch_ept(self, work_flow_process_record):
+        """
+        This method will create invoices, validate it and register payment it like validate_and_paid_invoices_ept,
+        with one invoice creation and posting for all the orders. Every order gets its own invoice.
+        :param work_flow_process_record: Workflow of the orders.
+        :return: True
+        """
+        if not work_flow_process_record.create_invoice:
+            return True
+        orders = self.filtered(lambda order: order.invoice_status == 'to invoice')
+        if work_flow_process_record.invoice_date_is_order_date:
+            orders = orders.filtered(lambda order: not order.is_invoice_date_locked_ept())
+        if not orders:
+            return True
+        invoices = orders._create_invoices(grouped=True)
+        invoices.action_post()
+        if work_flow_process_record.register_payment:
+            work_flow_process_record.register_payment_batch_ept(invoices)
+        return True
+
     def validate_invoice_ept(self, invoices):
         """
         Added by Udit
@@ -1,6 +1,12 @@
 # -*- coding: utf-8 -*-
 # See LICENSE file for full copyright and licensing details.
 from odoo import models
+from odoo.tools.misc import get_lang
+
+# Values of the sale order line onchange which depend only on the product, company, pricelist and fiscal position,
+# see create_sale_order_line_ept. The description depends on the language of the customer as well, it is not cached
+# but computed per line, see get_sale_order_line_description_vals_ept.
+_cached_onchange_fields = ('product_uom', 'tax_id')
 
 
 class SaleOrderLine(models.Model):
@@ -14,6 +20,45 @@ class SaleOrderLine(models.Model):
         Required data in dictionary :- order_id, name, product_id.
         Migration done by twinkalc August 2020
         """
+        order = self.env['sale.order'].browse(vals.get('order_id', False))
+        # The onchange values of the lines of an import run are cached in the onchange_cache_ept dictionary of the
+        # context, when it is given. Only the values which depend on the key are cached, the description and the
+        # customer lead time are set per line. The line gets the same values whether they are cached or not.
+        onchange_cache = self._context.get('onchange_cache_ept')
+        cache_key = ('sale.order.line', vals.get('product_id', False), vals.get('company_id', False),
+                     order.pricelist_id.id, order.fiscal_position_id.id, vals.get('product_uom') or False)
+        if onchange_cache is None:
+            order_line = self.get_onchange_sale_order_line_vals_ept(vals)
+        else:
+            if cache_key in onchange_cache:
+                order_line = dict(onchange_cache[cache_key])
+                order_line.update(self.get_sale_order_line_description_vals_ept(order, vals.get('product_id', False)))
+            else:
+                onchange_vals = self.get_onchange_sale_order_line_vals_ept(vals)
+                order_line = {field_name: onchange_vals[field_name] for field_name in _cached_onchange_fields
+                              if field_name in onchange_vals}
+                onchange_cache[cache_key] = dict(order_line)
+                order_line.update({'name': onchange_vals.get('name', ''),
+                                   'customer_lead': onchange_vals.get('customer_lead', 0.0)})
+            order_line.update({'product_id': vals.get('product_id', False),
+                               'company_id': vals.get('company_id', False)})
+
+        order_line.update({
+            'order_id': vals.get('order_id', False),
+            'product_uom_qty': vals.get('order_qty', 0.0),
+            'price_unit': vals.get('price_unit', 0.0),
+            'discount': vals.get('discount', 0.0),
+            'state': 'draft',
+        })
+        return order_line
+
+    def get_onchange_sale_order_line_vals_ept(self, vals):
+        """
+        This method will give the values of the sale order line onchange of the product (taxes, unit of measure,
+        description, customer lead time).
+        :param vals: Dictionary of the line as given to create_sale_order_line_ept
+        :return: Dictionary of sale order line values
+        """
         sale_order_line = self.env['sale.order.line']
         order_line = {
             'order_id': vals.get('order_id', False),
@@ -26,13 +71,17 @@ class SaleOrderLine(models.Model):
         new_order_line = sale_order_line.new(order_line)
         new_order_line.product_id_change()
         new_order_line._onchange_product_id_set_customer_lead()
-        order_line = sale_order_line._convert_to_write({name: new_order_line[name] for name in new_order_line._cache})
+        return sale_order_line._convert_to_write({name: new_order_line[name] for name in new_order_line._cache})
 
-        order_line.update({
-            'order_id': vals.get('order_id', False),
-            'product_uom_qty': vals.get('order_qty', 0.0),
-            'price_unit': vals.get('price_unit', 0.0),
-            'discount': vals.get('discount', 0.0),
-            'state': 'draft',
-        })
-        return order_line
+    def get_sale_order_line_description_vals_ept(self, order, product_id):
+        """
+        This method will give the description and the customer lead time of a line, as set by the onchange of the
+        product. The description is in the language of the customer.
+        :param order: Sale order of the line
+        :param product_id: Product of the line
+        :return: Dictionary of sale order line values
+        """
+        product = self.env['product.product'].browse(product_id).with_context(
+            lang=get_lang(self.env, order.partner_id.lang).code)
+        return {'name': self.env['sale.order.line'].get_sale_order_line_multiline_description_sale(product),
+                'customer_lead': product.sale_delay}
@@ -112,3 +112,58 @@ class SaleWorkflowProcess(models.Model):
 
         shipped_orders.validate_and_paid_invoices_ept(self)
         return True
+
+    def register_payment_batch_ept(self, invoices):
+        """
+        This method will register the payments of many invoices at once, like sale.order.paid_invoice_ept does per
+        invoice. The payments are created and posted per payment journal and method, then reconciled with their
+        invoices, see reconcile_payment_batch_ept.
+        :param invoices: Recordset of posted invoices.
+        :return: Recordset of created payments.
+        """
+        self.ensure_one()
+        account_payment_obj = self.env['account.payment']
+        payment_vals_by_method = {}
+        for invoice in invoices.filtered(lambda invoice: invoice.amount_residual):
+            vals = invoice.prepare_payment_dict(self)
+            payment_vals_by_method.setdefault((vals['journal_id'], vals['payment_method_id']), []).append(
+                (invoice, vals))
+
+        payments = account_payment_obj
+        payment_invoices = []
+        for invoice_vals in payment_vals_by_method.values():
+            method_payments = account_payment_obj.create([vals for invoice, vals in invoice_vals])
+            method_payments.action_post()
+            payments |= method_payments
+            payment_invoices.extend(zip(method_payments, [invoice for invoice, vals in invoice_vals]))
+        self.reconcile_payment_batch_ept(payment_invoices)
+        return payments
+
+    def reconcile_payment_batch_ept(self, payment_invoices):
+        """
+        This method will reconcile the payments with their invoices like sale.order.reconcile_payment_ept, the
+        receivable and payable lines of all the payments and invoices are read with one search.
+        :param payment_invoices: List of (payment, invoice) tuples.
+        :return: True
+        """
+        if not payment_invoices:
+            return True
+        move_line_obj = self.env['account.move.line']
+        moves = self.env['account.move']
+        for payment, invoice in payment_invoices:
+            moves |= payment.move_id | invoice
+        move_lines = move_line_obj.search([('move_id', 'in', moves.ids),
+                                           ('account_internal_type', 'in', ('receivable', 'payable')),
+                                           ('reconciled', '=', False)])
+        lines_by_move = {}
+        for line in move_lines:
+            lines_by_move[line.move_id.id] = lines_by_move.get(line.move_id.id, move_line_obj) | line
+
+        for payment, invoice in payment_invoices:
+            payment_lines = lines_by_move.get(payment.move_id.id, move_line_obj)
+            invoice_lines = lines_by_move.get(invoice.id, move_line_obj).filtered(
+                    lambda line: line.account_internal_type == 'receivable')
+            for account in payment_lines.account_id:
+                (payment_lines + invoice_lines).filtered(
+                        lambda line: line.account_id == account and not line.reconciled).reconcile()
+        return True
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# See LICENSE file for full copyright and licensing details.
+from datetime import timedelta
+
+from odoo import models, fields, api
+
+# Days the stock changes are kept, see _gc_stock_change_journal.
+_journal_retention_days = 30
+
+
+class StockChangeJournalEpt(models.Model):
+    _name = 'stock.change.journal.ept'
+    _description = 'Stock Change Journal'
+    _order = 'id'
+    _log_access = False
+
+    product_id = fields.Many2one('product.product', string='Product', required=True, ondelete='cascade')
+    warehouse_id = fields.Many2one('stock.warehouse', string='Warehouse', required=True, ondelete='cascade',
+                                   index=True)
+    company_id = fields.Many2one('res.company', string='Company', ondelete='cascade')
+    date = fields.Datetime(default=fields.Datetime.now)
+    # The 64 bits transaction ID given by txid_current() does not fit in an Integer field, it is stored as Float,
+    # which holds it exactly.
+    transaction_id = fields.Float("Transaction", readonly=True, index=True,
+                                  help="Transaction of the change, see get_stock_changes_ept.")
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """
+        Inherited for setting the transaction of the changes.
+        """
+        self._cr.execute("SELECT txid_current()")
+        transaction_id = self._cr.fetchone()[0]
+        for vals in vals_list:
+            vals['transaction_id'] = transaction_id
+        return super(StockChangeJournalEpt, self).create(vals_list)
+
+    @api.model
+    def record_stock_moves_ept(self, moves):
+        """
+        This method will record the products and warehouses of the stock moves in the journal, for the source and
+        the destination warehouse of a move.
+        :param moves: Recordset of stock moves.
+        :return: True
+        """
+        changes = set()
+        for move in moves:
+            for warehouse in move.location_id.warehouse_id | move.location_dest_id.warehouse_id:
+                changes.add((move.product_id.id, warehouse.id, move.company_id.id))
+        return self.record_stock_changes_ept(changes)
+
+    @api.model
+    def record_stock_quants_ept(self, quants):
+        """
+        This method will record the products and warehouses of the changed quants in the journal.
+        :param quants: Recordset of quants.
+        :return: True
+        """
+        changes = {(quant.product_id.id, quant.location_id.warehouse_id.id, quant.company_id.id) for quant in quants
+                   if quant.location_id.warehouse_id}
+        return self.record_stock_changes_ept(changes)
+
+    @api.model
+    def record_stock_changes_ept(self, changes):
+        """
+        This method will record the changes in the journal. The journal is append only, the rows are created at
+        once.
+        :param changes: Set of product ID, warehouse ID and company ID.
+        :return: True
+        """
+        if changes:
+            self.sudo().create([{'product_id': product_id, 'warehouse_id': warehouse_id, 'company_id': company_id}
+                                for product_id, warehouse_id, company_id in changes])
+        return True
+
+    @api.model
+    def get_stock_changes_ept(self, warehouse, cursor=False):
+        """
+        This method will give the products of which the stock is changed in the warehouse after the cursor, the
+        kit products of the changed components are included when mrp is installed.
+        The cursor is a transaction ID, the changes of the transactions from the cursor are read. The new cursor
+        is the oldest transaction running at the snapshot of the current transaction, all the older transactions
+        are finished, so their changes are read by this call. The changes of the running transactions can still be
+        committed, so the changes of the transactions from the new cursor are given by the next call too.
+        Without a cursor, e.g. after the install, the journal may not hold the older changes, the products moved in
+        the last _journal_retention_days are read from the stock moves as well.
+        :param warehouse: Record of warehouse.
+        :param cursor: Transaction ID given by the previous call, as text, or False to read all the changes.
+        :return: List of product ids, new cursor as text.
+        """
+        if not warehouse:
+            return [], cursor
+        product_obj = self.env['product.product']
+        self._cr.execute("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+        new_cursor = self._cr.fetchone()[0]
+        if cursor:
+            new_cursor = max(new_cursor, int(cursor))
+            self._cr.execute("""SELECT array_agg(DISTINCT product_id) FROM stock_change_journal_ept
+                                WHERE warehouse_id = %s AND transaction_id >= %s""", (warehouse.id, int(cursor)))
+            product_ids = self._cr.fetchone()[0] or []
+        else:
+            self._cr.execute("""SELECT array_agg(DISTINCT product_id) FROM stock_change_journal_ept
+                                WHERE warehouse_id = %s""", (warehouse.id,))
+            product_ids = self._cr.fetchone()[0] or []
+            product_ids += product_obj.get_products_based_on_movement_date_ept(
+                    fields.Datetime.now() - timedelta(days=_journal_retention_days), warehouse.company_id)
+        if not product_ids:
+            return [], str(new_cursor)
+        product_ids += product_obj.check_for_kit_products_ept(product_ids)
+        return list(set(product_ids)), str(new_cursor)
+
+    @api.autovacuum
+    def _gc_stock_change_journal(self):
+        """
+        This method will remove the changes older than _journal_retention_days, it is called by the autovacuum.
+        """
+        self._cr.execute("DELETE FROM stock_change_journal_ept WHERE date < %s",
+                         (fields.Datetime.now() - timedelta(days=_journal_retention_days),))
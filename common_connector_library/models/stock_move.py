@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# See LICENSE file for full copyright and licensing details.
+from odoo import models
+
+
+class StockMove(models.Model):
+    _inherit = 'stock.move'
+
+    def _action_confirm(self, merge=True, merge_into=False):
+        """
+        Inherited for recording the change of the forecasted stock in the journal, see stock.change.journal.ept.
+        The changes of the quantity and the reservation are recorded by the quants, see stock.quant.
+        """
+        moves = super(StockMove, self)._action_confirm(merge=merge, merge_into=merge_into)
+        self.env['stock.change.journal.ept'].record_stock_moves_ept(moves)
+        return moves
+
+    def _action_cancel(self):
+        res = super(StockMove, self)._action_cancel()
+        self.env['stock.change.journal.ept'].record_stock_moves_ept(self)
+        return res
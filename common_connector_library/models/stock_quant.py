@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+# See LICENSE file for full copyright and licensing details.
+from odoo import models, api
+
+# Fields of the quant of which a change is recorded in the stock change journal.
+_quant_stock_fields = ('quantity', 'reserved_quantity')
+
+
+class StockQuant(models.Model):
+    _inherit = 'stock.quant'
+
+    @api.model
+    def create(self, vals):
+        """
+        Inherited for recording the stock change in the journal, see stock.change.journal.ept. The quants are
+        changed by the moves and by the inventory adjustments which write the quants directly.
+        """
+        quant = super(StockQuant, self).create(vals)
+        if any(field_name in vals for field_name in _quant_stock_fields):
+            self.env['stock.change.journal.ept'].record_stock_quants_ept(quant)
+        return quant
+
+    def write(self, vals):
+        res = super(StockQuant, self).write(vals)
+        if any(field_name in vals for field_name in _quant_stock_fields):
+            self.env['stock.change.journal.ept'].record_stock_quants_ept(self)
+        return res
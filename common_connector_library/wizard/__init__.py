@@ -0,0 +1,3 @@
+# -*- coding: utf-8 -*-
+# See LICENSE file for full copyright and licensing details.
+from . import postal_code_import_ept
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# See LICENSE file for full copyright and licensing details.
+import base64
+
+from odoo import models, fields, _
+from odoo.exceptions import UserError
+
+
+class PostalCodeImportEpt(models.TransientModel):
+    """
+    Wizard for loading the postal codes of a GeoNames postal code file, the states of the partners are found from
+    them, see postal.code.state.ept.
+    """
+    _name = 'postal.code.import.ept'
+    _description = 'Postal Code Import'
+
+    file_data = fields.Binary("GeoNames File", required=True,
+                              help="Tab separated postal code file of https://download.geonames.org/export/zip/, "
+                                   "e.g. NL.txt unzipped.")
+    file_name = fields.Char()
+
+    def import_postal_codes(self):
+        """
+        This method will load the postal codes of the file.
+        :return: Action of the postal codes
+        """
+        if not self.file_data:
+            raise UserError(_("Please select the GeoNames postal code file."))
+        file_content = base64.b64decode(self.file_data).decode('utf-8', errors='replace')
+        self.env['postal.code.state.ept'].load_geonames_postal_codes_ept(file_content)
+        return self.env['ir.actions.actions']._for_xml_id('common_connector_library.action_postal_code_state')